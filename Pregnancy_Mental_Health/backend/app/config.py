@@ -84,4 +84,77 @@ MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
 MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
 MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "True").lower() == "true"
 MAIL_SSL_TLS = os.getenv("MAIL_SSL_TLS", "False").lower() == "true"
-MAIL_RECIPIENT = os.getenv("MAIL_RECIPIENT")
\ No newline at end of file
+MAIL_RECIPIENT = os.getenv("MAIL_RECIPIENT")
+
+# ML Inference Pool
+# Scoring and SHAP run on a dedicated executor so they can't starve the
+# event loop or the threadpool that serves DB work.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "5"))  # seconds
+
+# Prediction cache (scores + SHAP factors for repeated questionnaires)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "2048"))
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", "3600"))  # seconds
+
+# Inference sidecar: when set, workers send feature vectors to one model
+# process over this Unix socket instead of each loading CatBoost
+# (start it with: python -m app.services.inference_sidecar)
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET")
+
+# Query recording for index_advisor.py: append each distinct SQL statement
+# (with the parameters it first ran with) to this JSONL file. Staging only.
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH")
+
+# Schema migrations run out of band (python migrate.py) and workers refuse
+# to start against an older schema. Set to true to migrate at startup
+# instead — local development only.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "False").lower() == "true"
+
+# Database connection pool. Connections are kept open and reused instead
+# of a new TCP + TLS handshake per request; pre-ping and recycling replace
+# connections the server (or Render's proxy) dropped while idle.
+# DB_POOL_MODE=null restores one connection per checkout (NullPool).
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))      # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))    # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # Postgres only; 0 disables
+
+# Presence: request activity is kept in memory and written to
+# users.last_active in one batch every PRESENCE_FLUSH_INTERVAL seconds.
+# A user is "online" if active within ONLINE_WINDOW_SECONDS.
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", "15"))
+ONLINE_WINDOW_SECONDS = int(os.getenv("ONLINE_WINDOW_SECONDS", "300"))
+
+# Authenticated-principal cache (get_current_user): entries are keyed by the
+# token's (sub, iat). Changes to a user drop their entries in the worker that
+# made them; other workers see them within the TTL.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # seconds
+
+# Rate limiting: with a Redis-protocol URL (redis://host:6379/0) the
+# per-IP counters are shared by all workers; unset keeps them per worker.
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# WebSocket delivery: each socket has a queue of at most WS_SEND_QUEUE_SIZE
+# outgoing messages drained by its own writer task. A socket whose queue is
+# full, or whose send takes longer than WS_SEND_TIMEOUT seconds, is closed.
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+# WebSocket event bus: with a Redis-protocol URL (redis://host:6379/0) events
+# published in one worker reach sockets connected to every worker. Unset:
+# each worker only reaches its own sockets (fine for a single worker).
+WS_BUS_URL = os.getenv("WS_BUS_URL")
+
+# WebSocket liveness and caps: sockets are pinged every WS_PING_INTERVAL
+# seconds and closed after WS_IDLE_TIMEOUT seconds without a message from
+# the client (clients answer pings). New sockets beyond the per-worker or
+# per-user (per worker) limit are refused.
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "10000"))
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "10"))
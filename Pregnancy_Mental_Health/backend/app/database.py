@@ -1,9 +1,16 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import NullPool
 from dotenv import load_dotenv
 import os
 
+from .config import (
+    DB_POOL_MODE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS,
+)
+from .services.db_pool import TimedAsyncQueuePool, TimedQueuePool, async_pool_metrics, pool_metrics
+
 load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
@@ -19,20 +26,68 @@ if not SQLALCHEMY_DATABASE_URL:
     DB_NAME = os.getenv("DB_NAME")
     SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
 
-# ✅ Fix 2: Add SSL for Render + NullPool to prevent dropped connections
+# ✅ Fix 2: Add SSL for Render + a health-checked connection pool
 IS_PRODUCTION = os.getenv("RENDER", False)  # Render sets this automatically
+IS_POSTGRES = SQLALCHEMY_DATABASE_URL.startswith("postgresql")
 
+connect_args = {}
 if IS_PRODUCTION:
+    connect_args["sslmode"] = "require"  # ✅ Required on Render
+if IS_POSTGRES:
+    # TCP keepalives stop idle pooled connections from being silently dropped
+    connect_args.update(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+    if DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+if DB_POOL_MODE == "null":
+    # One connection per checkout (the old Render setup): no stale connections, but a handshake per request
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args, poolclass=NullPool)
+else:
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        connect_args={"sslmode": "require"},  # ✅ Required on Render
-        poolclass=NullPool,                   # ✅ Prevents stale connection errors on Render
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,  # ✅ Replaces connections dropped while idle
     )
+pool_metrics.install(engine)
+
+# ✅ Async engine for `async def` handlers: asyncpg on Postgres, aiosqlite locally.
+# Same pool settings as the sync engine, so a worker can hold up to twice as many connections.
+if IS_POSTGRES:
+    ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+elif SQLALCHEMY_DATABASE_URL.startswith("sqlite://"):
+    ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
 else:
-    # Local development - no SSL needed
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL
+
+async_connect_args = {}
+if IS_PRODUCTION:
+    async_connect_args["ssl"] = "require"
+if IS_POSTGRES and DB_STATEMENT_TIMEOUT_MS:
+    async_connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+
+if DB_POOL_MODE == "null":
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=async_connect_args, poolclass=NullPool)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args=async_connect_args,
+        poolclass=TimedAsyncQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+async_pool_metrics.install(async_engine.sync_engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: reading an expired attribute would need a lazy load, which AsyncSession can't do
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -40,4 +95,10 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """Async counterpart of get_db, for `async def` handlers (never call the sync Session from those)."""
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
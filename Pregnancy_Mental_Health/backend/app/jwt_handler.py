@@ -8,8 +8,10 @@ import secrets
 
 # Import from centralized config
 from .config import JWT_SECRET_KEY, JWT_REFRESH_SECRET, IS_PRODUCTION
-from .database import get_db
+from .database import get_db, SessionLocal
 from . import models
+from .services.presence import presence
+from .services.principal_cache import Principal, principal_cache
 
 # Validate secrets on startup
 if not JWT_SECRET_KEY:
@@ -105,12 +107,19 @@ def decode_refresh_token(token: str) -> dict:
         )
 
 
-def get_current_user_email(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Dependency: the verified access token's claims. FastAPI caches a
+    dependency's result per request, so the JWT is decoded only once even
+    when get_current_user_email and get_current_user are both in play.
+    """
+    return decode_access_token(credentials.credentials)
+
+
+def get_current_user_email(payload: dict = Depends(get_token_payload)) -> str:
     """
     Dependency to get current user email from JWT token
     """
-    token = credentials.credentials
-    payload = decode_access_token(token)
     email: str = payload.get("sub")
     
     if email is None:
@@ -123,25 +132,23 @@ def get_current_user_email(credentials: HTTPAuthorizationCredentials = Depends(s
     return email
 
 
-def get_current_user(
-    request: Request,
-    db: Session = Depends(get_db),
-    email: str = Depends(get_current_user_email),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> models.User:
+def _load_principal(db: Session, email: str, iat_timestamp) -> Principal:
     """
-    Dependency to get current user object from DB
-    Enforces password reset for first-time users except on the change-password and set-password endpoints
+    The token owner as a Principal (cached by (email, iat)).
+    Raises 401 if the user is gone or changed password after the token was issued.
     """
-    user = db.query(models.User).filter(models.User.email == email).first()
+    cache_key = (email, iat_timestamp)
+    user = principal_cache.get(cache_key)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-        )
+        row = db.query(models.User).filter(models.User.email == email).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+            )
+        user = Principal.from_user(row)
+        principal_cache.put(cache_key, user)
     
-    payload = decode_access_token(credentials.credentials)
-    iat_timestamp = payload.get("iat")
     if iat_timestamp and getattr(user, "password_changed_at", None):
         iat_datetime = datetime.fromtimestamp(iat_timestamp, tz=timezone.utc)
         pwd_changed = user.password_changed_at
@@ -153,6 +160,20 @@ def get_current_user(
                 detail="Session expired due to password change. Please log in again.",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+    return user
+
+
+def get_current_user(
+    request: Request,
+    db: Session = Depends(get_db),
+    email: str = Depends(get_current_user_email),
+    payload: dict = Depends(get_token_payload),
+) -> Principal:
+    """
+    Dependency to get the current user (a cached Principal, not an ORM row)
+    Enforces password reset for first-time users except on the change-password and set-password endpoints
+    """
+    user = _load_principal(db, email, payload.get("iat"))
     
     # Enforce password reset for first-time users (not admin, not on change-password/set-password endpoint)
     is_password_endpoint = request.url.path.endswith("/change-password") or request.url.path.endswith("/set-password")
@@ -163,9 +184,8 @@ def get_current_user(
             headers={"X-Action-Required": "PasswordReset"}
         )
     
-    # ✅ Update last_active timestamp
-    user.last_active = datetime.now(timezone.utc)
-    db.commit()
+    # ✅ Record activity in memory; services/presence.py batches the last_active writes
+    presence.touch(user.id)
         
     return user
 
@@ -188,3 +208,23 @@ def get_optional_current_user_email(
         return email
     except HTTPException:
         return None
+
+
+def authenticate_websocket(token: str) -> Principal:
+    """
+    Principal for a /ws connection's ?token= (browsers can't send headers
+    on a WebSocket). Blocking: call it from a threadpool.
+    Raises HTTPException like get_current_user.
+    """
+    payload = decode_access_token(token)
+    email = payload.get("sub")
+    if email is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
+    db = SessionLocal()
+    try:
+        return _load_principal(db, email, payload.get("iat"))
+    finally:
+        db.close()
@@ -1,18 +1,27 @@
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from .utils.websocket_manager import manager
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from .utils.websocket_manager import manager, channels_for, recovery_channel
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from contextlib import asynccontextmanager
-from .database import engine
+from contextlib import asynccontextmanager, suppress
+from .database import engine, async_engine
 from . import models
 from .routers import predictions, auth, assessments, notifications, follow_ups, patient_portal, admin, nurse, doctor, messages, recovery
 from .routers.patients import router as patients_router
 from .rate_limiter import rate_limiter
-from .config import ALLOWED_ORIGINS, IS_PRODUCTION
+from .ml_model import get_explainer, is_model_loaded
+from . import ml_model
+from .services.inference_pool import inference_pool
+from .services.presence import presence
+from .config import ALLOWED_ORIGINS, IS_PRODUCTION, QUERY_LOG_PATH, MIGRATE_ON_STARTUP
+from .migrations import check_schema_version
+from .jwt_handler import authenticate_websocket
+from .utils.query_log import QueryRecorder
 from sqlalchemy import text
 import asyncio
 import logging
 import sys
+from typing import Optional
 
 logging.basicConfig(
     level=logging.INFO,  # show info+
@@ -20,123 +29,45 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 
+# Feed for index_advisor.py (staging only; see utils/query_log.py)
+if QUERY_LOG_PATH:
+    query_recorder = QueryRecorder(QUERY_LOG_PATH)
+    query_recorder.install(engine)
+    query_recorder.install(async_engine.sync_engine)
 
-def migrate_db():
-    """✅ Run manual migrations for existing tables on Render using engine directly"""
-    from .database import engine
-    from sqlalchemy import text
-    
-    logging.info("Starting database migration check...")
-    
-    try:
-        # Define tables and their missing columns
-        migrations = {
-            "users": [
-                ("hospital_name", "VARCHAR"),
-                ("department", "VARCHAR"),
-                ("designation", "VARCHAR"),
-                ("specialization", "VARCHAR"),
-                ("ward", "VARCHAR"),
-                ("years_of_experience", "INTEGER"),
-                ("last_active", "TIMESTAMP WITH TIME ZONE")
-            ],
-            "patients": [
-                ("created_by_nurse_id", "INTEGER"),
-                ("assigned_doctor_id", "INTEGER"),
-                ("doctor_id", "INTEGER"),
-                ("hospital_name", "VARCHAR"),
-                ("ward_bed", "VARCHAR"),
-                ("previous_pregnancies", "INTEGER")
-            ],
-            "appointments": [
-                ("assigned_doctor_id", "INTEGER"),
-                ("created_by_nurse_id", "INTEGER")
-            ]
-        }
-
-        # Use engine.begin() for automatic commit/rollback of DDL
-        with engine.begin() as conn:
-            for table_name, columns in migrations.items():
-                for col_name, col_type in columns:
-                    try:
-                        # PostgreSQL specific: ADD COLUMN IF NOT EXISTS
-                        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {col_name} {col_type}"))
-                        logging.info(f"Migration: Checked/Added {table_name}.{col_name}")
-                    except Exception as e:
-                        logging.error(f"Migration failed for {table_name}.{col_name}: {e}")
-                        
-        logging.info("Database migration check completed successfully.")
-                
-    except Exception as e:
-        logging.error(f"migrate_db fatal error: {e}")
 
-
-def seed_admin():
-    from .database import SessionLocal
-    from .security import hash_password
-    db = SessionLocal()
+async def warm_up_model():
+    """Load CatBoost and build the shared SHAP explainer off the startup path."""
     try:
-        existing = db.query(models.User).filter(models.User.email == "admin@ppd.com").first()
-        if not existing:
-            admin = models.User(
-                first_name="Admin",
-                last_name="User",
-                email="admin@ppd.com",
-                hashed_password=hash_password("Admin@123"),
-                role="admin",
-                first_login=False,
-                is_active=True,
-            )
-            db.add(admin)
-            db.commit()
-            logging.info("Default admin user created: admin@ppd.com")
-        else:
-            # Always ensure password and role are correct on startup
-            existing.hashed_password = hash_password("Admin@123")
-            existing.role = "admin"
-            existing.first_login = False
-            existing.is_active = True
-            db.commit()
-            logging.info("Admin user password reset to default on startup.")
+        await inference_pool.run_async(get_explainer)  # loads the model first
     except Exception as e:
-        logging.error(f"seed_admin failed: {e}")
-        db.rollback()
-    finally:
-        db.close()
-
-
-def cleanup_invalid_emails():
-    """✅ Auto-cleanup common data entry errors on startup"""
-    from .database import SessionLocal
-    from sqlalchemy import text
-    db = SessionLocal()
-    try:
-        # Fix specific 'test@gmailcom' typo
-        db.execute(text("UPDATE users SET email = 'test@gmail.com' WHERE email = 'test@gmailcom'"))
-        db.commit()
-        logging.info("Startup cleanup: Fixed invalid email data (test@gmailcom -> test@gmail.com)")
-    except Exception as e:
-        logging.error(f"cleanup_invalid_emails failed: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        logging.error(f"Model warmup failed (will load on first request): {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create database tables on startup
-    models.Base.metadata.create_all(bind=engine)
-    # Manual migration for existing tables on Render
-    migrate_db()
-    # Seed default admin user if not exists
-    seed_admin()
-    # Cleanup invalid data
-    cleanup_invalid_emails()
+    # Schema changes run out of band (python migrate.py); only check the version here
+    check_schema_version(engine, MIGRATE_ON_STARTUP)
+    # Load the model + SHAP explainer in the background; /health answers meanwhile
+    warmup_task = asyncio.create_task(warm_up_model())
     # Startup: Start background cleanup task
     cleanup_task = asyncio.create_task(rate_limiter.cleanup_old_entries())
+    # Batched users.last_active writes
+    presence_task = asyncio.create_task(presence.run())
+    # WebSocket events from the other workers (no-op without WS_BUS_URL)
+    await manager.start()
     yield
     # Shutdown: Cancel cleanup task
     cleanup_task.cancel()
+    presence_task.cancel()  # flushes pending activity on the way out
+    warmup_task.cancel()
+    # Let the final presence flush finish before the pools go away
+    with suppress(asyncio.CancelledError):
+        await presence_task
+    inference_pool.shutdown()
+    await async_engine.dispose()
+    await rate_limiter.close()
+    await manager.close()
 
 app = FastAPI(
     title="Postpartum Risk Insight API",
@@ -186,7 +117,7 @@ async def rate_limit_middleware(request: Request, call_next):
             return JSONResponse(
                 status_code=429,
                 content={"detail": str(e.detail) if hasattr(e, 'detail') else "Rate limit exceeded"},
-                headers=cors_headers,
+                headers={**cors_headers, **(getattr(e, "headers", None) or {})},
             )
 
     response = await call_next(request)
@@ -217,12 +148,35 @@ app.include_router(messages.router)
 app.include_router(recovery.router)
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None, recovery_nonce: Optional[str] = None):
+    """
+    Real-time events. ?token=<access token> subscribes the socket to its
+    user's channels; ?recovery_nonce= (forgot-password page, no token) to
+    the code for the recovery request POST /recovery/request returned that
+    nonce for. Knowing an email is not enough to receive its code.
+    """
+    channels, user_id = [], None
+    if token:
+        try:
+            principal = await run_in_threadpool(authenticate_websocket, token)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        channels, user_id = channels_for(principal), principal.id
+    if recovery_nonce:
+        channels.append(recovery_channel(recovery_nonce))
+
+    if not await manager.connect(websocket, channels, user_id):
+        return  # over the per-worker or per-user connection cap
     try:
         while True:
-            data = await websocket.receive_text()
+            # Clients only send pongs; any message shows the connection is alive
+            await websocket.receive_text()
+            manager.touch(websocket)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also after errors: stops the socket's writer task
         manager.disconnect(websocket)
 
 @app.get("/health")
@@ -233,7 +187,10 @@ async def health():
 def root():
     return {"message": "PPD Predictor API is running!", "version": "1.0.0"}
 
-@app.get("/health")
-async def health():
-    return {"status": "alive"}
+@app.get("/health/ready")
+async def readiness():
+    """Ready once the CatBoost model has loaded; /health is liveness only"""
+    if not is_model_loaded():
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready", "model_load_seconds": round(ml_model.load_seconds, 2)}
 
@@ -0,0 +1,340 @@
+"""
+Versioned schema migrations, applied out of band by `python migrate.py`.
+
+Each migration runs once and its version is recorded in schema_migrations.
+Workers never run DDL; at startup they only compare the recorded version
+with LATEST_VERSION (check_schema_version).
+
+Rules for adding one:
+- Append it with the next version number. Never renumber or edit a
+  migration that has shipped.
+- Make it idempotent (IF NOT EXISTS, inspector checks). Version 1 creates
+  its tables from models.py, so on a fresh database a later migration may
+  find its column or index already in place. Build indexes through
+  _create_indexes(), which replaces an invalid index a failed concurrent
+  build left on PostgreSQL instead of letting IF NOT EXISTS skip it.
+- Spell out what it changes (tables, columns, index names) instead of
+  deriving it from models.py at run time; otherwise a database migrated
+  before a models.py change never gets it while a fresh one does.
+- Every schema change in models.py, indexes included, gets a new
+  migration, even when version 1 would create it on a fresh database.
+- Also declare the change in models.py, which stays the source of truth
+  for the ORM.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import func, insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_lock: one migrate.py at a time
+_LOCK_KEY = 48151623
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable
+    transactional: bool = True
+
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str, transactional: bool = True):
+    def register(fn):
+        MIGRATIONS.append(Migration(version, description, fn, transactional))
+        return fn
+    return register
+
+
+def _add_columns(conn, table: str, columns):
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name, sql_type in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+            logger.info(f"Added {table}.{name}")
+
+
+# ── Migrations ─────────────────────────────────────────────────────────────
+
+# Tables as of version 1; later tables are created by their own migration
+_BASELINE_TABLES = (
+    "schema_migrations", "users", "patients", "assessments", "appointments",
+    "notifications", "prediction_logs", "audit_logs", "messages",
+    "mood_entries", "recovery_requests", "recovery_challenges", "follow_ups",
+    "clinician_stats",
+)
+
+
+@migration(1, "Baseline: create missing tables and the columns older releases added at startup")
+def _baseline(conn):
+    tables = [models.Base.metadata.tables[name] for name in _BASELINE_TABLES]
+    models.Base.metadata.create_all(bind=conn, tables=tables)
+    _add_columns(conn, "users", [
+        ("hospital_name", "VARCHAR"),
+        ("department", "VARCHAR"),
+        ("designation", "VARCHAR"),
+        ("specialization", "VARCHAR"),
+        ("ward", "VARCHAR"),
+        ("years_of_experience", "INTEGER"),
+        ("last_active", "TIMESTAMP WITH TIME ZONE"),
+    ])
+    _add_columns(conn, "patients", [
+        ("created_by_nurse_id", "INTEGER"),
+        ("assigned_doctor_id", "INTEGER"),
+        ("doctor_id", "INTEGER"),
+        ("hospital_name", "VARCHAR"),
+        ("ward_bed", "VARCHAR"),
+        ("previous_pregnancies", "INTEGER"),
+    ])
+    _add_columns(conn, "appointments", [
+        ("assigned_doctor_id", "INTEGER"),
+        ("created_by_nurse_id", "INTEGER"),
+    ])
+
+
+@migration(2, "Add and backfill assessments.risk_band")
+def _risk_band(conn):
+    from .utils.risk_bands import risk_band_expression
+
+    _add_columns(conn, "assessments", [("risk_band", "SMALLINT")])
+    assessments = models.Assessment.__table__
+    result = conn.execute(
+        assessments.update()
+        .where(assessments.c.risk_band.is_(None), assessments.c.risk_level.isnot(None))
+        .values(risk_band=risk_band_expression(assessments.c.risk_level))
+    )
+    logger.info(f"Backfilled assessments.risk_band ({result.rowcount} rows)")
+
+
+@migration(3, "Build the clinician_stats dashboard rollup")
+def _clinician_stats(conn):
+    from .services.clinician_stats import rebuild
+
+    with Session(bind=conn) as db:
+        rebuild(db)
+
+
+# (name, table, columns, unique): the indexes models.py declared at version 4
+_V4_INDEXES = (
+    ("ix_users_id", "users", "id", False),
+    ("ix_users_email", "users", "email", True),
+    ("ix_users_phone_number", "users", "phone_number", True),
+    ("ix_notifications_id", "notifications", "id", False),
+    ("ix_notifications_clinician_email", "notifications", "clinician_email", False),
+    ("ix_prediction_logs_id", "prediction_logs", "id", False),
+    ("ix_audit_logs_id", "audit_logs", "id", False),
+    ("ix_clinician_stats_id", "clinician_stats", "id", False),
+    ("ix_messages_id", "messages", "id", False),
+    ("ix_mood_entries_id", "mood_entries", "id", False),
+    ("ix_patients_id", "patients", "id", False),
+    ("ix_patients_clinician_email", "patients", "clinician_email", False),
+    ("ix_patients_email", "patients", "email", False),
+    ("ix_patients_user_id", "patients", "user_id", False),
+    ("ix_patients_doctor_created", "patients", "assigned_doctor_id, created_at", False),
+    ("ix_patients_nurse_created", "patients", "created_by_nurse_id, created_at", False),
+    ("ix_recovery_requests_id", "recovery_requests", "id", False),
+    ("ix_recovery_requests_status", "recovery_requests", "status", False),
+    ("ix_recovery_requests_user_email", "recovery_requests", "user_email", False),
+    ("ix_recovery_requests_user_id", "recovery_requests", "user_id", False),
+    ("ix_recovery_requests_user_role", "recovery_requests", "user_role", False),
+    ("ix_appointments_id", "appointments", "id", False),
+    ("ix_appointments_assigned_doctor_date", "appointments", "assigned_doctor_id, date, time", False),
+    ("ix_appointments_doctor_date", "appointments", "doctor_id, date, time", False),
+    ("ix_appointments_nurse_date", "appointments", "created_by_nurse_id, date, time", False),
+    ("ix_appointments_patient_date", "appointments", "patient_id, date, time", False),
+    ("ix_assessments_id", "assessments", "id", False),
+    ("ix_assessments_created_at", "assessments", "created_at", False),
+    ("ix_assessments_clinician_email_created", "assessments", "clinician_email, created_at", False),
+    ("ix_assessments_doctor_band_status", "assessments", "assigned_doctor_id, risk_band, status", False),
+    ("ix_assessments_doctor_created", "assessments", "assigned_doctor_id, created_at, id", False),
+    ("ix_assessments_nurse_created", "assessments", "nurse_id, created_at", False),
+    ("ix_assessments_patient_created", "assessments", "patient_id, created_at", False),
+    ("ix_assessments_status_created", "assessments", "status, created_at", False),
+    ("ix_recovery_challenges_id", "recovery_challenges", "id", False),
+    ("ix_recovery_challenges_expires_at", "recovery_challenges", "expires_at", False),
+    ("ix_recovery_challenges_recovery_request_id", "recovery_challenges", "recovery_request_id", False),
+    ("ix_follow_ups_id", "follow_ups", "id", False),
+    ("ix_follow_ups_assessment_id", "follow_ups", "assessment_id", False),
+    ("ix_follow_ups_clinician_email", "follow_ups", "clinician_email", False),
+    ("ix_follow_ups_patient_scheduled", "follow_ups", "patient_id, scheduled_date", False),
+    ("ix_follow_ups_status_scheduled", "follow_ups", "status, scheduled_date", False),
+)
+
+
+def _index_valid(conn, name: str):
+    """pg_index.indisvalid of index name, or None when it doesn't exist."""
+    return conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name},
+    ).scalar()
+
+
+def _create_indexes(conn, indexes):
+    # On Postgres CONCURRENTLY keeps tables writable while an index builds;
+    # it can't run inside a transaction, so migrations calling this are
+    # declared transactional=False
+    is_postgres = conn.dialect.name == "postgresql"
+    for name, table, columns, unique in indexes:
+        # A failed concurrent build (duplicate key, cancelled, deadlock)
+        # leaves an INVALID index behind that IF NOT EXISTS would skip
+        if is_postgres and _index_valid(conn, name) is False:
+            logger.warning(f"Dropping invalid index {name} left by an earlier failed build")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX "
+            f"{'CONCURRENTLY ' if is_postgres else ''}IF NOT EXISTS "
+            f"{name} ON {table} ({columns})"
+        ))
+        if is_postgres and not _index_valid(conn, name):
+            raise RuntimeError(f"Index {name} on {table} is not valid after CREATE INDEX CONCURRENTLY")
+
+
+@migration(4, "Create the indexes declared in models.py", transactional=False)
+def _indexes(conn):
+    _create_indexes(conn, _V4_INDEXES)
+
+
+@migration(5, "Fix the test@gmailcom email typo")
+def _fix_invalid_emails(conn):
+    conn.execute(text("UPDATE users SET email = 'test@gmail.com' WHERE email = 'test@gmailcom'"))
+
+
+@migration(6, "Create the default admin user")
+def _default_admin(conn):
+    seed_admin(conn, reset=False)
+
+
+@migration(7, "Build the notification_counters unread rollup")
+def _notification_counters(conn):
+    from .services.notification_counters import rebuild
+
+    models.NotificationCounter.__table__.create(bind=conn, checkfirst=True)
+    with Session(bind=conn) as db:
+        rebuild(db)
+
+
+@migration(8, "Add recovery_requests.push_nonce")
+def _recovery_push_nonce(conn):
+    _add_columns(conn, "recovery_requests", [("push_nonce", "VARCHAR(64)")])
+
+
+@migration(9, "Index recovery_requests.push_nonce for GET /recovery/status", transactional=False)
+def _recovery_push_nonce_index(conn):
+    _create_indexes(conn, [("ix_recovery_requests_push_nonce", "recovery_requests", "push_nonce", False)])
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# ── Runner ─────────────────────────────────────────────────────────────────
+
+def seed_admin(conn, reset: bool):
+    """Create admin@ppd.com if missing; with reset, restore its default password and role."""
+    from .security import hash_password
+
+    users = models.User.__table__
+    existing = conn.execute(select(users.c.id).where(users.c.email == "admin@ppd.com")).first()
+    if existing is None:
+        conn.execute(insert(users).values(
+            first_name="Admin",
+            last_name="User",
+            email="admin@ppd.com",
+            hashed_password=hash_password("Admin@123"),
+            role="admin",
+            first_login=False,
+            is_active=True,
+        ))
+        logger.info("Default admin user created: admin@ppd.com")
+    elif reset:
+        conn.execute(users.update().where(users.c.id == existing.id).values(
+            hashed_password=hash_password("Admin@123"),
+            role="admin",
+            first_login=False,
+            is_active=True,
+        ))
+        logger.info("Admin user password reset to default.")
+
+
+def current_version(engine) -> int:
+    """Highest applied migration version (0 if migrate.py has never run)."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(models.SchemaMigration.__tablename__):
+            return 0
+        return conn.execute(select(func.max(models.SchemaMigration.version))).scalar() or 0
+
+
+def upgrade(engine) -> list:
+    """Apply every pending migration in order. Returns the versions applied."""
+    applied = []
+    # Autocommit: an open transaction here would stall CREATE INDEX CONCURRENTLY
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        if engine.dialect.name == "postgresql":
+            lock_conn.execute(text(f"SELECT pg_advisory_lock({_LOCK_KEY})"))
+        try:
+            models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+            with engine.connect() as conn:
+                done = set(conn.execute(select(models.SchemaMigration.version)).scalars())
+
+            for m in MIGRATIONS:
+                if m.version in done:
+                    continue
+                logger.info(f"Applying migration {m.version}: {m.description}")
+                if m.transactional:
+                    with engine.begin() as conn:
+                        _lift_statement_timeout(conn, local=True)
+                        m.apply(conn)
+                        _record(conn, m)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        _lift_statement_timeout(conn, local=False)
+                        try:
+                            m.apply(conn)
+                            _record(conn, m)
+                        finally:
+                            if conn.dialect.name == "postgresql":
+                                conn.execute(text("RESET statement_timeout"))
+                applied.append(m.version)
+        finally:
+            if engine.dialect.name == "postgresql":
+                lock_conn.execute(text(f"SELECT pg_advisory_unlock({_LOCK_KEY})"))
+    return applied
+
+
+def _lift_statement_timeout(conn, local: bool):
+    # Backfills and index builds can outlast DB_STATEMENT_TIMEOUT_MS
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"SET {'LOCAL ' if local else ''}statement_timeout = 0"))
+
+
+def _record(conn, m: Migration):
+    conn.execute(insert(models.SchemaMigration).values(version=m.version, description=m.description))
+
+
+def check_schema_version(engine, migrate_on_startup: bool = False):
+    """
+    Startup check: refuse to serve against a schema older than this release
+    expects (unless migrate_on_startup, meant for local development).
+    """
+    version = current_version(engine)
+    if version < LATEST_VERSION:
+        if migrate_on_startup:
+            logger.info(f"Schema at version {version}; migrating to {LATEST_VERSION} (MIGRATE_ON_STARTUP)")
+            upgrade(engine)
+            return
+        raise RuntimeError(
+            f"Database schema is at version {version} but this release needs {LATEST_VERSION}. "
+            f"Run `python migrate.py` from the backend directory (or set MIGRATE_ON_STARTUP=true locally)."
+        )
+    if version > LATEST_VERSION:
+        # Normal for old workers during a rolling deploy
+        logger.warning(f"Database schema version {version} is newer than this release ({LATEST_VERSION})")
+    else:
+        logger.info(f"Database schema at version {version}")
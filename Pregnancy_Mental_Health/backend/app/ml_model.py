@@ -1,24 +1,114 @@
 # backend/app/ml_model.py
+#
+# catboost, joblib and pandas are imported inside the loaders below, not at
+# module level: routers import this module, and the API should answer
+# /health before the model subsystem has finished loading.
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+import hashlib
+import logging
+import threading
+import time
 
-from catboost import CatBoostClassifier
-import joblib
-import pandas as pd
-import shap
 import numpy as np
 
+from . import config
+
+logger = logging.getLogger(__name__)
+
 BASE_DIR = Path(__file__).parent
 MODEL_DIR = BASE_DIR / "model_files"
 
 MODEL_PATH = MODEL_DIR / "catboost_epds_model.cbm"
 FEATURE_COLS_PATH = MODEL_DIR / "feature_columns.pkl"
 
-model = CatBoostClassifier()
-model.load_model(str(MODEL_PATH))
+# CatBoost class order: [High, Low, Medium] → indices 0,1,2
+HIGH_RISK_CLASS_INDEX = 0
+
+_model = None
+_feature_columns = None
+_feature_encoder = None
+_model_checksum = None  # sha256 of the .cbm bytes _model was loaded from
+_load_lock = threading.Lock()
+load_seconds = None  # how long load_model() took, for /health/ready
+
+
+def load_local_model():
+    """
+    Import catboost and read the .cbm and feature_columns.pkl from disk.
+    Returns (model, columns, checksum of the .cbm bytes the model was built from).
+    """
+    from catboost import CatBoostClassifier
+    import joblib
+
+    # Read once and load from memory, so the checksum describes exactly
+    # the model loaded even if the file is replaced meanwhile
+    blob = MODEL_PATH.read_bytes()
+    cb_model = CatBoostClassifier()
+    cb_model.load_model(blob=blob)
+
+    # list of column names in training order
+    columns = list(joblib.load(str(FEATURE_COLS_PATH)))  # [file:14]
+    return cb_model, columns, hashlib.sha256(blob).hexdigest()
+
+
+def load_model():
+    """
+    Load the model once per process.
+
+    With INFERENCE_SOCKET set, the model lives in the inference sidecar and
+    this process only holds a thin client (no catboost, pandas or joblib).
+    """
+    global _model, _feature_columns, _feature_encoder, _model_checksum, load_seconds
+    if _model is not None:
+        return _model
+    with _load_lock:
+        if _model is None:
+            start = time.perf_counter()
+            if config.INFERENCE_SOCKET:
+                from .services.inference_sidecar import SidecarModel
+                cb_model = SidecarModel(config.INFERENCE_SOCKET)
+                columns = cb_model.feature_columns
+            else:
+                cb_model, columns, _model_checksum = load_local_model()
+
+            _feature_columns = columns
+            _feature_encoder = FeatureEncoder(columns)
+            _model = cb_model
+            load_seconds = time.perf_counter() - start
+            source = f"sidecar at {config.INFERENCE_SOCKET}" if config.INFERENCE_SOCKET else "local file"
+            logger.info(f"CatBoost model loaded from {source} in {load_seconds:.2f}s")
+    return _model
+
 
-# list of column names in training order
-feature_columns = joblib.load(str(FEATURE_COLS_PATH))  # [file:14]
+def is_model_loaded() -> bool:
+    return _model is not None
+
+
+def get_model():
+    return _model if _model is not None else load_model()
+
+
+def get_model_checksum() -> Optional[str]:
+    """
+    Identifies the model this process scores with: the checksum recorded
+    when it was loaded (in sidecar mode, the sidecar's). None before loading.
+    """
+    if _model is None:
+        return None
+    return _model.model_checksum if config.INFERENCE_SOCKET else _model_checksum
+
+
+def get_feature_columns() -> list:
+    if _feature_columns is None:
+        load_model()
+    return _feature_columns
+
+
+def get_feature_encoder() -> "FeatureEncoder":
+    if _feature_encoder is None:
+        load_model()
+    return _feature_encoder
 
 
 def _require(value: Any, field_name: str) -> Any:
@@ -28,8 +118,8 @@ def _require(value: Any, field_name: str) -> Any:
     return value
 
 
-def build_model_input_from_form(data) -> pd.DataFrame:
-    
+def form_to_row(data) -> Dict[str, Any]:
+    """Map one questionnaire onto the raw (pre-encoding) training columns."""
 
     # Map raw Pydantic fields → training column names, but without defaults
     row: Dict[str, Any] = {
@@ -114,32 +204,43 @@ def build_model_input_from_form(data) -> pd.DataFrame:
         ),
     }
 
-    df = pd.DataFrame([row])
+    return row
+
+
+# Same cleaning as training notebook [file:14]
+_VALUE_FIXES: Dict[str, Dict[str, str]] = {
+    "Education Level": {
+        "High school": "High School",
+        "Primary school": "Primary School",
+    },
+    "Husband's education level": {
+        "High school": "High School",
+        "Primary school": "Primary School",
+    },
+    "Diseases during pregnancy": {
+        "Non-chronic disease": "Non-Chronic Disease",
+        "Chronic disease": "Chronic Disease",
+    },
+    "Total children": {
+        "More than Two": "More than two",
+    },
+}
 
-    # Same cleaning as training notebook [file:14]
-    for col in ["Education Level", "Husband's education level"]:
+
+def encode_rows(rows: list) -> "pd.DataFrame":
+    """
+    One-hot encode raw rows and align them to the training feature_columns.
+
+    Reference pandas implementation; FeatureEncoder must match it exactly.
+    """
+    import pandas as pd
+
+    feature_columns = get_feature_columns()
+    df = pd.DataFrame(rows)
+
+    for col, fixes in _VALUE_FIXES.items():
         if col in df.columns:
-            df[col] = df[col].replace(
-                {
-                    "High school": "High School",
-                    "Primary school": "Primary School",
-                }
-            )
-
-    if "Diseases during pregnancy" in df.columns:
-        df["Diseases during pregnancy"] = df["Diseases during pregnancy"].replace(
-            {
-                "Non-chronic disease": "Non-Chronic Disease",
-                "Chronic disease": "Chronic Disease",
-            }
-        )
-
-    if "Total children" in df.columns:
-        df["Total children"] = df["Total children"].replace(
-            {
-                "More than Two": "More than two",
-            }
-        )
+            df[col] = df[col].replace(fixes)
 
     # One-hot encode + align to training columns, if you use that pattern
     X_encoded = pd.get_dummies(df, drop_first=False)
@@ -154,42 +255,147 @@ def build_model_input_from_form(data) -> pd.DataFrame:
     return X_encoded
 
 
-def get_top_features(X: pd.DataFrame, feature_names: list) -> list:
+class FeatureEncoder:
+    """
+    One-hot encoder compiled once from feature_columns.
+
+    get_dummies names a dummy "<column>_<category>" and passes numeric
+    columns through under their own name, so every (column, value) pair
+    resolves to a fixed slot in the feature vector. Unknown categories and
+    columns the model never saw are dropped, as the reindex above does.
+    """
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self._slots = {name: i for i, name in enumerate(self.feature_names)}
+        self._dummy_slots: Dict[tuple, int] = {}
+
+    def _slot(self, column: str, value: Any):
+        if isinstance(value, str):
+            value = _VALUE_FIXES.get(column, {}).get(value, value)
+            key = (column, value)
+            slot = self._dummy_slots.get(key)
+            if slot is None:
+                # Only known dummies are memoised, so free-text values can't grow it
+                slot = self._slots.get(f"{column}_{value}", -1)
+                if slot >= 0:
+                    self._dummy_slots[key] = slot
+            return slot, 1.0
+        return self._slots.get(column, -1), float(value)
+
+    def encode_into(self, row: Dict[str, Any], out: np.ndarray) -> np.ndarray:
+        """Write one raw row into a zeroed slice of length n_features."""
+        for column, value in row.items():
+            slot, x = self._slot(column, value)
+            if slot >= 0:
+                out[slot] = x
+        return out
+
+    def encode(self, row: Dict[str, Any]) -> np.ndarray:
+        """Encode one raw row, shape (1, n_features)."""
+        out = np.zeros((1, self.n_features))
+        self.encode_into(row, out[0])
+        return out
+
+    def encode_rows(self, rows: list) -> np.ndarray:
+        """Encode many raw rows, shape (len(rows), n_features)."""
+        out = np.zeros((len(rows), self.n_features))
+        for i, row in enumerate(rows):
+            self.encode_into(row, out[i])
+        return out
+
+
+def encode_form(data) -> np.ndarray:
+    """Questionnaire → model-ready feature vector, shape (1, n_features)."""
+    return get_feature_encoder().encode(form_to_row(data))
+
+
+def build_model_input_from_form(data) -> "pd.DataFrame":
+    """Pandas reference encoding of one questionnaire (see encode_form)."""
+    return encode_rows([form_to_row(data)])
+
+
+class CatBoostTreeExplainer:
     """
-    Compute SHAP top-5 risk factors safely using shap.Explainer (not TreeExplainer).
+    Process-wide Tree SHAP explainer over the loaded CatBoost model.
+
+    Uses CatBoost's native ShapValues (the same routine shap.TreeExplainer
+    hands CatBoost models to), so the background distribution is the fixed
+    training-set leaf weights stored in the .cbm file rather than the row
+    being explained.
+    """
+
+    def __init__(self, cb_model, feature_names: list):
+        self.model = cb_model
+        self.feature_names = list(feature_names)
+        # First call initialises CatBoost's SHAP buffers; pay that once here
+        warmup = self.shap_values(np.zeros((1, len(self.feature_names))))
+        self.expected_value = warmup[0, :, -1]
+
+    def shap_values(self, X) -> np.ndarray:
+        """Raw values, shape (rows, classes, features + 1); last slot is the bias."""
+        from catboost import Pool
+
+        return self.model.get_feature_importance(data=Pool(X), type="ShapValues")
+
+    def explain(self, X) -> np.ndarray:
+        """Per-feature contributions toward High Risk, shape (rows, features)."""
+        return self.shap_values(X)[:, HIGH_RISK_CLASS_INDEX, :-1]
+
+
+_explainer = None
+_explainer_lock = threading.Lock()
+
+
+def get_explainer() -> CatBoostTreeExplainer:
+    """Return the shared explainer, building it on first use."""
+    global _explainer
+    if _explainer is None:
+        with _explainer_lock:
+            if _explainer is None:
+                if config.INFERENCE_SOCKET:
+                    # The sidecar owns the explainer; its client has the same explain()
+                    _explainer = get_model()
+                else:
+                    _explainer = CatBoostTreeExplainer(get_model(), get_feature_columns())
+    return _explainer
+
+
+def get_top_features(X, feature_names: list) -> list:
+    """
+    Compute SHAP top-5 risk factors using the cached tree explainer.
     Called ONCE at assessment submission — result stored in DB.
+    Raises on failure (model not loaded, sidecar unreachable, ...): an
+    empty list would be stored as "no factors" and never retried.
     """
     try:
-        explainer = shap.Explainer(model, X.sample(min(50, len(X))))
-        shap_values = explainer(X)
-        values = shap_values.values[0]  # first (only) sample
-        importance = np.abs(values)
-        top_idx = np.argsort(importance)[-5:][::-1]
-
-        return [
-            {
-                "feature": feature_names[i],
-                "impact": round(float(values[i]), 4)
-            }
-            for i in top_idx
-        ]
+        values = get_explainer().explain(X)[0]  # first (only) sample
     except Exception as e:
-        print(f"SHAP ERROR (non-fatal): {e}")
-        return []
+        logger.warning(f"SHAP computation failed: {e}")
+        raise
+    importance = np.abs(values)
+    top_idx = np.argsort(importance)[-5:][::-1]
+
+    return [
+        {
+            "feature": feature_names[i],
+            "impact": round(float(values[i]), 4)
+        }
+        for i in top_idx
+    ]
 
 
 def predict_with_explanation(data) -> dict:
     """
     Build model input, predict, compute SHAP top factors.
     Returns risk_score, risk_level, top_risk_factors.
-    Safe version — uses shap.Explainer, not TreeExplainer.
     """
-    X = build_model_input_from_form(data)
-    feature_names = list(X.columns)
+    X = encode_form(data)
+    feature_names = list(get_feature_columns())
 
     # Predict
-    proba = model.predict_proba(X)[0]
-    # CatBoost class order: [High, Low, Medium] → indices 0,1,2
+    proba = get_model().predict_proba(X)[0]
     high_prob = float(proba[0])
     med_prob  = float(proba[2])
     low_prob  = float(proba[1])
@@ -204,7 +410,10 @@ def predict_with_explanation(data) -> dict:
         risk_level = "Low Risk"
         risk_score = round(low_prob * 100, 1)
 
-    top_factors = get_top_features(X, feature_names)
+    try:
+        top_factors = get_top_features(X, feature_names)
+    except Exception:
+        top_factors = []  # the score stands without an explanation (already logged)
 
     return {
         "risk_level": risk_level,
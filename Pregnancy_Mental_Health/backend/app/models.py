@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, Float, DateTime, func, String, Boolean, JSON, ForeignKey, BigInteger, Date, Time
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Float, DateTime, func, String, Boolean, JSON, ForeignKey, BigInteger, Date, Time, UniqueConstraint, SmallInteger, Index
+from sqlalchemy.orm import relationship, validates
 from .database import Base
+from .utils.risk_bands import risk_band
 from datetime import datetime
 
 class User(Base):
@@ -83,6 +84,15 @@ class PredictionLog(Base):
 
 class Assessment(Base):
     __tablename__ = "assessments" 
+    __table_args__ = (
+        Index("ix_assessments_doctor_band_status", "assigned_doctor_id", "risk_band", "status"),
+        # Per-doctor/nurse/patient lists, newest first (the doctor list pages on (created_at, id))
+        Index("ix_assessments_doctor_created", "assigned_doctor_id", "created_at", "id"),
+        Index("ix_assessments_nurse_created", "nurse_id", "created_at"),
+        Index("ix_assessments_patient_created", "patient_id", "created_at"),
+        Index("ix_assessments_clinician_email_created", "clinician_email", "created_at"),
+        Index("ix_assessments_status_created", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_name = Column(String, nullable=False)
@@ -92,11 +102,12 @@ class Assessment(Base):
     raw_data = Column(JSON, nullable=False)           # full formData as JSON
     risk_score = Column(Float, nullable=False)
     risk_level = Column(String, nullable=False)
+    risk_band = Column(SmallInteger, nullable=True)   # utils/risk_bands: 0 low, 1 moderate, 2 high — set from risk_level
     clinician_risk = Column(String, nullable=True)    # "Low" | "Medium" | "High"
     plan = Column(String, nullable=True)
     notes = Column(String, nullable=True)
     clinician_email = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     epds_score = Column(Integer, nullable=True)
     
 
@@ -107,7 +118,8 @@ class Assessment(Base):
     # Status: draft, submitted, reviewed, complete
     status = Column(String, default="submitted") 
     
-    # SHAP top risk factors — computed once at submission, read by doctor
+    # SHAP top risk factors — filled in by a background job after submission
+    # (NULL while computing), read by doctor
     top_risk_factors = Column(JSON, nullable=True)
 
     # Final decision (if overridden)
@@ -119,16 +131,26 @@ class Assessment(Base):
     # Relationship to Patient
     patient = relationship("Patient", back_populates="assessments")
 
+    @validates("risk_level")
+    def _set_risk_band(self, key, value):
+        # Every write of risk_level (scoring, re-analysis, manual saves) keeps the band in sync
+        self.risk_band = risk_band(value)
+        return value
+
 
 
 class Patient(Base):
     __tablename__ = "patients"
+    __table_args__ = (
+        Index("ix_patients_nurse_created", "created_by_nurse_id", "created_at"),
+        Index("ix_patients_doctor_created", "assigned_doctor_id", "created_at"),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True)
     name = Column(String, nullable=False)
     age = Column(Integer, nullable=True)
     phone = Column(String, nullable=True)
-    email = Column(String, nullable=True)
+    email = Column(String, nullable=True, index=True)
     dob = Column(DateTime(timezone=True), nullable=True)
     blood_group = Column(String, nullable=True)
     address = Column(String, nullable=True)
@@ -143,10 +165,10 @@ class Patient(Base):
     gravida = Column(Integer, nullable=True)
     para = Column(Integer, nullable=True)
 
-    clinician_email = Column(String, nullable=True)
+    clinician_email = Column(String, nullable=True, index=True)
 
     # main link to portal user
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     user = relationship(
         "User",
         back_populates="patient_profile",
@@ -209,13 +231,31 @@ class Notification(Base):
     clinician_email = Column(String, index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+
+class NotificationCounter(Base):
+    """
+    Unread notifications per recipient, so the unread badge is a primary
+    key lookup instead of a COUNT. Maintained in the same transaction as
+    notification writes by services/notification_counters.py;
+    `python rebuild_notification_counters.py` recomputes it from scratch.
+    """
+    __tablename__ = "notification_counters"
+
+    clinician_email = Column(String, primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
+
+
 class FollowUp(Base):
     __tablename__ = "follow_ups"
+    __table_args__ = (
+        Index("ix_follow_ups_patient_scheduled", "patient_id", "scheduled_date"),
+        Index("ix_follow_ups_status_scheduled", "status", "scheduled_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(BigInteger, ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
     patient_email = Column(String, nullable=True) # For patient portal filtering
-    assessment_id = Column(Integer, ForeignKey('assessments.id', ondelete='CASCADE'), nullable=True)
+    assessment_id = Column(Integer, ForeignKey('assessments.id', ondelete='CASCADE'), nullable=True, index=True)
     
     scheduled_date = Column(DateTime(timezone=True), nullable=True)
     status = Column(String, default="pending") # pending, completed, missed
@@ -242,6 +282,13 @@ class AuditLog(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Day/agenda views per doctor, nurse and patient, in (date, time) order
+        Index("ix_appointments_doctor_date", "doctor_id", "date", "time"),
+        Index("ix_appointments_assigned_doctor_date", "assigned_doctor_id", "date", "time"),
+        Index("ix_appointments_nurse_date", "created_by_nurse_id", "date", "time"),
+        Index("ix_appointments_patient_date", "patient_id", "date", "time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(BigInteger, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
@@ -266,6 +313,35 @@ class Appointment(Base):
     
     created_by_nurse_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
 
+class ClinicianStat(Base):
+    """
+    Per-clinician, per-day dashboard counters. Maintained in the same
+    transaction as assessment/patient writes by services/clinician_stats.py;
+    `python rebuild_clinician_stats.py` recomputes it from scratch.
+
+    A row belongs to a nurse (assessments they entered, patients they
+    registered) or a doctor (assessments/patients assigned to them).
+    Assessment counters are bucketed by the assessment's created day,
+    except `reviewed`, which uses the review day.
+    """
+    __tablename__ = "clinician_stats"
+    __table_args__ = (UniqueConstraint("clinician_id", "day", name="uq_clinician_stats_clinician_day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    clinician_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+
+    assessments = Column(Integer, nullable=False, default=0)
+    risk_score_sum = Column(Float, nullable=False, default=0.0)
+    drafts = Column(Integer, nullable=False, default=0)
+    submitted = Column(Integer, nullable=False, default=0)       # awaiting review (submitted/pending)
+    reviewed = Column(Integer, nullable=False, default=0)        # reviewed/approved, by review day
+    high_risk = Column(Integer, nullable=False, default=0)
+    moderate_risk = Column(Integer, nullable=False, default=0)
+    low_risk = Column(Integer, nullable=False, default=0)
+    new_patients = Column(Integer, nullable=False, default=0)
+
+
 class RecoveryRequest(Base):
     __tablename__ = "recovery_requests"
 
@@ -276,6 +352,9 @@ class RecoveryRequest(Base):
     status = Column(String(20), nullable=False, default="pending", index=True)
     requested_from_ip = Column(String(64), nullable=True)
     requested_user_agent = Column(String, nullable=True)
+    # Random per-request secret: the forgot-password page subscribes to
+    # recovery:{push_nonce} to receive the code (see recovery_service)
+    push_nonce = Column(String(64), nullable=True, index=True)
     approved_by_admin_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     approved_at = Column(DateTime(timezone=True), nullable=True)
     rejected_at = Column(DateTime(timezone=True), nullable=True)
@@ -302,4 +381,12 @@ class RecoveryChallenge(Base):
     used_from_ip = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
-    request = relationship("RecoveryRequest", back_populates="challenges")
\ No newline at end of file
+    request = relationship("RecoveryRequest", back_populates="challenges")
+
+class SchemaMigration(Base):
+    """One row per migration in app/migrations.py applied by `python migrate.py`."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,24 +1,141 @@
 # backend/app/rate_limiter.py
-from fastapi import Request, HTTPException, status
-from datetime import datetime, timedelta, timezone
-from collections import defaultdict
-from typing import Dict, Tuple
+"""
+Per-IP, per-endpoint rate limiting with sliding window counters.
+
+Each (ip, endpoint) keeps two counters: requests in the current fixed
+window and in the previous one. The sliding count is
+    previous * (fraction of the previous window still inside the sliding window) + current
+which is O(1) in time and memory per key, unlike keeping every request's
+timestamp. It assumes the previous window's requests were evenly spread,
+so it can be off by a little near window boundaries.
+
+Backends:
+- MemoryBackend (default): counters in this process, split over shards
+  each with its own lock. Limits are per worker.
+- RedisBackend (RATE_LIMIT_REDIS_URL set): counters in a Redis-protocol
+  store (Redis, Valkey, KeyDB...), one round trip per check, so limits
+  hold across workers and instances. If the store is unreachable, checks
+  fall back to this worker's MemoryBackend instead of failing requests.
+"""
 import asyncio
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+from fastapi import Request, HTTPException, status
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+def _sliding_count(previous: int, current: int, window: float, elapsed: float) -> float:
+    return previous * (1 - elapsed / window) + current
+
+
+def _retry_after(previous: int, current: int, limit: int, window: float, elapsed: float) -> int:
+    """Seconds until the sliding count drops below limit (no new requests meanwhile)."""
+    if current < limit and previous > 0:
+        wait = window * (1 - (limit - current) / previous) - elapsed
+    else:
+        # The current window alone is full: wait until it is the previous one
+        # and enough of it has slid out
+        wait = (window - elapsed) + window * (1 - limit / current if current else 0)
+    return max(1, math.ceil(wait))
+
+
+class MemoryBackend:
+    """Sliding window counters in this process, sharded to keep lock hold times short."""
+
+    def __init__(self, shards: int = 64):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    async def hit(self, key: str, limit: int, window: float) -> Optional[int]:
+        return self.hit_sync(key, limit, window)
+
+    def hit_sync(self, key: str, limit: int, window: float) -> Optional[int]:
+        """Count one request for key. Returns None if allowed, else Retry-After seconds."""
+        now = time.monotonic()
+        index, elapsed = divmod(now, window)
+        entries, lock = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            entry = entries.get(key)  # [window index, previous, current, last hit]
+            if entry is None:
+                entry = entries[key] = [index, 0, 0, now]
+            elif entry[0] != index:
+                entry[1] = entry[2] if entry[0] == index - 1 else 0
+                entry[2] = 0
+                entry[0] = index
+            entry[3] = now
+            if _sliding_count(entry[1], entry[2], window, elapsed) >= limit:
+                return _retry_after(entry[1], entry[2], limit, window, elapsed)
+            entry[2] += 1
+            return None
+
+    def cleanup(self, max_window: float) -> int:
+        """Drop keys idle for two of the longest windows. Returns the number dropped."""
+        now = time.monotonic()
+        dropped = 0
+        for entries, lock in self._shards:
+            with lock:
+                # Idle for two windows: nothing of it is left inside the sliding window
+                stale = [k for k, e in entries.items() if now - e[3] > 2 * max_window]
+                for k in stale:
+                    del entries[k]
+                dropped += len(stale)
+        return dropped
+
+    def size(self) -> int:
+        return sum(len(entries) for entries, _ in self._shards)
+
+
+class RedisBackend:
+    """
+    Sliding window counters in a Redis-protocol store, shared by every
+    worker. Uses only INCR/DECR/GET/EXPIRE inside MULTI, so it works with
+    Redis-compatible servers that don't support scripting.
+    """
+
+    def __init__(self, url: str, prefix: str = "ppd:rl:"):
+        import redis.asyncio as redis
+
+        # RESP2: also spoken by servers that predate HELLO (Redis < 6 and most compatibles)
+        self.client = redis.from_url(url, protocol=2, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    async def hit(self, key: str, limit: int, window: float) -> Optional[int]:
+        # Wall clock: windows must line up across workers and hosts
+        index, elapsed = divmod(time.time(), window)
+        index = int(index)
+        current_key = f"{self.prefix}{key}:{index}"
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, int(window * 2) + 1)
+            pipe.get(f"{self.prefix}{key}:{index - 1}")
+            current, _, previous = await pipe.execute()
+
+        previous = int(previous or 0)
+        current -= 1  # count before this request
+        if _sliding_count(previous, current, window, elapsed) >= limit:
+            await self.client.decr(current_key)  # rejected requests don't count
+            return _retry_after(previous, current, limit, window, elapsed)
+        return None
+
+    async def close(self):
+        await self.client.aclose()
 
-# ⚠️ WARNING: In-memory rate limiting only works with single-worker deployments.
-# For multi-worker production (gunicorn -w 4), use Redis-based rate limiting.
-# This implementation will NOT share state across multiple workers!
 
 class RateLimiter:
     """
-    Simple in-memory rate limiter
-    For production, use Redis-based rate limiting
+    Rate limiter used by the middleware in main.py.
+    Limits are per worker unless RATE_LIMIT_REDIS_URL points at a shared store.
     """
-    def __init__(self):
-        # Store: {ip: [(timestamp, endpoint), ...]}
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.lock = asyncio.Lock()
-        
+    def __init__(self, redis_url: Optional[str] = None, shards: int = 64):
+        self.memory = MemoryBackend(shards)
+        self.shared = RedisBackend(redis_url) if redis_url else None
+
         # Rate limits: (max_requests, time_window_seconds)
         self.limits = {
             "/api/login": (20, 60),  # 20 attempts per minute
@@ -27,7 +144,39 @@ class RateLimiter:
             "/api/reset-password": (10, 3600),  # 10 resets per hour
             "default": (200, 60),  # 200 requests per minute for other endpoints
         }
-    
+
+        self.checks = 0
+        self.rejected = 0
+        self.fallbacks = 0
+        self._last_fallback_log = 0.0
+
+    async def hit(self, client_ip: str, endpoint: str) -> Optional[int]:
+        """Count one request. Returns None if allowed, else Retry-After seconds."""
+        max_requests, window_seconds = self.limits.get(endpoint, self.limits["default"])
+        key = f"{client_ip}|{endpoint}"
+        self.checks += 1
+
+        retry_after = None
+        if self.shared is not None:
+            try:
+                retry_after = await self.shared.hit(key, max_requests, window_seconds)
+            except Exception as e:
+                self._fallback(e)
+                retry_after = self.memory.hit_sync(key, max_requests, window_seconds)
+        else:
+            retry_after = self.memory.hit_sync(key, max_requests, window_seconds)
+
+        if retry_after is not None:
+            self.rejected += 1
+        return retry_after
+
+    def _fallback(self, error: Exception):
+        self.fallbacks += 1
+        now = time.monotonic()
+        if now - self._last_fallback_log > 60:  # don't log every request during an outage
+            self._last_fallback_log = now
+            logger.warning(f"Rate limit store unavailable, using per-worker limits: {error}")
+
     async def check_rate_limit(self, request: Request):
         """
         Check if request exceeds rate limit
@@ -39,58 +188,38 @@ class RateLimiter:
         else:
             forwarded_for = request.headers.get("X-Forwarded-For", "")
             client_ip = forwarded_for.split(",")[0].strip() or "unknown"
-        endpoint = request.url.path
-        
-        # Get rate limit for this endpoint
-        max_requests, window_seconds = self.limits.get(endpoint, self.limits["default"])
-        
-        async with self.lock:
-            now = datetime.now(timezone.utc)
-            cutoff = now - timedelta(seconds=window_seconds)
-            
-            # Clean old requests
-            self.requests[client_ip] = [
-                (ts, ep) for ts, ep in self.requests[client_ip]
-                if ts > cutoff
-            ]
-            
-            # Count requests to this endpoint in time window
-            endpoint_requests = [
-                ts for ts, ep in self.requests[client_ip]
-                if ep == endpoint
-            ]
-            
-            if len(endpoint_requests) >= max_requests:
-                retry_after = int((endpoint_requests[0] - cutoff).total_seconds())
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Rate limit exceeded. Try again in {retry_after} seconds.",
-                    headers={"Retry-After": str(retry_after)}
-                )
-            
-            # Add current request
-            self.requests[client_ip].append((now, endpoint))
-    
+
+        retry_after = await self.hit(client_ip, request.url.path)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded. Try again in {retry_after} seconds.",
+                headers={"Retry-After": str(retry_after)}
+            )
+
     async def cleanup_old_entries(self):
         """
-        Periodic cleanup of old entries (run as background task)
+        Periodic cleanup of idle in-memory counters (run as background task).
+        Keys in the shared store expire on their own.
         """
+        longest_window = max(window for _, window in self.limits.values())
         while True:
-            await asyncio.sleep(3600)  # Clean every hour
-            async with self.lock:
-                now = datetime.now(timezone.utc)
-                cutoff = now - timedelta(hours=2)
-                
-                # Remove IPs with no recent requests
-                ips_to_remove = []
-                for ip, requests in self.requests.items():
-                    self.requests[ip] = [(ts, ep) for ts, ep in requests if ts > cutoff]
-                    if not self.requests[ip]:
-                        ips_to_remove.append(ip)
-                
-                for ip in ips_to_remove:
-                    del self.requests[ip]
+            await asyncio.sleep(600)
+            self.memory.cleanup(longest_window)
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+    def metrics(self) -> dict:
+        return {
+            "backend": "redis" if self.shared is not None else "memory",
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "fallbacks": self.fallbacks,
+            "memory_keys": self.memory.size(),
+        }
 
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(config.RATE_LIMIT_REDIS_URL)
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from ..database import get_db
+from ..database import get_db, get_async_db
 from .. import models, schemas
 from ..jwt_handler import get_current_user_email, get_current_user
+from ..services.principal_cache import Principal, principal_cache
 from ..config import DEFAULT_USER_PASSWORD
-from sqlalchemy import func, cast, Date
+from sqlalchemy import func, cast, Date, delete, select, update
 from datetime import datetime, timedelta, timezone
 from ..security import hash_password, pwd_context
 import secrets
@@ -13,8 +15,13 @@ import string
 from fastapi.responses import StreamingResponse
 import csv
 import io
-import json
-from ..utils.websocket_manager import manager
+from ..utils.websocket_manager import manager, role_channel
+from ..utils import risk_bands
+from ..services.inference_pool import inference_pool
+from ..services.prediction_cache import prediction_cache
+from ..services.db_pool import async_pool_metrics, pool_metrics
+from ..services.presence import presence
+from ..rate_limiter import rate_limiter
 # from app.schemas.audit import AuditLogCreate, AuditLogRead
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -26,16 +33,6 @@ def require_admin(
         raise HTTPException(status_code=403, detail="Admin access required")
     return admin
 
-def get_online_status(last_active: datetime | None) -> bool:
-    if not last_active:
-        return False
-    # Ensure both are timezone aware for comparison
-    now = datetime.now(timezone.utc)
-    # Ensure last_active is timezone-aware
-    if last_active.tzinfo is None:
-        last_active = last_active.replace(tzinfo=timezone.utc)
-    return (now - last_active).total_seconds() < 300 # 5 minutes
-
 @router.get("/users", response_model=List[schemas.UserOut])
 def get_all_users(
     db: Session = Depends(get_db),
@@ -43,7 +40,7 @@ def get_all_users(
 ):
     users = db.query(models.User).all()
     for u in users:
-        u.is_online = get_online_status(u.last_active)
+        u.is_online = presence.is_online(u)
     return users
 
 @router.post("/users", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
@@ -148,7 +145,7 @@ def get_admin_dashboard(
             "email": u.email,
             "role": u.role.capitalize(),
             "status": "Active" if u.is_active else "Suspended",
-            "is_online": get_online_status(u.last_active),
+            "is_online": presence.is_online(u),
             "joined": joined_ago
         })
 
@@ -173,7 +170,7 @@ def get_clinicians(
 ):
     clinicians = db.query(models.User).filter(models.User.role.in_(["doctor", "nurse"])).all()
     for c in clinicians:
-        c.is_online = get_online_status(c.last_active)
+        c.is_online = presence.is_online(c)
     return clinicians
 
 @router.patch("/users/{user_id}/status", response_model=schemas.UserOut)
@@ -198,10 +195,10 @@ def update_user_status(
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin=Depends(require_admin),
 ):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -217,94 +214,94 @@ async def delete_user(
         from sqlalchemy import or_
         
         # 1. Delete mood entries
-        db.query(models.MoodEntry).filter(
+        await db.execute(delete(models.MoodEntry).where(
             models.MoodEntry.user_id == user_id
-        ).delete(synchronize_session=False)
+        ).execution_options(synchronize_session=False))
         
         # 2. Delete messages (both sent and received) - ✅ Fixed OR condition
-        db.query(models.Message).filter(
+        await db.execute(delete(models.Message).where(
             or_(
                 models.Message.sender_id == user_id,
                 models.Message.receiver_id == user_id
             )
-        ).delete(synchronize_session=False)
+        ).execution_options(synchronize_session=False))
         
         # 3. Delete recovery challenges first, then requests
-        recovery_ids = [
-            r.id for r in db.query(models.RecoveryRequest.id)
-            .filter(models.RecoveryRequest.user_id == user_id).all()
-        ]
+        recovery_ids = (await db.scalars(
+            select(models.RecoveryRequest.id)
+            .where(models.RecoveryRequest.user_id == user_id)
+        )).all()
         if recovery_ids:
-            db.query(models.RecoveryChallenge).filter(
+            await db.execute(delete(models.RecoveryChallenge).where(
                 models.RecoveryChallenge.recovery_request_id.in_(recovery_ids)
-            ).delete(synchronize_session=False)
+            ).execution_options(synchronize_session=False))
         
-        db.query(models.RecoveryRequest).filter(
+        await db.execute(delete(models.RecoveryRequest).where(
             models.RecoveryRequest.user_id == user_id
-        ).delete(synchronize_session=False)
+        ).execution_options(synchronize_session=False))
         
         # 4. Handle assessments - set foreign keys to NULL for assessments created by this user
-        db.query(models.Assessment).filter(
+        await db.execute(update(models.Assessment).where(
             models.Assessment.nurse_id == user_id
-        ).update({"nurse_id": None}, synchronize_session=False)
+        ).values(nurse_id=None).execution_options(synchronize_session=False))
         
-        db.query(models.Assessment).filter(
+        await db.execute(update(models.Assessment).where(
             models.Assessment.assigned_doctor_id == user_id
-        ).update({"assigned_doctor_id": None}, synchronize_session=False)
+        ).values(assigned_doctor_id=None).execution_options(synchronize_session=False))
         
-        db.query(models.Assessment).filter(
+        await db.execute(update(models.Assessment).where(
             models.Assessment.overridden_by == user_id
-        ).update({"overridden_by": None}, synchronize_session=False)
+        ).values(overridden_by=None).execution_options(synchronize_session=False))
         
         # 5. Handle patient records - if this user is a patient, delete their patient profile
         # This will cascade to delete assessments, follow-ups, and appointments via the model relationships
-        patient = db.query(models.Patient).filter(models.Patient.user_id == user_id).first()
+        patient = await db.scalar(select(models.Patient).where(models.Patient.user_id == user_id).limit(1))
         if patient:
-            db.delete(patient)
-            db.flush()  # ✅ Flush so cascade completes before next steps
+            await db.delete(patient)
+            await db.flush()  # ✅ Flush so cascade completes before next steps
         
         # 6. Handle patients created/assigned by this user (doctor/nurse)
         # Set foreign keys to NULL instead of deleting patients
-        db.query(models.Patient).filter(
+        await db.execute(update(models.Patient).where(
             models.Patient.created_by_nurse_id == user_id
-        ).update({"created_by_nurse_id": None}, synchronize_session=False)
+        ).values(created_by_nurse_id=None).execution_options(synchronize_session=False))
         
-        db.query(models.Patient).filter(
+        await db.execute(update(models.Patient).where(
             models.Patient.assigned_doctor_id == user_id
-        ).update({"assigned_doctor_id": None}, synchronize_session=False)
+        ).values(assigned_doctor_id=None).execution_options(synchronize_session=False))
         
-        db.query(models.Patient).filter(
+        await db.execute(update(models.Patient).where(
             models.Patient.doctor_id == user_id
-        ).update({"doctor_id": None}, synchronize_session=False)
+        ).values(doctor_id=None).execution_options(synchronize_session=False))
         
         # 7. Handle appointments - delete appointments where this user is the doctor
         # Appointments where this user is assigned_doctor will be set to NULL
-        db.query(models.Appointment).filter(
+        await db.execute(delete(models.Appointment).where(
             models.Appointment.doctor_id == user_id
-        ).delete(synchronize_session=False)
+        ).execution_options(synchronize_session=False))
         
-        db.query(models.Appointment).filter(
+        await db.execute(update(models.Appointment).where(
             models.Appointment.assigned_doctor_id == user_id
-        ).update({"assigned_doctor_id": None}, synchronize_session=False)
+        ).values(assigned_doctor_id=None).execution_options(synchronize_session=False))
         
         # 8. Handle notifications - delete notifications for this user
-        db.query(models.Notification).filter(
+        await db.execute(delete(models.Notification).where(
             models.Notification.clinician_email == user_email
-        ).delete(synchronize_session=False)
+        ).execution_options(synchronize_session=False))
         
         # 9. Handle follow-ups - delete follow-ups created by this user
-        db.query(models.FollowUp).filter(
+        await db.execute(delete(models.FollowUp).where(
             models.FollowUp.clinician_email == user_email
-        ).delete(synchronize_session=False)
+        ).execution_options(synchronize_session=False))
         
         # 10. Handle audit logs - keep audit logs for historical purposes but could optionally delete
         # db.query(models.AuditLog).filter(models.AuditLog.user_id == user_id).delete()
         
         # 11. Finally delete the user - this will trigger any remaining cascade deletes
-        db.delete(user)
+        await db.delete(user)
         
         # Commit all changes
-        db.commit()
+        await db.commit()
         
         # 12. Log the deletion for audit purposes - ✅ AFTER commit using saved variables
         try:
@@ -319,15 +316,15 @@ async def delete_user(
         except Exception as audit_error:
             print(f"Failed to log user deletion: {audit_error}")
         
-        # 13. Broadcast update to all connected clients
-        await manager.broadcast(json.dumps({
+        # 13. Push update to connected admin screens
+        await manager.publish(role_channel("admin"), {
             "type": "user_deleted", 
             "userId": user_id_copy,
             "message": f"User {user_full_name} and all associated data has been permanently deleted"
-        }))
+        }, coalesce=True)
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500, 
             detail=f"Failed to delete user and associated data: {str(e)}"
@@ -450,15 +447,15 @@ def get_dashboard_analytics(
         # ===== RISK LEVEL DISTRIBUTION (Aggregated, no patient details) =====
         risk_distribution = []
         risk_levels = db.query(
-            models.Assessment.risk_level,
+            models.Assessment.risk_band,
             func.count(models.Assessment.id).label("count")
         ).filter(
-            models.Assessment.risk_level.isnot(None)
-        ).group_by(models.Assessment.risk_level).all()
+            models.Assessment.risk_band.isnot(None)
+        ).group_by(models.Assessment.risk_band).order_by(models.Assessment.risk_band).all()
         
-        for risk_level, count in risk_levels:
+        for band, count in risk_levels:
             risk_distribution.append({
-                "name": risk_level,
+                "name": risk_bands.LABELS[band],
                 "value": count
             })
         
@@ -589,7 +586,7 @@ def create_audit_log(
     log_in: schemas.AuditLogCreate,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     # Use IP from frontend if provided, otherwise extract from request
     ip = log_in.ip_address
@@ -642,4 +639,46 @@ def get_assessments_count(db: Session = Depends(get_db)):
         return {"total_assessments": total_assessments}
     except Exception as e:
         print("Error counting assessments:", e)
-        raise HTTPException(status_code=500, detail="Failed to fetch assessments count")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to fetch assessments count")
+
+
+@router.get("/metrics/inference")
+def get_inference_metrics(admin=Depends(require_admin)):
+    """Queue depth, wait/run times and rejections for the ML inference pool"""
+    return inference_pool.metrics()
+
+
+@router.get("/metrics/prediction-cache")
+def get_prediction_cache_metrics(admin=Depends(require_admin)):
+    """Hit/miss counters and size of the scoring + SHAP result cache"""
+    return prediction_cache.metrics()
+
+
+@router.get("/metrics/db-pool")
+def get_db_pool_metrics(admin=Depends(require_admin)):
+    """Checkout wait times, new connections and live status of the sync and async engines' connection pools"""
+    return {"sync": pool_metrics.metrics(), "async": async_pool_metrics.metrics()}
+
+
+@router.get("/metrics/presence")
+def get_presence_metrics(admin=Depends(require_admin)):
+    """Pending and flushed last_active updates of the presence tracker"""
+    return presence.metrics()
+
+
+@router.get("/metrics/principal-cache")
+def get_principal_cache_metrics(admin=Depends(require_admin)):
+    """Hit rate, size and invalidations of the authenticated-principal cache"""
+    return principal_cache.metrics()
+
+
+@router.get("/metrics/rate-limiter")
+def get_rate_limiter_metrics(admin=Depends(require_admin)):
+    """Backend, checks, rejections and shared-store fallbacks of the rate limiter"""
+    return rate_limiter.metrics()
+
+
+@router.get("/metrics/websockets")
+def get_websocket_metrics(admin=Depends(require_admin)):
+    """Open sockets, channels, send queue depth, dropped messages and event bus counters of the WebSocket manager"""
+    return manager.metrics()
@@ -1,139 +1,70 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, status, UploadFile, BackgroundTasks
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import pandas as pd
 from typing import List, Optional
 import logging
 from datetime import datetime, timedelta
 import io
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
 
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..schemas import AssessmentCreate, AssessmentResult, AssessmentSave, ReferralRequest, AssessmentReview
-from ..ml_model import model, feature_columns, build_model_input_from_form
+from ..services.scoring_service import score_assessment, cached_score, predict_batch, MAX_BATCH_SIZE
+from ..services.inference_pool import inference_pool
+from ..services.explanation_service import compute_top_risk_factors
 from .. import models, config
 from ..jwt_handler import get_current_user_email, get_current_user
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="", tags=["assessments"])
 logger = logging.getLogger(__name__)
 
 
 @router.post("/assessments/predict", response_model=AssessmentResult)
-def predict_assessment(payload: AssessmentCreate):
-    # 1) Build 1-row dataframe with same raw columns as training
+async def predict_assessment(payload: AssessmentCreate):
     try:
-        df_input = build_model_input_from_form(payload)  # DataFrame with 26 cols
+        result = cached_score(payload) or await inference_pool.run_async(
+            score_assessment, payload, use_cache=False
+        )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-
-    # 2) Align columns with training feature_columns (fill missing with 0)
-    X_aligned = df_input.reindex(columns=feature_columns, fill_value=0)
-
-    try:
-        # 4) Predict EPDS Result class and probabilities
-        cat_classes = list(model.classes_)
-        pred_class = model.predict(X_aligned)[0]
-
-        # convert numeric prediction to label
-        if isinstance(pred_class, (int, float)):
-            label_map = {0: "High", 1: "Low", 2: "Medium"}
-            pred_class = label_map.get(int(pred_class), "Medium")
-        proba = model.predict_proba(X_aligned)[0]  # e.g. [p0, p1, p2]
-
-    # Using the LabelEncoder order ['High', 'Low', 'Medium'] -> 0,1,2
-        # so:
-        high_prob = float(proba[0])
-        low_prob = float(proba[1])
-        med_prob = float(proba[2])
-
-        # Choose model_risk by max probability
-        if high_prob >= med_prob and high_prob >= low_prob:
-            model_risk = "High Risk"
-        elif med_prob >= low_prob:
-            model_risk = "Moderate Risk"
-        else:
-            model_risk = "Low Risk"
-
-        # Base scores
-        if model_risk == "High Risk":
-            base_score = 85.0
-        elif model_risk == "Moderate Risk":
-            base_score = 55.0
-        else:
-            base_score = 25.0
-
-        # Confidence of chosen class
-        if model_risk == "High Risk":
-            confidence = high_prob
-        elif model_risk == "Moderate Risk":
-            confidence = med_prob
-        else:
-            confidence = low_prob
-
-        model_score = base_score + (confidence - 0.5) * 20.0
-        model_score = max(0.0, min(100.0, model_score))
-
-        logger.info(
-            f"CatBoost prediction - probs: {proba}"
-        )
-        logger.info(
-            f"CatBoost model risk: {model_risk}, "
-            f"base_score: {base_score:.1f}, "
-            f"confidence: {confidence:.3f}, "
-            f"model_score: {model_score:.1f}"
+    except Exception as e:
+        logger.error(f"ML Model failed: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="Model prediction failed. Please contact admin."
         )
 
+    # response_model=AssessmentResult expects risk_level + score
+    return result.to_result()
 
-
-        # 5) EPDS total and scaled (0–100)
-        epds_items = [
-            int(payload.epds_1),
-            int(payload.epds_2),
-            int(payload.epds_3),
-            int(payload.epds_4),
-            int(payload.epds_5),
-            int(payload.epds_6),
-            int(payload.epds_7),
-            int(payload.epds_8),
-            int(payload.epds_9),
-            int(payload.epds_10),
-        ]
-        epds_total = sum(epds_items)
-        epds_scaled = (epds_total / 30.0) * 100.0
-
-        # 6) 70/30 combined score
-        final_score = 0.7 * model_score + 0.3 * epds_scaled
-
-        # 7) Map final_score → final risk level (based on combined score)
-        if final_score >= 70:
-            final_risk = "High Risk"
-        elif final_score >= 40:
-            final_risk = "Moderate Risk"
-        else:
-            final_risk = "Low Risk"
-
-
-        logger.info(
-            f"FINAL OUTPUT -> model_risk={model_risk}, model_score={model_score:.1f}, "
-            f"epds_total={epds_total}, epds_scaled={epds_scaled:.1f}, "
-            f"final_score={final_score:.1f}, final_risk={final_risk}"
+@router.post("/assessments/predict/batch", response_model=List[AssessmentResult])
+async def predict_assessment_batch(payloads: List[AssessmentCreate]):
+    """Score a roster of assessments with a single model call."""
+    if not payloads:
+        return []
+    if len(payloads) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(payloads)} assessments (max {MAX_BATCH_SIZE})"
         )
 
+    try:
+        results = await inference_pool.run_async(predict_batch, payloads)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"ML Model failed: {e}", exc_info=True)
+        logger.error(f"Batch ML prediction failed: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail="Model prediction failed. Please contact admin."
         )
 
-    # response_model=AssessmentResult expects risk_level + score
-    return AssessmentResult(
-        risk_level=final_risk,
-        score=final_score,
-    )
+    return [r.to_result() for r in results]
 
 def calculate_weighted_risk_score(features) -> float:
     """
@@ -170,6 +101,13 @@ def save_assessment(
     current_user_email: str = Depends(get_current_user_email),
     db: Session = Depends(get_db)
 ):
+    # assessments.risk_score is NOT NULL: say so instead of failing the INSERT with a 500
+    if payload.risk_score is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="risk_score is required to save an assessment",
+        )
+
     # --- START FIX: Robust linkage ---
     # 1. If patient_id is a temporary ID (frontend timestamp), it won't exist in DB
     final_patient_id = payload.patient_id
@@ -192,27 +130,14 @@ def save_assessment(
     # --- END FIX ---
 
     # Get current user
-    from .. import models
     current_user = db.query(models.User).filter(models.User.email == current_user_email).first()
 
-    # Compute SHAP top risk factors once at submission (safe, stored in DB)
-    top_risk_factors = []
-    if payload.raw_data:
-        try:
-            from types import SimpleNamespace
-            from ..ml_model import get_top_features, build_model_input_from_form
-            data_obj = SimpleNamespace(**payload.raw_data)
-            X = build_model_input_from_form(data_obj)
-            top_risk_factors = get_top_features(X, list(X.columns))
-        except Exception as shap_err:
-            logger.warning(f"SHAP computation skipped at submission: {shap_err}")
-
     assessment = models.Assessment(
         patient_name=payload.patient_name,
         patient_id=final_patient_id,
         patient_email=patient.email if patient else None,
         raw_data=payload.raw_data,
-        risk_score=payload.score,
+        risk_score=payload.risk_score,
         risk_level=payload.risk_level,
         clinician_risk=payload.clinician_risk,
         plan=payload.plan,
@@ -221,12 +146,16 @@ def save_assessment(
         nurse_id=current_user.id if current_user and current_user.role == "nurse" else payload.nurse_id,
         assigned_doctor_id=payload.assigned_doctor_id or payload.doctor_id,
         status=payload.status,
-        top_risk_factors=top_risk_factors,
+        top_risk_factors=None,  # filled in by the background SHAP job
     )
     db.add(assessment)
     db.commit()
     db.refresh(assessment)
 
+    # Explain off the request path; the doctor's review screen updates over WebSocket
+    if assessment.raw_data and assessment.status != "draft":
+        background_tasks.add_task(compute_top_risk_factors, assessment.id)
+
     # Only trigger notifications/scheduling if submitted (not draft)
     if assessment.status == "submitted":
         # --- START: Trigger Notifications & Auto-Scheduling ---
@@ -529,6 +458,13 @@ def get_risk_color(risk_level: str) -> str:
 
 def generate_referral_pdf(patient_name, risk_score, risk_level, risk_factors, clinician_notes, assessment_id):
     """Generates a professional PDF report for the referral"""
+    # reportlab is only needed here; importing it lazily keeps worker start-up fast
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
     styles = getSampleStyleSheet()
@@ -631,31 +567,31 @@ def generate_referral_pdf(patient_name, risk_score, risk_level, risk_factors, cl
 @router.post("/referrals")
 async def create_referral(
     payload: ReferralRequest,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Processes a referral (email sending disabled).
     """
     # 1) Fetch patient email
-    assessment = db.query(models.Assessment).filter(models.Assessment.id == payload.assessment_id).first()
+    assessment = await db.get(models.Assessment, payload.assessment_id)
     if not assessment:
         raise HTTPException(status_code=404, detail="Assessment not found")
     
-    patient = db.query(models.Patient).filter(models.Patient.id == assessment.patient_id).first()
+    patient = await db.get(models.Patient, assessment.patient_id) if assessment.patient_id is not None else None
     
     # --- START FIX: Fallback linkage for referrals ---
     if not patient and assessment.patient_name:
         logger.info(f"Patient not found by ID {assessment.patient_id}. Attempting search by name: {assessment.patient_name}")
-        patient = db.query(models.Patient).filter(
+        patient = await db.scalar(select(models.Patient).where(
             models.Patient.name == assessment.patient_name,
             models.Patient.clinician_email == current_user.email
-        ).first()
+        ).limit(1))
         
         if patient:
             # Update the assessment with the correct ID for future
             assessment.patient_id = patient.id
-            db.commit()
+            await db.commit()
             logger.info(f"Fixed assessment #{assessment.id} linkage - linked to patient '{patient.name}' (ID: {patient.id})")
     # --- END FIX ---
 
@@ -684,7 +620,7 @@ async def create_referral(
             is_read=False
         )
         db.add(ref_notif)
-        db.commit()
+        await db.commit()
         
         return {
             "status": "success",
@@ -1,155 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional
+from ..database import get_db, get_async_db
 from .. import models, schemas
 from ..jwt_handler import get_current_user_email, get_current_user
-from sqlalchemy import func, and_, or_
+from ..services.principal_cache import Principal
+from sqlalchemy import func, and_, or_, select
 from datetime import datetime, timedelta, date
+import base64
 import logging
 from app.models import User, Assessment, Patient, Appointment
-from app.ml_model import model, feature_columns, build_model_input_from_form
+from app.services.scoring_service import score_assessment, cached_score
+from app.services.inference_pool import inference_pool
+from app.services.explanation_service import explanation_status, is_stale, compute_top_risk_factors
+from app.services import clinician_stats
+from app.utils import risk_bands
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/doctor", tags=["doctor"])
 
+# Largest page accepted by the cursor-paginated /doctor/assessments listing
+MAX_PAGE_SIZE = 200
+
 
 @router.get("/dashboard")
 async def get_doctor_dashboard(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Get doctor dashboard data"""
+    """Get doctor dashboard data (counters come from the clinician_stats rollup)"""
     try:
-        # Stats
-        pending = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            Assessment.status.in_(['submitted', 'pending'])
-        ).count()
-        
-        high_risk = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            func.lower(func.trim(Assessment.risk_level)).in_(['high', 'high risk'])
-        ).count()
-        
-        # Reviewed this week
-        week_ago = datetime.now() - timedelta(days=7)
-        reviewed_week = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            Assessment.status.in_(["reviewed", "approved"]),
-            Assessment.reviewed_at >= week_ago,
-            Assessment.reviewed_at.isnot(None)
-        ).count()
-        
-        # Total patients
-        total_patients = db.query(Assessment.patient_id).filter(
-            Assessment.assigned_doctor_id == current_user.id
-        ).distinct().count()
-        
+        week = clinician_stats.last_days(7)
+        totals = await clinician_stats.summary_async(db, current_user.id, recent_since=week[0])
+        days = await clinician_stats.daily_async(db, current_user.id, start=week[0])
+
         # Urgent cases (high risk + submitted)
-        urgent_cases = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            func.lower(func.trim(Assessment.risk_level)).in_(['high', 'high risk']),
-            func.lower(Assessment.status).in_(['submitted', 'pending'])
-        ).limit(5).all()
+        urgent_cases = (await db.execute(
+            select(Assessment.id, Assessment.patient_name, Assessment.risk_score, Patient.name)
+            .outerjoin(Patient, Assessment.patient_id == Patient.id)
+            .where(
+                Assessment.assigned_doctor_id == current_user.id,
+                Assessment.risk_band == risk_bands.HIGH,
+                Assessment.status.in_(['submitted', 'pending'])
+            )
+            .limit(5)
+        )).all()
 
         urgent_list = []
         for a in urgent_cases:
             urgent_list.append({
                 "id": a.id,
-                "patient_name": a.patient.name if a.patient else a.patient_name,
+                "patient_name": a.name or a.patient_name,
                 "score": a.risk_score,  # ✅ Changed: Don't show EPDS until validated
                 "risk_score": a.risk_score
             })
-        
-        # Weekly trend data (last 7 days)
+
+        # Weekly trend data (last 7 days): average risk score per day
         trend = []
-        for i in range(6, -1, -1):
-            day = datetime.now() - timedelta(days=i)
-            day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day.replace(hour=23, minute=59, second=59, microsecond=999999)
-            
-            avg_score = db.query(func.avg(Assessment.risk_score)).filter(
-                Assessment.assigned_doctor_id == current_user.id,
-                Assessment.created_at.between(day_start, day_end)
-            ).scalar()
-            
+        for day in week:
+            stat = days.get(day)
+            avg_score = stat.risk_score_sum / stat.assessments if stat and stat.assessments else None
             trend.append({
                 "name": day.strftime("%a"),
                 "score": round(float(avg_score), 1) if avg_score else 0
             })
-        
-       # Risk distribution - Match the exact database values with spaces
-        low_count = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            func.lower(func.trim(Assessment.risk_level)).in_(['low risk', 'low'])
-        ).count()
-
-        moderate_count = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            func.lower(func.trim(Assessment.risk_level)).in_([
-                'moderate risk', 'moderate', 'medium risk', 'medium'
-            ])
-        ).count()
-
-        high_count = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            func.lower(func.trim(Assessment.risk_level)).in_(['high', 'high risk'])
-        ).count()
 
-        print(f"Risk Distribution - Low: {low_count}, Moderate: {moderate_count}, High: {high_count}")
+        print(f"Risk Distribution - Low: {totals.low_risk}, Moderate: {totals.moderate_risk}, High: {totals.high_risk}")
 
         distribution = [
-            {"name": "Low Risk", "value": low_count},
-            {"name": "Moderate Risk", "value": moderate_count},
-            {"name": "High Risk", "value": high_count}
+            {"name": "Low Risk", "value": totals.low_risk},
+            {"name": "Moderate Risk", "value": totals.moderate_risk},
+            {"name": "High Risk", "value": totals.high_risk}
         ]
 
-        today = datetime.now().date()
-
-        today_start = datetime.combine(datetime.today(), datetime.min.time())
-        today_end = datetime.combine(datetime.today(), datetime.max.time())
-
-        today_apps = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            Assessment.created_at >= today_start,
-            Assessment.created_at <= today_end
-        ).count()
-        
-        # Calculate trends (last 7 days vs previous 7 days)
-        last_7d = datetime.now() - timedelta(days=7)
-        prev_7d = datetime.now() - timedelta(days=14)
-        
-        pending_last_7d = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            Assessment.status.in_(['submitted', 'pending']),
-            Assessment.created_at >= last_7d
-        ).count()
-        
-        high_risk_last_7d = db.query(Assessment).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            func.lower(func.trim(Assessment.risk_level)).in_(['high', 'high risk']),
-            Assessment.created_at >= last_7d
-        ).count()
-        
-        total_patients_last_7d = db.query(Assessment.patient_id).filter(
-            Assessment.assigned_doctor_id == current_user.id,
-            Assessment.created_at >= last_7d
-        ).distinct().count()
+        today_apps = days[week[-1]].assessments if week[-1] in days else 0
 
         return {
             "stats": {
-                "pending": pending,
-                "high": high_risk,
-                "reviewed_week": reviewed_week,
+                "pending": totals.submitted,
+                "high": totals.high_risk,
+                "reviewed_week": totals.recent_reviewed,
                 "today_apps": today_apps,
-                "total": total_patients,
+                "total": totals.new_patients,
                 "trends": {
-                    "pending": f"+{pending_last_7d}" if pending_last_7d > 0 else "0",
-                    "high": f"+{high_risk_last_7d}" if high_risk_last_7d > 0 else "0",
-                    "reviewed_week": f"+{reviewed_week}", # Already weekly
-                    "total": f"+{total_patients_last_7d}" if total_patients_last_7d > 0 else "0",
+                    "pending": f"+{totals.recent_submitted}" if totals.recent_submitted > 0 else "0",
+                    "high": f"+{totals.recent_high_risk}" if totals.recent_high_risk > 0 else "0",
+                    "reviewed_week": f"+{totals.recent_reviewed}", # Already weekly
+                    "total": f"+{totals.recent_new_patients}" if totals.recent_new_patients > 0 else "0",
                     "today_apps": f"+{today_apps}" if today_apps > 0 else "0"
                 }
             },
@@ -163,34 +102,21 @@ async def get_doctor_dashboard(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/assessments/predict", response_model=schemas.AssessmentResult)
-def predict_assessment(payload: schemas.AssessmentCreate):
-    # 1) Build input DataFrame
-    df_input = build_model_input_from_form(payload)
-    X_aligned = df_input.reindex(columns=feature_columns, fill_value=0)
-
+async def predict_assessment(payload: schemas.AssessmentCreate):
     try:
-        # 2) Predict class and probabilities from CatBoost
-        pred_class_num = model.predict(X_aligned)[0]           # numeric class
-        proba = model.predict_proba(X_aligned)[0]             # probability array
-
-        # Map numeric class → label
-        label_map = {0: "High Risk", 1: "Low Risk", 2: "Moderate Risk"}    # based on your model
-        pred_label = label_map.get(int(pred_class_num), "Medium")
-
-        # 3) Determine model score as % confidence
-        class_idx = int(pred_class_num)
-        confidence = float(proba[class_idx])
-        model_score = round(confidence * 100, 1)              # 0-100%
+        # 1) One predict_proba pass via the shared scoring service
+        result = cached_score(payload) or await inference_pool.run_async(
+            score_assessment, payload, use_cache=False
+        )
 
-        # 4) Calculate EPDS total and scaled
-        epds_items = [int(getattr(payload, f"epds_{i}")) for i in range(1, 11)]
-        epds_total = sum(epds_items)
-        epds_scaled = (epds_total / 30) * 100
+        # 2) This endpoint scores the model as % confidence of the predicted class
+        model_score = round(result.confidence * 100, 1)
+        epds_scaled = (result.epds_total / 30) * 100
 
-        # 5) Combine model + EPDS (70/30)
+        # 3) Combine model + EPDS (70/30)
         final_score = 0.7 * model_score + 0.3 * epds_scaled
 
-        # 6) Final risk level
+        # 4) Final risk level
         if final_score >= 70:
             final_risk = "High Risk"
         elif final_score >= 40:
@@ -198,10 +124,12 @@ def predict_assessment(payload: schemas.AssessmentCreate):
         else:
             final_risk = "Low Risk"
 
-        logger.info(f"Predicted: {pred_label}, Confidence: {confidence:.2f}, "
+        logger.info(f"Predicted: {result.model_risk}, Confidence: {result.confidence:.2f}, "
                     f"Model Score: {model_score:.1f}, EPDS Score: {epds_scaled:.1f}, "
                     f"Final Score: {final_score:.1f}, Final Risk: {final_risk}")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"ML prediction failed: {e}", exc_info=True)
         raise HTTPException(
@@ -279,11 +207,11 @@ def analyze_existing_assessment(
             epds_10=raw.get("epds_10", "0"),
         )
         
-        # Import the prediction function from assessments router
-        from ..routers.assessments import predict_assessment
-        
-        # Call the prediction
-        result = predict_assessment(payload)
+        # 3️⃣ Score with the shared scoring service
+        # Re-analysing an unchanged form is a cache hit and skips the pool
+        result = cached_score(payload) or inference_pool.run(
+            score_assessment, payload, use_cache=False
+        )
         
         # 4️⃣ Update the assessment with results
         assessment.risk_level = result.risk_level
@@ -296,9 +224,10 @@ def analyze_existing_assessment(
         
         logger.info(f"Analyzed assessment #{assessment_id} -> {result.risk_level}, score: {result.score:.1f}")
         
-        return result
-
+        return result.to_result()
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to analyze assessment #{assessment_id}: {e}", exc_info=True)
         raise HTTPException(
@@ -316,12 +245,33 @@ def band_and_first_days(risk_level: str) -> int:
     return 14   # Low
 
 
+def _encode_cursor(created_at: datetime, assessment_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{assessment_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, assessment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(assessment_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/assessments")
 def get_doctor_assessments(
-    current_user: User = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all assessments assigned to this doctor with appointment status - only for existing patients"""
+    """
+    Get assessments assigned to this doctor with appointment status - only for existing patients.
+
+    Without `limit` the full list is returned. With `limit` the response is
+    {"assessments": [...], "next_cursor": str | null}; pass next_cursor back
+    as `cursor` to fetch the following page (newest first).
+    """
     try:
         # 🔐 Role check
         if current_user.role != "doctor":
@@ -329,49 +279,76 @@ def get_doctor_assessments(
 
         logger.info(f"Doctor {current_user.id} fetching assessments")
 
-        # 📌 Get assessments - DEFENSIVE: Only assessments with existing patients
-        assessments = (
-            db.query(Assessment)
-            .join(Patient, Assessment.patient_id == Patient.id)  # ✅ INNER JOIN ensures patient exists
+        # 📌 Latest appointment per patient, limited to this doctor's caseload
+        doctor_patients = (
+            select(Assessment.patient_id)
+            .where(Assessment.assigned_doctor_id == current_user.id)
+        )
+        ranked_appointments = (
+            select(
+                Appointment.patient_id,
+                Appointment.status,
+                func.row_number().over(
+                    partition_by=Appointment.patient_id,
+                    order_by=(Appointment.date.desc(), Appointment.time.desc(), Appointment.id),
+                ).label("rn"),
+            )
+            .where(Appointment.patient_id.in_(doctor_patients))
+            .subquery()
+        )
+        Nurse = aliased(User)
+
+        # 📌 Assessments + nurse name + latest appointment in one query.
+        # DEFENSIVE: INNER JOIN on Patient keeps only assessments with existing patients
+        query = (
+            db.query(
+                Assessment,
+                Nurse.first_name,
+                Nurse.last_name,
+                ranked_appointments.c.status.label("appointment_status"),
+            )
+            .join(Patient, Assessment.patient_id == Patient.id)
+            .outerjoin(Nurse, Nurse.id == Assessment.nurse_id)
+            .outerjoin(
+                ranked_appointments,
+                and_(
+                    ranked_appointments.c.patient_id == Assessment.patient_id,
+                    ranked_appointments.c.rn == 1,
+                ),
+            )
             .filter(Assessment.assigned_doctor_id == current_user.id)
-            .order_by(Assessment.created_at.desc())
-            .all()
         )
 
-        logger.info(f"Found {len(assessments)} assessments with valid patients")
-
-        # 📌 Get all appointments
-        appointments = db.query(Appointment).all()
+        if cursor:
+            after_created_at, after_id = _decode_cursor(cursor)
+            query = query.filter(or_(
+                Assessment.created_at < after_created_at,
+                and_(Assessment.created_at == after_created_at, Assessment.id < after_id),
+            ))
 
-        # 📌 Map latest appointment per patient
-        appointment_map = {}
+        query = query.order_by(Assessment.created_at.desc(), Assessment.id.desc())
+        if limit:
+            query = query.limit(limit + 1)  # one extra row tells us whether there is a next page
+        rows = query.all()
 
-        for app in appointments:
-            app_datetime = datetime.combine(app.date, app.time)
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1].Assessment
+            next_cursor = _encode_cursor(last.created_at, last.id)
 
-            if (
-                app.patient_id not in appointment_map or
-                app_datetime > appointment_map[app.patient_id]["datetime"]
-            ):
-                appointment_map[app.patient_id] = {
-                    "status": app.status,
-                    "datetime": app_datetime
-                }
+        logger.info(f"Found {len(rows)} assessments with valid patients")
 
         # 📌 Build response
         assessments_list = []
 
-        for assessment in assessments:
+        for assessment, nurse_first_name, nurse_last_name, appointment_status in rows:
             # 👩‍⚕️ Nurse info
-            nurse = db.query(User).filter(User.id == assessment.nurse_id).first()
             nurse_name = (
-                f"{nurse.first_name} {nurse.last_name or ''}".strip()
-                if nurse else "Unknown"
+                f"{nurse_first_name} {nurse_last_name or ''}".strip()
+                if nurse_first_name else "Unknown"
             )
 
-            # 📅 Get appointment for this patient
-            appointment = appointment_map.get(assessment.patient_id)
-
             assessments_list.append({
                 "id": assessment.id,
                 "patient_id": assessment.patient_id,
@@ -391,9 +368,7 @@ def get_doctor_assessments(
                 "status": assessment.status,
 
                 # ✅ Appointment Status (FIXED)
-                "appointment_status": (
-                    appointment["status"] if appointment else "Not Scheduled"
-                ),
+                "appointment_status": appointment_status or "Not Scheduled",
 
                 # ✅ Clinical Data
                 "plan": assessment.plan,
@@ -409,8 +384,12 @@ def get_doctor_assessments(
 
         logger.info(f"Returning {len(assessments_list)} assessments")
 
+        if limit:
+            return {"assessments": assessments_list, "next_cursor": next_cursor}
         return assessments_list
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_doctor_assessments: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -441,7 +420,8 @@ def test_assessments(
 @router.get("/assessments/{assessment_id}")
 def get_doctor_assessment_by_id(
     assessment_id: int,
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific assessment by ID for clinical validation"""
@@ -502,8 +482,13 @@ def get_doctor_assessment_by_id(
             "created_at": assessment.created_at.isoformat() if assessment.created_at else None,
             "reviewed_at": assessment.reviewed_at.isoformat() if assessment.reviewed_at else None,
             "top_risk_factors": assessment.top_risk_factors or [],
+            "top_risk_factors_status": explanation_status(assessment),
         }
 
+        # Background SHAP job was lost (e.g. restart) — queue it again
+        if is_stale(assessment):
+            background_tasks.add_task(compute_top_risk_factors, assessment.id)
+
         logger.info(f"Returning assessment {assessment_id}")
         return result
         
@@ -735,7 +720,7 @@ def get_doctor_profile(
 
 
 @router.get("/patients")
-def get_doctor_patients(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_doctor_patients(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
 
     if current_user.role != "doctor":
         raise HTTPException(status_code=403, detail="Access denied")
@@ -821,7 +806,7 @@ def delete_doctor_patient(
 
 @router.get("/patients/with-assessments")
 def get_patients_with_assessment_data(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -921,7 +906,7 @@ def get_patients_with_assessment_data(
 @router.get("/patients/{patient_id}")
 def get_patient_detail(
     patient_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get detailed patient information with all assessments"""
@@ -988,32 +973,18 @@ def get_patient_detail(
     
 @router.get("/stats")
 async def get_doctor_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get doctor statistics for profile page"""
     
-    # Count assessments reviewed by this doctor
-    assessments_reviewed = db.query(Assessment).filter(
-        Assessment.assigned_doctor_id == current_user.id,
-        Assessment.status.in_(['reviewed', 'approved'])
-    ).count()
-    
-    # Count high risk cases assigned to this doctor
-    high_risk_cases = db.query(Assessment).filter(
-        Assessment.assigned_doctor_id == current_user.id,
-        Assessment.risk_level == 'high'
-    ).count()
-    
-    # Count total patients assigned to this doctor
-    patients_assigned = db.query(Assessment.patient_id).filter(
-        Assessment.assigned_doctor_id == current_user.id
-    ).distinct().count()
+    # Reviewed assessments, high-risk cases and assigned patients from the rollup
+    totals = await clinician_stats.summary_async(db, current_user.id, recent_since=clinician_stats.today())
     
     return {
-        "assessments_reviewed": assessments_reviewed,
-        "high_risk_cases": high_risk_cases,
-        "patients_assigned": patients_assigned
+        "assessments_reviewed": totals.reviewed,
+        "high_risk_cases": totals.high_risk,
+        "patients_assigned": totals.new_patients
     }
 
 @router.get("/appointments/today")
@@ -1073,7 +1044,7 @@ def get_today_appointments(
 
 @router.get("/appointments")
 def get_doctor_appointments(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     if current_user.role != "doctor":
@@ -1152,7 +1123,8 @@ def get_doctor_appointments(
             "risk_level": latest_assessment.risk_level if latest_assessment else None,
             "risk_score": latest_assessment.risk_score if latest_assessment else None,
             "epds_score": epds_score,
-            "top_risk_factors": latest_assessment.top_risk_factors if latest_assessment else [],
+            "top_risk_factors": (latest_assessment.top_risk_factors or []) if latest_assessment else [],
+            "top_risk_factors_status": explanation_status(latest_assessment) if latest_assessment else None,
             # Workflow
             "submitted_by_nurse": nurse_name,
             "assessment_status": latest_assessment.status if latest_assessment else None,
@@ -1166,7 +1138,7 @@ def get_doctor_appointments(
 def update_doctor_appointment_status(
     appointment_id: int,
     payload: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """Doctor confirms, completes, or cancels an appointment"""
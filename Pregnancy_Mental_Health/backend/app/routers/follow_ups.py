@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
 from sqlalchemy import nullslast
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from datetime import datetime, timedelta
 import logging
 
-from ..database import get_db
+from ..database import get_db, get_async_db
 from .. import models, config
 from ..jwt_handler import get_current_user_email
 
@@ -85,16 +86,16 @@ async def create_manual_follow_up(
     fup_data: dict,
     background_tasks: BackgroundTasks,
     current_user_email: str = Depends(get_current_user_email),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Manually schedule a follow-up"""
     try:
         # Fetch patient details for email
-        patient = db.query(models.Patient).filter(models.Patient.id == fup_data["patient_id"]).first()
+        patient = await db.get(models.Patient, int(fup_data["patient_id"]))
         
         scheduled_date = datetime.fromisoformat(fup_data["scheduled_date"])
         new_fup = models.FollowUp(
-            patient_id=fup_data["patient_id"],
+            patient_id=int(fup_data["patient_id"]),
             scheduled_date=scheduled_date,
             type=fup_data.get("type", "check-in"),
             notes=fup_data.get("notes", ""),
@@ -115,11 +116,11 @@ async def create_manual_follow_up(
             )
             db.add(email_notif)
             
-        db.commit()
-        db.refresh(new_fup)
+        await db.commit()
+        await db.refresh(new_fup)
         return new_fup
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/patient/{patient_id}")
@@ -4,6 +4,7 @@ from typing import List
 from ..database import get_db
 from .. import models, schemas
 from ..jwt_handler import get_current_user_email
+from ..services import notification_counters
 
 # FIXED: Remove prefix → main.py adds /notifications
 router = APIRouter(prefix="/notifications", tags=["notifications"])
@@ -24,11 +25,8 @@ def get_unread_count(
     current_user_email: str = Depends(get_current_user_email),
     db: Session = Depends(get_db)
 ):
-    count = db.query(models.Notification).filter(
-        models.Notification.clinician_email == current_user_email,
-        models.Notification.is_read == False
-    ).count()
-    return {"count": count}
+    # Maintained counter; changes are also pushed over /ws (UNREAD_COUNT)
+    return {"count": notification_counters.unread_count(db, current_user_email)}
 
 @router.post("/read-all")
 def mark_all_as_read(
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, update
 from datetime import datetime, timezone, timedelta
 from typing import Optional, List
-from ..database import get_db
+from ..database import get_db, get_async_db
 from .. import models, schemas
 from ..jwt_handler import get_current_user_email, get_current_user
+from ..services.principal_cache import Principal
 from ..config import DEFAULT_USER_PASSWORD
 from ..security import hash_password
 from sqlalchemy.exc import IntegrityError
+from ..services.explanation_service import compute_top_risk_factors
+from ..services import clinician_stats
+from ..services.presence import presence
 # from ..audit import log_admin_action  # Assuming you have this from admin panel
 import logging
 
@@ -50,31 +55,22 @@ def get_nurse_profile(
 @router.get("/dashboard")
 def get_nurse_dashboard(
     db: Session = Depends(get_db),
-    nurse: models.User = Depends(get_current_user)
+    nurse: Principal = Depends(get_current_user)
 ):
     """Fetch dashboard stats for nurses"""
     try:
         if nurse.role != "nurse":
             raise HTTPException(status_code=403, detail="Nurse role required")
         
-        today = datetime.now().date()
-        
-        new_patients_today = db.query(models.Patient).filter(
-            models.Patient.created_by_nurse_id == nurse.id,
-            func.date(models.Patient.created_at) == today
-        ).count()
-        
-        pending_assessments = db.query(models.Assessment).filter(
-            models.Assessment.nurse_id == nurse.id,
-            models.Assessment.status == "draft"
-        ).count()
-        
-        waiting_review = db.query(models.Assessment).filter(
-            models.Assessment.nurse_id == nurse.id,
-            models.Assessment.status == "submitted"
-        ).count()
-        
-        total_patients = db.query(models.Patient).filter(models.Patient.created_by_nurse_id == nurse.id).count()
+        # Counters come from the clinician_stats rollup (O(days), not O(assessments))
+        week = clinician_stats.last_days(7)
+        totals = clinician_stats.summary(db, nurse.id, recent_since=week[0])
+        today_stats = clinician_stats.daily(db, nurse.id, start=week[-1]).get(week[-1])
+
+        new_patients_today = today_stats.new_patients if today_stats else 0
+        pending_assessments = totals.drafts
+        waiting_review = totals.submitted
+        total_patients = totals.new_patients
         
         # Get recent patients
         recent_patients_list = db.query(models.Patient).filter(
@@ -104,29 +100,14 @@ def get_nurse_dashboard(
                     "assigned_doctor": doctor_name,
                     "status": "Registered",
                     "created_at": p.created_at.strftime("%Y-%m-%d"),
-                    "is_online": (datetime.now(timezone.utc) - p.user.last_active.replace(tzinfo=timezone.utc)).total_seconds() < 300 if p.user and p.user.last_active else False,
+                    "is_online": presence.is_online(p.user),
                 }
             )
 
         # Calculate trends (last 7 days)
-        last_7d = datetime.now() - timedelta(days=7)
-        
-        new_patients_last_7d = db.query(models.Patient).filter(
-            models.Patient.created_by_nurse_id == nurse.id,
-            models.Patient.created_at >= last_7d
-        ).count()
-        
-        pending_assessments_last_7d = db.query(models.Assessment).filter(
-            models.Assessment.nurse_id == nurse.id,
-            models.Assessment.status == "draft",
-            models.Assessment.created_at >= last_7d
-        ).count()
-        
-        waiting_review_last_7d = db.query(models.Assessment).filter(
-            models.Assessment.nurse_id == nurse.id,
-            models.Assessment.status == "submitted",
-            models.Assessment.created_at >= last_7d
-        ).count()
+        new_patients_last_7d = totals.recent_new_patients
+        pending_assessments_last_7d = totals.recent_drafts
+        waiting_review_last_7d = totals.recent_submitted
 
         return {
             "stats": {
@@ -166,17 +147,6 @@ def get_nurse_doctors(db: Session = Depends(get_db)):  # ← PUBLIC!
     for d in doctors:
         full_name = f"{d.first_name or ''} {d.last_name or ''}".strip() or d.email
         
-        # ✅ Calculate is_online (active in last 5 minutes)
-        is_online = False
-        if d.last_active:
-            # Handle timezone-aware comparison
-            last_active = d.last_active
-            if last_active.tzinfo is None:
-                last_active = last_active.replace(tzinfo=timezone.utc)
-            
-            diff = datetime.now(timezone.utc) - last_active
-            is_online = diff.total_seconds() < 300 # 5 minutes
-            
         result.append(
             {
                 "id": d.id,
@@ -186,8 +156,8 @@ def get_nurse_doctors(db: Session = Depends(get_db)):  # ← PUBLIC!
                 "email": d.email,
                 "specialization": getattr(d, "specialization", None),
                 "active_patients": counts.get(d.id, 0),
-                "is_online": is_online,
-                "last_active": d.last_active
+                "is_online": presence.is_online(d),
+                "last_active": presence.last_active(d)
             }
         )
     return result
@@ -429,7 +399,7 @@ def get_nurse_patients(
                 "doctor_id": p.assigned_doctor_id,
                 "last_assessment": last_assessment_label,
                 "last_assessment_date": last_assessment_date,
-                "is_online": (datetime.now(timezone.utc) - p.user.last_active.replace(tzinfo=timezone.utc)).total_seconds() < 300 if p.user and p.user.last_active else False,
+                "is_online": presence.is_online(p.user),
             }
         )
 
@@ -484,13 +454,14 @@ def get_nurse_patient_detail(
         "status": patient.status,
         "assigned_doctor_id": patient.assigned_doctor_id,
         "assigned_doctor": doctor_name,
-        "is_online": (datetime.now(timezone.utc) - patient.user.last_active.replace(tzinfo=timezone.utc)).total_seconds() < 300 if patient.user and patient.user.last_active else False,
+        "is_online": presence.is_online(patient.user),
     }
 
 
 @router.post("/assessments", status_code=status.HTTP_201_CREATED)
 def create_nurse_assessment(
     payload: schemas.AssessmentSave,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user_email: str = Depends(get_current_user_email)
 ):
@@ -534,6 +505,10 @@ def create_nurse_assessment(
     db.commit()
     db.refresh(new_assessment)
 
+    # SHAP risk factors are computed off the request path for the doctor's review
+    if new_assessment.raw_data and new_assessment.status != "draft":
+        background_tasks.add_task(compute_top_risk_factors, new_assessment.id)
+
     if payload.patient_id:
         patient = db.query(models.Patient).filter(models.Patient.id == payload.patient_id).first()
         if patient:
@@ -606,16 +581,9 @@ def get_nurse_stats(
     if not nurse or nurse.role != "nurse":
         raise HTTPException(status_code=403, detail="Nurse role required")
 
-    total_patients = (
-        db.query(models.Patient)
-        .filter(models.Patient.created_by_nurse_id == nurse.id)
-        .count()
-    )
-    total_assessments = (
-        db.query(models.Assessment)
-        .filter(models.Assessment.nurse_id == nurse.id)
-        .count()
-    )
+    totals = clinician_stats.summary(db, nurse.id, recent_since=clinician_stats.today())
+    total_patients = totals.new_patients
+    total_assessments = totals.assessments
 
     return {
         "total_patients": total_patients,
@@ -729,10 +697,10 @@ def list_nurse_appointments(
 @router.post("/appointments")
 async def create_nurse_appointment(
     payload: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user_email: str = Depends(get_current_user_email),
 ):
-    nurse = db.query(models.User).filter(models.User.email == current_user_email).first()
+    nurse = await db.scalar(select(models.User).where(models.User.email == current_user_email))
     if not nurse or nurse.role != "nurse":
         raise HTTPException(status_code=403, detail="Nurse role required")
 
@@ -745,11 +713,12 @@ async def create_nurse_appointment(
         else:
             appt_time = datetime.strptime(time_str, "%H:%M:%S").time()
 
-        patient = db.query(models.Patient).filter(models.Patient.id == payload["patientid"]).first()
+        # asyncpg won't coerce "12" to an integer parameter the way psycopg2 did
+        patient = await db.get(models.Patient, int(payload["patientid"]))
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
 
-        doctor = db.query(models.User).filter(models.User.id == payload["doctorid"]).first()
+        doctor = await db.get(models.User, int(payload["doctorid"]))
         if not doctor or doctor.role != "doctor":
             raise HTTPException(status_code=404, detail="Doctor not found")
 
@@ -767,23 +736,30 @@ async def create_nurse_appointment(
             created_by_nurse_id=nurse.id,  # ← ADD THIS
         )
         db.add(appt)
-        db.commit()
-        db.refresh(appt)
+        await db.commit()
+        await db.refresh(appt)
 
         # Mark all pending instructions (FollowUp) for this assessment as scheduled
         instruction_id = payload.get("instruction_id")
         if instruction_id:
+            instruction_id = int(instruction_id)
             # Mark ALL pending follow-ups for this assessment as scheduled to clear the queue
-            db.query(models.FollowUp).filter(
-                models.FollowUp.assessment_id == instruction_id,
-                models.FollowUp.status == "pending"
-            ).update({"status": "scheduled", "scheduled_date": datetime.fromisoformat(f"{payload['date']}T{time_str}")}, synchronize_session=False)
+            await db.execute(
+                update(models.FollowUp).where(
+                    models.FollowUp.assessment_id == instruction_id,
+                    models.FollowUp.status == "pending"
+                ).values(status="scheduled", scheduled_date=datetime.fromisoformat(f"{payload['date']}T{time_str}"))
+                .execution_options(synchronize_session=False)
+            )
             
             # Also try by follow_up_id if that was passed
-            db.query(models.FollowUp).filter(
-                models.FollowUp.id == instruction_id,
-                models.FollowUp.status == "pending"
-            ).update({"status": "scheduled", "scheduled_date": datetime.fromisoformat(f"{payload['date']}T{time_str}")}, synchronize_session=False)
+            await db.execute(
+                update(models.FollowUp).where(
+                    models.FollowUp.id == instruction_id,
+                    models.FollowUp.status == "pending"
+                ).values(status="scheduled", scheduled_date=datetime.fromisoformat(f"{payload['date']}T{time_str}"))
+                .execution_options(synchronize_session=False)
+            )
 
         # Create a new follow-up entry for the actual scheduled appointment
         # This one will be the one the doctor/nurse marks as 'completed' later
@@ -799,8 +775,8 @@ async def create_nurse_appointment(
             clinician_email=doctor.email,
         )
         db.add(followup)
-        db.commit()
-        db.refresh(followup)
+        await db.commit()
+        await db.refresh(followup)
 
         # ✅ SEND NOTIFICATION TO DOCTOR AFTER APPOINTMENT IS CREATED
         try:
@@ -819,17 +795,16 @@ async def create_nurse_appointment(
                 )
 
                 db.add(notification)
-                db.commit()
+                await db.commit()
 
         except Exception as notif_err:
             logger.error(f"Notification creation failed: {notif_err}")
 
-        # ✅ BROADCAST WEBSOCKET MESSAGE TO REFRESH DOCTOR'S SCHEDULE
+        # ✅ PUSH WEBSOCKET MESSAGE TO REFRESH THE DOCTOR'S SCHEDULE
         try:
-            from ..utils.websocket_manager import manager
-            import json
+            from ..utils.websocket_manager import manager, user_channel
             
-            await manager.broadcast(json.dumps({
+            await manager.publish(user_channel(doctor.id), {
                 "type": "NEW_APPOINTMENT",
                 "appointment_id": appt.id,
                 "patient_name": patient.name,
@@ -837,9 +812,9 @@ async def create_nurse_appointment(
                 "date": appt.date.isoformat(),
                 "time": str(appt.time),
                 "message": f"New appointment scheduled for {patient.name}"
-            }))
+            })
         except Exception as ws_err:
-            logger.error(f"WebSocket broadcast failed: {ws_err}")
+            logger.error(f"WebSocket publish failed: {ws_err}")
 
         return {
             "appointment_id": appt.id,
@@ -851,13 +826,13 @@ async def create_nurse_appointment(
         }
 
     except KeyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Missing field: {str(e)}")
     except ValueError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Invalid date or time format")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.exception("Failed to create appointment")
         raise HTTPException(status_code=500, detail="Failed to create appointment")
     
@@ -7,13 +7,14 @@ from sqlalchemy import func
 from ..database import get_db
 from .. import models, schemas
 from ..jwt_handler import get_current_user_email, get_current_user
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="/patient", tags=["patient"])
 
 
 def get_current_patient(
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> models.Patient:
     """
     Defensive dependency: Always resolve Patient from current User.
@@ -308,7 +309,7 @@ def get_patient_appointments(
 @router.post("/mood", response_model=schemas.MoodEntryOut)
 def log_mood(
     mood_in: schemas.MoodEntryCreate,
-    user: models.User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
@@ -343,7 +344,7 @@ def log_mood(
 
 @router.get("/mood/history")
 def get_mood_history(
-    user: models.User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
@@ -371,7 +372,7 @@ def get_mood_history(
 @router.get("/mood/history/{patient_email}")
 def get_patient_mood_history(
     patient_email: str,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
@@ -414,7 +415,7 @@ def get_patient_mood_history(
 
 @router.get("/messages")
 def get_patient_messages(
-    user: models.User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
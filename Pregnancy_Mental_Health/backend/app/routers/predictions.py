@@ -4,7 +4,7 @@ from typing import List
 
 from ..database import get_db
 from ..schemas import PredictRequest, PredictResponse, HistoryItem
-from ..ml_model import model
+from ..ml_model import get_model
 from .. import models
 
 router = APIRouter(prefix="/predictions", tags=["predictions"])
@@ -13,6 +13,7 @@ router = APIRouter(prefix="/predictions", tags=["predictions"])
 def predict(payload: PredictRequest, db: Session = Depends(get_db)):
     features = [[payload.feature_1, payload.feature_2]]
 
+    model = get_model()
     pred = float(model.predict(features)[0])
     proba = float(model.predict_proba(features)[0][1])  # binary, class 1 prob
 
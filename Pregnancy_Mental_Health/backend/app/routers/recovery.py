@@ -1,25 +1,28 @@
 from fastapi import APIRouter, Depends, Request, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..schemas import (
     RecoveryRequestCreate,
     RecoveryVerifyIn,
     RecoveryRequestOut,
+    RecoveryStatusOut,
     GenericMessage,
     ApproveRecoveryResponse,
 )
 from ..services.recovery_service import (
     create_recovery_request,
+    get_recovery_status,
     get_pending_recovery_requests,
     approve_recovery_request,
     verify_recovery_code,
 )
 from ..jwt_handler import get_current_user
-from ..models import User
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="/recovery", tags=["Recovery"])
 
-def require_admin(user: User):
+def require_admin(user: Principal):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
     return user
@@ -28,16 +31,21 @@ def require_admin(user: User):
 async def request_recovery(
     payload: RecoveryRequestCreate,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     ip = request.client.host if request.client else None
     user_agent = request.headers.get("user-agent")
     result = await create_recovery_request(db, payload.email, ip, user_agent)
     return result
 
+@router.get("/status/{nonce}", response_model=RecoveryStatusOut)
+async def recovery_status(nonce: str, db: AsyncSession = Depends(get_async_db)):
+    # Lets the forgot-password page catch up on what it missed while its socket was down
+    return {"status": await get_recovery_status(db, nonce)}
+
 @router.get("/admin/pending", response_model=list[RecoveryRequestOut])
 def get_pending_requests(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     require_admin(current_user)
@@ -48,8 +56,8 @@ def get_pending_requests(
 async def approve_request(
     request_id: int,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     require_admin(current_user)
     ip = request.client.host if request.client else None
@@ -67,7 +75,7 @@ async def approve_request(
 @router.post("/admin/decline/{request_id}", response_model=GenericMessage)
 def decline_request(
     request_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     require_admin(current_user)
@@ -88,7 +96,7 @@ def decline_request(
 async def verify_recovery(
     payload: RecoveryVerifyIn,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     ip = request.client.host if request.client else None
     success, message = await verify_recovery_code(
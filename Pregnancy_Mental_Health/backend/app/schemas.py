@@ -240,6 +240,20 @@ class AssessmentResult(BaseModel):
     score: float
 
 
+class ScoringResult(BaseModel):
+    """Everything one predict_proba pass yields for a questionnaire."""
+    risk_level: str       # final risk after the 70/30 EPDS blend
+    score: float          # final blended score, 0–100
+    model_risk: str       # most probable CatBoost class
+    model_score: float    # base score ± confidence, 0–100
+    confidence: float     # probability of model_risk
+    epds_total: int       # raw EPDS sum, 0–30
+    probabilities: Dict[str, float]  # {"High Risk": p, "Moderate Risk": p, "Low Risk": p}
+
+    def to_result(self) -> AssessmentResult:
+        return AssessmentResult(risk_level=self.risk_level, score=self.score)
+
+
 class AssessmentSave(BaseModel):
     model_config = ConfigDict(from_attributes=True)  # Keep this
     
@@ -392,6 +406,9 @@ class RecoveryVerifyIn(BaseModel):
     new_password: str
     device_id: Optional[str] = None
 
+class RecoveryStatusOut(BaseModel):
+    status: str
+
 class ApproveRecoveryResponse(BaseModel):
     message: str
     request_id: int
@@ -400,4 +417,5 @@ class ApproveRecoveryResponse(BaseModel):
 class GenericMessage(BaseModel):
     message: str
     auto_approved: Optional[bool] = None
-    code: Optional[str] = None
\ No newline at end of file
+    code: Optional[str] = None
+    nonce: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,368 @@
+"""
+Incremental maintenance of the clinician_stats rollup.
+
+Every flush that inserts, updates or deletes an Assessment or Patient
+applies the difference it makes to the affected (clinician, day) rows in
+the same transaction, so dashboards read O(days) rows instead of
+recounting assessments. ORM bulk deletes of assessments (query.delete())
+are subtracted just before they run; ORM bulk updates of assessments or
+patients that touch a counted column (e.g. clearing nurse_id when a user
+is deleted) read the affected rows before and after the statement.
+
+Writes that bypass the ORM (raw SQL, ON DELETE CASCADE from deleting a
+user) are not seen; rebuild() recomputes the table from scratch.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, func, insert, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..models import Assessment, Patient, ClinicianStat
+from ..utils import risk_bands
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    "assessments", "risk_score_sum", "drafts", "submitted", "reviewed",
+    "high_risk", "moderate_risk", "low_risk", "new_patients",
+)
+
+_BAND_COUNTERS = {
+    risk_bands.HIGH: "high_risk",
+    risk_bands.MODERATE: "moderate_risk",
+    risk_bands.LOW: "low_risk",
+}
+AWAITING_REVIEW_STATUSES = ("submitted", "pending")
+REVIEWED_STATUSES = ("reviewed", "approved")
+
+_ASSESSMENT_FIELDS = (
+    "nurse_id", "assigned_doctor_id", "status", "risk_band",
+    "risk_score", "created_at", "reviewed_at",
+)
+_PATIENT_FIELDS = ("created_by_nurse_id", "assigned_doctor_id", "created_at")
+
+
+def today() -> date:
+    """Day buckets follow the database clock (UTC)."""
+    return datetime.now(timezone.utc).date()
+
+
+def _day(value) -> date:
+    if value is None:
+        return today()  # server_default created_at not assigned yet
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+
+def _new_deltas():
+    return defaultdict(lambda: defaultdict(float))
+
+
+def _add_assessment(deltas, values, sign: int):
+    """What one assessment contributes to its nurse's and doctor's rows."""
+    day = _day(values["created_at"])
+    status = values["status"] or "submitted"  # column default
+    band = _BAND_COUNTERS.get(values["risk_band"])
+
+    for clinician_id in {values["nurse_id"], values["assigned_doctor_id"]} - {None}:
+        row = deltas[(clinician_id, day)]
+        row["assessments"] += sign
+        row["risk_score_sum"] += sign * (values["risk_score"] or 0.0)
+        if band:
+            row[band] += sign
+        if status == "draft":
+            row["drafts"] += sign
+        elif status in AWAITING_REVIEW_STATUSES:
+            row["submitted"] += sign
+        elif status in REVIEWED_STATUSES:
+            reviewed_day = _day(values["reviewed_at"] or values["created_at"])
+            deltas[(clinician_id, reviewed_day)]["reviewed"] += sign
+
+
+def _add_patient(deltas, values, sign: int):
+    day = _day(values["created_at"])
+    for clinician_id in {values["created_by_nurse_id"], values["assigned_doctor_id"]} - {None}:
+        deltas[(clinician_id, day)]["new_patients"] += sign
+
+
+def _current(obj, fields) -> dict:
+    return {f: getattr(obj, f) for f in fields}
+
+
+def _committed(obj, fields) -> dict:
+    """Values as of the last flush (old values are loaded via active_history)."""
+    attrs = inspect(obj).attrs
+    values = {}
+    for f in fields:
+        history = attrs[f].history
+        if history.deleted:
+            values[f] = history.deleted[0]
+        elif history.unchanged:
+            values[f] = history.unchanged[0]
+        else:
+            values[f] = getattr(obj, f)
+    return values
+
+
+def _apply(connection, deltas):
+    """Add the deltas to clinician_stats with one upsert per (clinician, day)."""
+    table = ClinicianStat.__table__
+    dialect = connection.dialect.name
+
+    # Fixed order: concurrent flushes touching the same nurse and doctor rows
+    # take their row locks in the same sequence instead of deadlocking
+    for (clinician_id, day), counters in sorted(deltas.items()):
+        changes = {
+            c: (v if c == "risk_score_sum" else int(round(v)))
+            for c, v in counters.items() if abs(v) > 1e-9
+        }
+        if not changes:
+            continue
+
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(table).values(
+                clinician_id=clinician_id, day=day,
+                **{c: changes.get(c, 0) for c in COUNTERS},
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["clinician_id", "day"],
+                set_={c: table.c[c] + stmt.excluded[c] for c in changes},
+            )
+            connection.execute(stmt)
+        else:
+            result = connection.execute(
+                update(table)
+                .where(table.c.clinician_id == clinician_id, table.c.day == day)
+                .values({c: table.c[c] + v for c, v in changes.items()})
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(table).values(
+                    clinician_id=clinician_id, day=day,
+                    **{c: changes.get(c, 0) for c in COUNTERS},
+                ))
+
+
+def _lock(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("LOCK TABLE clinician_stats IN EXCLUSIVE MODE"))
+
+
+@event.listens_for(Session, "before_flush")
+def _track_flush(session, flush_context, instances):
+    deltas = _new_deltas()
+    deleted_assessment_ids = {
+        obj.id for obj in session.deleted if isinstance(obj, Assessment)
+    }
+
+    for obj in session.new:
+        if isinstance(obj, Assessment):
+            _add_assessment(deltas, _current(obj, _ASSESSMENT_FIELDS), +1)
+        elif isinstance(obj, Patient):
+            _add_patient(deltas, _current(obj, _PATIENT_FIELDS), +1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Assessment) and session.is_modified(obj):
+            _add_assessment(deltas, _committed(obj, _ASSESSMENT_FIELDS), -1)
+            _add_assessment(deltas, _current(obj, _ASSESSMENT_FIELDS), +1)
+        elif isinstance(obj, Patient) and session.is_modified(obj):
+            _add_patient(deltas, _committed(obj, _PATIENT_FIELDS), -1)
+            _add_patient(deltas, _current(obj, _PATIENT_FIELDS), +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Assessment):
+            _add_assessment(deltas, _committed(obj, _ASSESSMENT_FIELDS), -1)
+        elif isinstance(obj, Patient):
+            _add_patient(deltas, _committed(obj, _PATIENT_FIELDS), -1)
+            # Unloaded assessments go with the patient via ON DELETE CASCADE
+            cascaded = session.connection().execute(
+                select(*[getattr(Assessment, f) for f in _ASSESSMENT_FIELDS])
+                .where(
+                    Assessment.patient_id == obj.id,
+                    Assessment.id.notin_(deleted_assessment_ids),
+                )
+            )
+            for row in cascaded:
+                _add_assessment(deltas, row._mapping, -1)
+
+    if deltas:
+        _apply(session.connection(), deltas)
+
+
+def _bulk_rows(orm_execute_state):
+    """Parameter rows of an ORM bulk UPDATE by primary key (session.execute(update(M), [...]))."""
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, (list, tuple)) and parameters:
+        return parameters
+    return None
+
+
+def _updated_columns(orm_execute_state):
+    """
+    Attribute names a bulk UPDATE sets, or None when the statement doesn't
+    say (then every matched row is diffed rather than risk missing one).
+    """
+    rows = _bulk_rows(orm_execute_state)
+    if rows is not None:
+        return {key for row in rows for key in row}
+    values = getattr(orm_execute_state.statement, "_values", None)
+    if not values:
+        return None
+    return {getattr(column, "key", column) for column in values}
+
+
+def _rows_by_id(connection, columns, id_column, ids):
+    for start in range(0, len(ids), 5000):
+        yield from connection.execute(select(*columns).where(id_column.in_(ids[start:start + 5000])))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    model = mapper.class_
+    if model is Assessment:
+        fields, add = _ASSESSMENT_FIELDS, _add_assessment
+    elif model is Patient and orm_execute_state.is_update:
+        fields, add = _PATIENT_FIELDS, _add_patient
+    else:
+        return
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_update:
+        updated = _updated_columns(orm_execute_state)
+        if updated is not None and not updated & set(fields):
+            return  # e.g. storing top_risk_factors: nothing counted changes
+
+    columns = [getattr(model, f) for f in fields]
+    connection = orm_execute_state.session.connection()
+    bulk_rows = _bulk_rows(orm_execute_state) if orm_execute_state.is_update else None
+    if bulk_rows is not None:
+        before = list(_rows_by_id(connection, [model.id, *columns], model.id, [row["id"] for row in bulk_rows]))
+    else:
+        stmt = select(model.id, *columns)
+        if statement.whereclause is not None:
+            stmt = stmt.where(statement.whereclause)
+        before = connection.execute(stmt).all()
+
+    deltas = _new_deltas()
+    for row in before:
+        add(deltas, row._mapping, -1)
+    if orm_execute_state.is_delete:
+        _apply(connection, deltas)
+        return
+
+    result = orm_execute_state.invoke_statement()
+    # By id: the update may move rows out of its own WHERE
+    for row in _rows_by_id(connection, columns, model.id, [row.id for row in before]):
+        add(deltas, row._mapping, +1)
+    _apply(connection, deltas)
+    return result
+
+
+# Load the previous value when these are assigned on an expired instance,
+# so _committed() can see what a flush changed
+for _attr in _ASSESSMENT_FIELDS:
+    event.listen(getattr(Assessment, _attr), "set", lambda *args: None, active_history=True)
+for _attr in _PATIENT_FIELDS:
+    event.listen(getattr(Patient, _attr), "set", lambda *args: None, active_history=True)
+
+
+def rebuild(db: Session, only_if_empty: bool = False) -> int:
+    """
+    Recompute clinician_stats from assessments and patients in one
+    transaction. Returns the number of rows written (-1 if skipped because
+    the table was already populated and only_if_empty is set).
+    """
+    connection = db.connection()
+    _lock(connection)  # concurrent flushes wait instead of racing the rebuild
+    if only_if_empty and db.query(ClinicianStat.id).first() is not None:
+        db.rollback()
+        return -1
+
+    deltas = _new_deltas()
+    assessments = db.execute(
+        select(*[getattr(Assessment, f) for f in _ASSESSMENT_FIELDS])
+        .execution_options(yield_per=5000)
+    )
+    for row in assessments:
+        _add_assessment(deltas, row._mapping, +1)
+    for row in db.execute(select(*[getattr(Patient, f) for f in _PATIENT_FIELDS])):
+        _add_patient(deltas, row._mapping, +1)
+
+    rows = [
+        {
+            "clinician_id": clinician_id,
+            "day": day,
+            **{c: (counters.get(c, 0.0) if c == "risk_score_sum" else int(round(counters.get(c, 0))))
+               for c in COUNTERS},
+        }
+        for (clinician_id, day), counters in deltas.items()
+    ]
+    db.execute(delete(ClinicianStat))
+    if rows:
+        db.execute(insert(ClinicianStat), rows)
+    db.commit()
+    logger.info(f"Rebuilt clinician_stats: {len(rows)} rows")
+    return len(rows)
+
+
+def _summary_stmt(clinician_id: int, recent_since: date):
+    columns = []
+    for c in COUNTERS:
+        column = getattr(ClinicianStat, c)
+        columns.append(func.coalesce(func.sum(column), 0).label(c))
+        columns.append(
+            func.coalesce(func.sum(column).filter(ClinicianStat.day >= recent_since), 0)
+            .label(f"recent_{c}")
+        )
+    return select(*columns).where(ClinicianStat.clinician_id == clinician_id)
+
+
+def _daily_stmt(clinician_id: int, start: date):
+    return select(ClinicianStat).where(
+        ClinicianStat.clinician_id == clinician_id,
+        ClinicianStat.day >= start,
+    )
+
+
+def summary(db: Session, clinician_id: int, recent_since: date):
+    """
+    All-time counter totals plus `recent_<counter>` totals for days on or
+    after recent_since, in one aggregate row.
+    """
+    return db.execute(_summary_stmt(clinician_id, recent_since)).one()
+
+
+def daily(db: Session, clinician_id: int, start: date) -> dict:
+    """{day: ClinicianStat} for days on or after start (days without activity are absent)."""
+    rows = db.scalars(_daily_stmt(clinician_id, start)).all()
+    return {row.day: row for row in rows}
+
+
+async def summary_async(db: AsyncSession, clinician_id: int, recent_since: date):
+    """summary() for async handlers."""
+    return (await db.execute(_summary_stmt(clinician_id, recent_since))).one()
+
+
+async def daily_async(db: AsyncSession, clinician_id: int, start: date) -> dict:
+    """daily() for async handlers."""
+    rows = (await db.scalars(_daily_stmt(clinician_id, start))).all()
+    return {row.day: row for row in rows}
+
+
+def last_days(n: int):
+    """The last n days (oldest first), ending today."""
+    end = today()
+    return [end - timedelta(days=i) for i in range(n - 1, -1, -1)]
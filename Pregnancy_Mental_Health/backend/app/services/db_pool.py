@@ -0,0 +1,112 @@
+"""
+Connection pool instrumentation for the app's engine.
+
+TimedQueuePool is SQLAlchemy's QueuePool with the time each checkout spent
+waiting for a free connection recorded (TimedAsyncQueuePool is the same for the async engine, reported
+separately in async_pool_metrics). pool_metrics also counts physical
+connects (each one is a TCP + TLS handshake on Render), invalidations
+(pre-ping found a connection the server had dropped) and checkout
+timeouts. GET /admin/metrics/db-pool reports them.
+"""
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        # Recent checkout waits (ms) for percentiles
+        self._wait_ms = deque(maxlen=1000)
+        self._pool = None
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self._wait_ms.append(wait_ms)
+
+    def install(self, engine):
+        """Count connects/invalidations on engine's pool and report its live status."""
+        self._pool = engine.pool
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connects += 1
+
+        @event.listens_for(engine, "invalidate")
+        def _on_invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+    @staticmethod
+    def _percentiles(samples) -> dict:
+        if not samples:
+            return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 2),
+            "p50": round(ordered[len(ordered) // 2], 2),
+            "p95": round(ordered[max(0, int(len(ordered) * 0.95) - 1)], 2),
+            "max": round(ordered[-1], 2),
+        }
+
+    def metrics(self) -> dict:
+        pool = self._pool
+        with self._lock:
+            result = {
+                "pool": type(pool).__name__ if pool is not None else None,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "checkout_wait_ms": self._percentiles(self._wait_ms),
+            }
+        if isinstance(pool, QueuePool):
+            result.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+        return result
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _metrics(self) -> PoolMetrics:
+        return pool_metrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._metrics().record_wait((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        self._metrics().record_wait((time.perf_counter() - start) * 1000)
+        return connection
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool for the async engine (asyncio-aware queue)."""
+
+    def _metrics(self) -> PoolMetrics:
+        return async_pool_metrics
+
+
+# Global pool metrics instances (sync engine, async engine)
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from ..database import SessionLocal
+from ..models import Assessment
+from ..ml_model import encode_form, get_feature_columns, get_top_features
+from ..utils.websocket_manager import manager, role_channel, user_channel
+from .inference_pool import inference_pool
+from .prediction_cache import prediction_cache
+
+logger = logging.getLogger(__name__)
+
+# top_risk_factors_status values shown to the doctor
+EXPLANATION_COMPUTING = "computing"
+EXPLANATION_READY = "ready"
+EXPLANATION_UNAVAILABLE = "unavailable"
+
+# A job that hasn't written back after this long was lost (e.g. restart)
+STALE_AFTER = timedelta(minutes=2)
+MAX_ATTEMPTS = 3
+
+# Assessment ids with a job running in this worker: a busy pool makes jobs
+# slow, and re-queuing them on every view would only add to the load
+_in_flight = set()
+
+
+def explanation_status(assessment: Assessment) -> str:
+    """NULL top_risk_factors on a submitted form means the SHAP job hasn't finished."""
+    if assessment.top_risk_factors is not None:
+        return EXPLANATION_READY
+    if assessment.raw_data and assessment.status != "draft":
+        return EXPLANATION_COMPUTING
+    return EXPLANATION_UNAVAILABLE
+
+
+def is_stale(assessment: Assessment) -> bool:
+    """Still computing long after submission, with no job running — it needs re-queuing."""
+    if explanation_status(assessment) != EXPLANATION_COMPUTING or not assessment.created_at:
+        return False
+    if assessment.id in _in_flight:
+        return False
+    created_at = assessment.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - created_at > STALE_AFTER
+
+
+def _load_raw_data(assessment_id: int):
+    """(raw_data, assigned_doctor_id), or (None, None) if the assessment is gone."""
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(Assessment.raw_data, Assessment.assigned_doctor_id)
+            .filter(Assessment.id == assessment_id)
+            .first()
+        )
+        return (row.raw_data, row.assigned_doctor_id) if row else (None, None)
+    finally:
+        db.close()
+
+
+def _store_factors(assessment_id: int, factors: list) -> bool:
+    db = SessionLocal()
+    try:
+        updated = db.query(Assessment).filter(Assessment.id == assessment_id).update(
+            {Assessment.top_risk_factors: factors}, synchronize_session=False
+        )
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+
+async def compute_top_risk_factors(assessment_id: int):
+    """
+    Background job: compute SHAP top risk factors for a saved assessment,
+    store them and tell connected review screens they are ready.
+    A job already running for the assessment makes this a no-op.
+    """
+    if assessment_id in _in_flight:
+        return
+    _in_flight.add(assessment_id)
+    try:
+        await _compute_top_risk_factors(assessment_id)
+    finally:
+        _in_flight.discard(assessment_id)
+
+
+async def _compute_top_risk_factors(assessment_id: int):
+    raw_data, doctor_id = await run_in_threadpool(_load_raw_data, assessment_id)
+    if not raw_data:
+        return
+
+    try:
+        X = encode_form(SimpleNamespace(**raw_data))
+    except ValueError as e:
+        # Incomplete answers can never be explained; stop showing "computing"
+        logger.warning(f"SHAP skipped for assessment #{assessment_id}: {e}")
+        await run_in_threadpool(_store_factors, assessment_id, [])
+        return
+    except Exception as e:
+        # e.g. the model failed to load: leave it NULL for the stale re-queue
+        logger.warning(f"SHAP for assessment #{assessment_id} could not encode the form: {e}")
+        return
+
+    # Identical answers were explained before — reuse those factors
+    key = prediction_cache.key("shap", X)
+    factors = prediction_cache.get(key)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        if factors is not None:
+            break
+        try:
+            factors = await inference_pool.run_async(get_top_features, X, list(get_feature_columns()))
+            if factors:
+                prediction_cache.put(key, factors)
+        except HTTPException:
+            # Pool saturated — back off and try again
+            logger.info(f"SHAP for assessment #{assessment_id} deferred (attempt {attempt}/{MAX_ATTEMPTS})")
+            await asyncio.sleep(inference_pool.retry_after)
+        except Exception as e:
+            # Transient (sidecar restarting, model still loading...): retry the same way
+            logger.warning(f"SHAP for assessment #{assessment_id} failed (attempt {attempt}/{MAX_ATTEMPTS}): {e}")
+            await asyncio.sleep(inference_pool.retry_after)
+
+    if factors is None:
+        # top_risk_factors stays NULL, so is_stale() re-queues it on a later view
+        logger.warning(f"SHAP for assessment #{assessment_id} gave up; will retry on next view")
+        return
+
+    if not await run_in_threadpool(_store_factors, assessment_id, factors):
+        return  # deleted while we were computing
+
+    # Only doctors open the review screen: the assigned one, or any while unassigned
+    channel = user_channel(doctor_id) if doctor_id else role_channel("doctor")
+    try:
+        await manager.publish(channel, {
+            "type": "RISK_FACTORS_READY",
+            "assessment_id": assessment_id,
+            "top_risk_factors": factors,
+        })
+    except Exception as ws_err:
+        logger.error(f"WebSocket publish failed: {ws_err}")
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+class InferencePool:
+    """
+    Bounded executor for CatBoost scoring and SHAP explanations.
+
+    Threads rather than processes: the model is loaded once per worker
+    process and CatBoost releases the GIL while it walks the trees, so
+    workers run in parallel without copying the model. At most
+    `workers + queue_size` calls may be in flight; beyond that callers get
+    a 503 with Retry-After instead of piling up behind a busy clinic.
+    """
+
+    def __init__(self, workers: int, queue_size: int, retry_after: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+
+        self._in_flight = 0   # queued + running
+        self._running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        # Recent samples (ms) for wait-time / run-time percentiles
+        self._wait_ms = deque(maxlen=1000)
+        self._run_ms = deque(maxlen=1000)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue fn on the pool, or raise 503 if the queue is full."""
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self.rejected += 1
+                logger.warning(
+                    f"Inference pool saturated ({self._in_flight} in flight); rejecting request"
+                )
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Risk scoring is busy. Please try again shortly.",
+                    headers={"Retry-After": str(self.retry_after)}
+                )
+            self._in_flight += 1
+            self.submitted += 1
+
+        enqueued = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._wait_ms.append((started - enqueued) * 1000)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight -= 1
+                    self._run_ms.append((time.perf_counter() - started) * 1000)
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+
+        return self._executor.submit(task)
+
+    def run(self, fn, *args, **kwargs):
+        """Blocking call from sync endpoints."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run_async(self, fn, *args, **kwargs):
+        """Await fn without holding the event loop or a Starlette threadpool slot."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    @staticmethod
+    def _percentiles(samples) -> dict:
+        if not samples:
+            return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 2),
+            "p50": round(ordered[len(ordered) // 2], 2),
+            "p95": round(ordered[max(0, int(len(ordered) * 0.95) - 1)], 2),
+            "max": round(ordered[-1], 2),
+        }
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "running": self._running,
+                "queue_depth": self._in_flight - self._running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_ms": self._percentiles(self._wait_ms),
+                "run_ms": self._percentiles(self._run_ms),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global inference pool instance
+inference_pool = InferencePool(
+    workers=config.INFERENCE_WORKERS,
+    queue_size=config.INFERENCE_QUEUE_SIZE,
+    retry_after=config.INFERENCE_RETRY_AFTER,
+)
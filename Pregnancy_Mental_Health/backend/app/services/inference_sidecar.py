@@ -0,0 +1,187 @@
+"""
+Single-process model host for multi-worker deployments.
+
+Each uvicorn worker normally loads its own CatBoost model, explainer and
+the libraries behind them. In sidecar mode one process loads them and
+serves every worker over a Unix socket. Workers only encode forms and send
+feature vectors.
+
+Run (from the backend directory), then start the API with the same path:
+    python -m app.services.inference_sidecar --socket /tmp/ppd-inference.sock
+    INFERENCE_SOCKET=/tmp/ppd-inference.sock uvicorn app.main:app --workers 4
+
+Wire format (both directions): 8-byte header (">II": JSON length, payload
+length), a JSON header, then an optional float64 array described by the
+header's "shape".
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FRAME = struct.Struct(">II")
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("inference sidecar connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _send(sock: socket.socket, header: dict, array: Optional[np.ndarray] = None):
+    payload = b""
+    if array is not None:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        header = dict(header, shape=list(array.shape))
+        payload = array.tobytes()
+    head = json.dumps(header).encode()
+    sock.sendall(_FRAME.pack(len(head), len(payload)) + head + payload)
+
+
+def _recv(sock: socket.socket):
+    head_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, head_len))
+    array = None
+    if payload_len:
+        array = np.frombuffer(_recv_exact(sock, payload_len), dtype=np.float64)
+        array = array.reshape(header["shape"])
+    return header, array
+
+
+# ── Server (sidecar process) ───────────────────────────────────────────────
+
+class _InferenceHandler(socketserver.BaseRequestHandler):
+    """One persistent connection per worker thread; requests are answered in order."""
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                header, X = _recv(self.request)
+            except (ConnectionError, OSError):
+                return
+            op = header.get("op")
+            try:
+                # Every reply names the model that produced it, so workers
+                # notice a sidecar restarted with a different model
+                model = {"model_checksum": server.model_checksum}
+                if op == "meta":
+                    _send(self.request, {
+                        **model,
+                        "feature_columns": server.feature_columns,
+                        "classes": [int(c) for c in server.model.classes_],
+                    })
+                elif op == "predict_proba":
+                    _send(self.request, model, server.model.predict_proba(X))
+                elif op == "shap_values":
+                    _send(self.request, model, server.explainer.shap_values(X))
+                elif op == "explain":
+                    _send(self.request, model, server.explainer.explain(X))
+                else:
+                    _send(self.request, {"error": f"unknown op {op!r}"})
+            except Exception as e:
+                logger.error(f"Sidecar {op} failed: {e}", exc_info=True)
+                _send(self.request, {"error": str(e)})
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        from ..ml_model import load_local_model, CatBoostTreeExplainer
+
+        self.model, self.feature_columns, self.model_checksum = load_local_model()
+        self.explainer = CatBoostTreeExplainer(self.model, self.feature_columns)
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        super().__init__(socket_path, _InferenceHandler)
+        os.chmod(socket_path, 0o600)
+
+
+def serve(socket_path: str):
+    server = InferenceServer(socket_path)
+    logger.info(f"Inference sidecar listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+# ── Client (API workers) ───────────────────────────────────────────────────
+
+class SidecarModel:
+    """
+    Stands in for both the CatBoost model and the SHAP explainer inside a
+    worker: predict_proba(), shap_values() and explain() are forwarded to
+    the sidecar. Each thread keeps its own connection. model_checksum is
+    the sidecar's model as of its latest reply.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.model_checksum = None
+        meta, _ = self._call("meta")
+        self.feature_columns = meta["feature_columns"]
+        self.classes_ = np.array(meta["classes"])
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _call(self, op: str, X=None):
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None) or self._connect()
+            try:
+                _send(sock, {"op": op}, X)
+                header, array = _recv(sock)
+                break
+            except (ConnectionError, BrokenPipeError, socket.timeout):
+                # Sidecar restarted (or timed out) — drop the connection and retry once
+                sock.close()
+                self._local.sock = None
+                if attempt == 2:
+                    raise
+        if "error" in header:
+            raise RuntimeError(f"inference sidecar: {header['error']}")
+        self.model_checksum = header.get("model_checksum", self.model_checksum)
+        return header, array
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self._call("predict_proba", np.asarray(X, dtype=np.float64))[1]
+
+    def shap_values(self, X) -> np.ndarray:
+        return self._call("shap_values", np.asarray(X, dtype=np.float64))[1]
+
+    def explain(self, X) -> np.ndarray:
+        return self._call("explain", np.asarray(X, dtype=np.float64))[1]
+
+
+if __name__ == "__main__":
+    from .. import config
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=config.INFERENCE_SOCKET or "/tmp/ppd-inference.sock")
+    args = parser.parse_args()
+    serve(args.socket)
@@ -0,0 +1,243 @@
+"""
+Unread notification counts, kept current and pushed over WebSocket.
+
+Every flush that inserts, updates or deletes a Notification adds the
+difference it makes to notification_counters in the same transaction, so
+GET /notifications/unread-count is a primary key lookup rather than a
+COUNT over the recipient's notifications. ORM bulk updates and deletes
+(query.update(), session.execute(update/delete(Notification))) are counted
+too: the affected rows are read before and after the statement runs.
+
+When the transaction commits, each recipient whose count changed is sent
+(on their clinician:{email} channel):
+    {"type": "NOTIFICATION", "notification": {...}, "unread_count": n}
+for every new notification, or, when notifications were only read or
+deleted,
+    {"type": "UNREAD_COUNT", "unread_count": n}
+so dashboards update without asking. Nothing is sent for a rollback.
+
+Writes that bypass the ORM (raw SQL, ON DELETE CASCADE) are not seen;
+rebuild() recomputes the table from scratch.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, event, func, insert, inspect, select, text, update
+from sqlalchemy.orm import Session
+
+from ..models import Notification, NotificationCounter
+from ..utils.websocket_manager import clinician_channel, manager
+
+logger = logging.getLogger(__name__)
+
+_FIELDS = ("clinician_email", "is_read")
+_PAYLOAD_FIELDS = ("id", "title", "message", "type", "priority", "is_read", "created_at")
+
+# session.info keys: what to push once the transaction commits
+_CREATED = "notification_counters.created"   # [(email, notification payload)]
+_COUNTS = "notification_counters.counts"     # {email: unread count after the last flush}
+
+
+def _committed(obj) -> dict:
+    """Values as of the last flush (old values are loaded via active_history)."""
+    attrs = inspect(obj).attrs
+    values = {}
+    for f in _FIELDS:
+        history = attrs[f].history
+        if history.deleted:
+            values[f] = history.deleted[0]
+        elif history.unchanged:
+            values[f] = history.unchanged[0]
+        else:
+            values[f] = getattr(obj, f)
+    return values
+
+
+def _add(deltas, values, sign: int):
+    if values["clinician_email"] and not values["is_read"]:
+        deltas[values["clinician_email"]] += sign
+
+
+def _apply(connection, deltas):
+    """Add the deltas to notification_counters with one upsert per recipient."""
+    table = NotificationCounter.__table__
+    dialect = connection.dialect.name
+
+    for email, change in deltas.items():
+        if not change:
+            continue
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(table).values(clinician_email=email, unread=change)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["clinician_email"],
+                set_={"unread": table.c.unread + stmt.excluded.unread},
+            )
+            connection.execute(stmt)
+        else:
+            result = connection.execute(
+                update(table)
+                .where(table.c.clinician_email == email)
+                .values(unread=table.c.unread + change)
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(table).values(clinician_email=email, unread=change))
+
+
+def _record_counts(session, connection, emails):
+    """Remember the new counts of emails, to push after commit."""
+    if not emails:
+        return
+    counts = session.info.setdefault(_COUNTS, {})
+    for email in emails:
+        counts[email] = 0  # no counter row yet: nothing unread
+    rows = connection.execute(
+        select(NotificationCounter.clinician_email, NotificationCounter.unread)
+        .where(NotificationCounter.clinician_email.in_(list(emails)))
+    )
+    for email, unread in rows:
+        counts[email] = max(0, unread)
+
+
+def _payload(obj) -> dict:
+    # Read the instance dict: created_at comes from a server default and
+    # loading it here would cost a SELECT per notification
+    values = inspect(obj).dict
+    payload = {f: values.get(f) for f in _PAYLOAD_FIELDS}
+    payload["is_read"] = bool(payload["is_read"])
+    created_at = payload["created_at"] or datetime.now(timezone.utc)
+    payload["created_at"] = created_at.isoformat()
+    return payload
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    # After the flush new rows have their ids; new/dirty/deleted and
+    # attribute history still describe what it changed
+    deltas = defaultdict(int)
+    created = []
+
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            _add(deltas, {f: getattr(obj, f) for f in _FIELDS}, +1)
+            if obj.clinician_email:
+                created.append((obj.clinician_email, _payload(obj)))
+
+    for obj in session.dirty:
+        if isinstance(obj, Notification) and session.is_modified(obj):
+            _add(deltas, _committed(obj), -1)
+            _add(deltas, {f: getattr(obj, f) for f in _FIELDS}, +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Notification):
+            _add(deltas, _committed(obj), -1)
+
+    changed = {email for email, change in deltas.items() if change}
+    if not changed and not created:
+        return
+    connection = session.connection()
+    _apply(connection, deltas)
+    _record_counts(session, connection, changed | {email for email, _ in created})
+    session.info.setdefault(_CREATED, []).extend(created)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Notification:
+        return
+
+    columns = (Notification.id, Notification.clinician_email, Notification.is_read)
+    stmt = select(*columns)
+    if orm_execute_state.statement.whereclause is not None:
+        stmt = stmt.where(orm_execute_state.statement.whereclause)
+
+    session = orm_execute_state.session
+    connection = session.connection()
+    before = connection.execute(stmt).all()
+    result = orm_execute_state.invoke_statement()
+    if not before:
+        return result
+
+    deltas = defaultdict(int)
+    for row in before:
+        _add(deltas, row._mapping, -1)
+    if orm_execute_state.is_update:
+        # By id: an update of is_read usually moves rows out of its own WHERE
+        after = connection.execute(select(*columns).where(Notification.id.in_([row.id for row in before])))
+        for row in after:
+            _add(deltas, row._mapping, +1)
+
+    changed = {email for email, change in deltas.items() if change}
+    if changed:
+        _apply(connection, deltas)
+        _record_counts(session, connection, changed)
+    return result
+
+
+@event.listens_for(Session, "after_commit")
+def _push(session):
+    created = session.info.pop(_CREATED, [])
+    counts = session.info.pop(_COUNTS, {})
+    for email, notification in created:
+        manager.publish_threadsafe(clinician_channel(email), {
+            "type": "NOTIFICATION",
+            "notification": notification,
+            "unread_count": counts.get(email, 0),
+        })
+    for email in counts.keys() - {email for email, _ in created}:
+        manager.publish_threadsafe(clinician_channel(email), {
+            "type": "UNREAD_COUNT",
+            "unread_count": counts[email],
+        }, coalesce=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_CREATED, None)
+    session.info.pop(_COUNTS, None)
+
+
+# Load the previous value when these are assigned on an expired instance,
+# so _committed() can see what a flush changed
+for _attr in _FIELDS:
+    event.listen(getattr(Notification, _attr), "set", lambda *args: None, active_history=True)
+
+
+def rebuild(db: Session) -> int:
+    """
+    Recompute notification_counters from notifications in one transaction.
+    Returns the number of recipients with unread notifications.
+    """
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        # Concurrent flushes wait instead of racing the rebuild
+        connection.execute(text("LOCK TABLE notification_counters IN EXCLUSIVE MODE"))
+
+    rows = [
+        {"clinician_email": email, "unread": unread}
+        for email, unread in db.execute(
+            select(Notification.clinician_email, func.count())
+            .where(Notification.is_read == False)  # noqa: E712
+            .group_by(Notification.clinician_email)
+        )
+    ]
+    db.execute(delete(NotificationCounter))
+    if rows:
+        db.execute(insert(NotificationCounter), rows)
+    db.commit()
+    logger.info(f"Rebuilt notification_counters: {len(rows)} recipients")
+    return len(rows)
+
+
+def unread_count(db: Session, email: str) -> int:
+    unread = db.scalar(
+        select(NotificationCounter.unread).where(NotificationCounter.clinician_email == email)
+    )
+    return max(0, unread or 0)
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+from .. import config
+from ..ml_model import get_model_checksum
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache for scoring results and SHAP factors.
+
+    Keys hash the checksum of the model actually loaded (recorded by
+    ml_model.load_model(), or reported by the inference sidecar) together
+    with the encoded feature vector, so equivalent answers that normalise
+    to the same model input share an entry. Replacing the .cbm file on
+    disk changes nothing until the model is reloaded (a restart of the
+    worker or sidecar); when the loaded model's checksum changes, every
+    entry is dropped.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, checksum=get_model_checksum):
+        self._checksum = checksum
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        self.model_checksum = None
+
+    def _check_model(self) -> str:
+        """Called with the lock held. Returns the loaded model's checksum."""
+        checksum = self._checksum()
+        if checksum != self.model_checksum:
+            if self.model_checksum is not None:
+                logger.info("Loaded model changed; clearing prediction cache")
+                self._entries.clear()
+                self.invalidations += 1
+            self.model_checksum = checksum
+        return checksum
+
+    def key(self, kind: str, X: np.ndarray, *extra) -> str:
+        """Canonical key for a normalised model input (one encoded row)."""
+        with self._lock:
+            checksum = self._check_model()
+        digest = hashlib.sha256()
+        digest.update((checksum or "").encode())
+        digest.update(kind.encode())
+        digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+        for value in extra:
+            digest.update(repr(value).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            self._check_model()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._check_model()
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "model_checksum": self.model_checksum,
+            }
+
+
+# Global prediction cache instance
+prediction_cache = PredictionCache(
+    max_entries=config.PREDICTION_CACHE_SIZE,
+    ttl_seconds=config.PREDICTION_CACHE_TTL,
+)
@@ -0,0 +1,131 @@
+"""
+User presence ("online" indicators) without a database write per request.
+
+get_current_user calls presence.touch(user_id), which only updates a dict.
+A background task started in lifespan writes the latest timestamp per
+user to users.last_active every PRESENCE_FLUSH_INTERVAL seconds, in one
+batched UPDATE. The UPDATE never moves last_active backwards, so several
+workers flushing in any order is fine.
+
+is_online() combines this worker's unflushed activity with the stored
+column (which other workers flush into), so a user counts as online within
+one flush interval on every worker.
+"""
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import bindparam, or_, update
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class PresenceTracker:
+    def __init__(self, flush_interval: float, online_window: float):
+        self.flush_interval = flush_interval
+        self.online_window = timedelta(seconds=online_window)
+        self._lock = threading.Lock()
+        self._pending = {}   # user_id -> latest activity not yet written
+        self._seen = {}      # user_id -> latest activity seen by this worker
+        self.touches = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def touch(self, user_id: int):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._pending[user_id] = now
+            self._seen[user_id] = now
+            self.touches += 1
+
+    def last_active(self, user) -> Optional[datetime]:
+        """The newer of this worker's record and the stored users.last_active."""
+        stored = _aware(user.last_active)
+        seen = self._seen.get(user.id)
+        if stored is None or (seen is not None and seen > stored):
+            return seen
+        return stored
+
+    def is_online(self, user) -> bool:
+        """Active within the online window (5 minutes by default)."""
+        if user is None:
+            return False
+        last_active = self.last_active(user)
+        return last_active is not None and datetime.now(timezone.utc) - last_active < self.online_window
+
+    def flush(self) -> int:
+        """Write pending activity in one batched UPDATE. Returns the number of users flushed."""
+        from ..database import SessionLocal
+        from ..models import User
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # Older entries no longer affect is_online(); the column has them
+            cutoff = datetime.now(timezone.utc) - self.online_window
+            self._seen = {uid: ts for uid, ts in self._seen.items() if ts >= cutoff}
+        if not pending:
+            return 0
+
+        db = SessionLocal()
+        try:
+            users = User.__table__
+            db.execute(
+                update(users)
+                .where(users.c.id == bindparam("user_id"))
+                .where(or_(users.c.last_active.is_(None), users.c.last_active < bindparam("ts")))
+                .values(last_active=bindparam("ts")),
+                [{"user_id": uid, "ts": ts} for uid, ts in pending.items()],
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Presence flush failed ({len(pending)} users): {e}")
+            with self._lock:
+                # Keep them for the next flush unless newer activity came in since
+                for uid, ts in pending.items():
+                    self._pending.setdefault(uid, ts)
+            return 0
+        finally:
+            db.close()
+
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(pending)
+        return len(pending)
+
+    async def run(self):
+        """Flush every flush_interval seconds until cancelled, then once more."""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await asyncio.to_thread(self.flush)
+        finally:
+            # Off the event loop: shutdown still has other tasks to finish
+            await asyncio.to_thread(self.flush)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "flush_interval_s": self.flush_interval,
+                "pending": len(self._pending),
+                "touches": self.touches,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+            }
+
+
+# Global presence tracker instance
+presence = PresenceTracker(
+    flush_interval=config.PRESENCE_FLUSH_INTERVAL,
+    online_window=config.ONLINE_WINDOW_SECONDS,
+)
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .. import config
+from ..models import User
+
+# Changing any of these on a User drops its cached principals
+_PRINCIPAL_FIELDS = (
+    "email", "role", "first_name", "last_name", "is_active",
+    "first_login", "password_changed_at", "hashed_password",
+)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, as returned by get_current_user."""
+    id: int
+    email: str
+    role: Optional[str]
+    first_name: str
+    last_name: Optional[str]
+    is_active: bool
+    first_login: bool
+    password_changed_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            is_active=user.is_active,
+            first_login=user.first_login,
+            password_changed_at=user.password_changed_at,
+        )
+
+
+class PrincipalCache:
+    """
+    LRU + TTL cache of principals keyed by the access token's (sub, iat),
+    so an authenticated request doesn't need a users query.
+
+    Entries for a user are dropped when a session commits a change to one
+    of their _PRINCIPAL_FIELDS or deletes them (password change or reset,
+    deactivation, role edit). That only reaches this worker's cache; the
+    short TTL bounds how long other workers keep the old values.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, principal)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, principal: Principal):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [k for k, (_, p) in self._entries.items() if p.id == user_id]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+# Global principal cache instance
+principal_cache = PrincipalCache(
+    max_entries=config.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=config.PRINCIPAL_CACHE_TTL,
+)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_users(session, flush_context, instances):
+    changed = session.info.setdefault("principal_changes", set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            if any(attrs[f].history.has_changes() for f in _PRINCIPAL_FIELDS):
+                changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    # After commit, so a concurrent request can't re-cache the old row
+    for user_id in session.info.pop("principal_changes", ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("principal_changes", None)
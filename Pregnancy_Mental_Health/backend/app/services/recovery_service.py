@@ -1,23 +1,24 @@
 from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, select
 from ..models import User, RecoveryRequest, RecoveryChallenge, AuditLog
 from ..security import generate_recovery_code, hash_recovery_code, hash_password
-from ..utils.websocket_manager import manager
-import json
+from ..utils.websocket_manager import manager, recovery_channel, role_channel
 import asyncio
+import secrets
 
 
 
-def log_event(db: Session, action: str, user_id: int | None = None, actor_id: int | None = None, metadata: dict | None = None):
+async def log_event(db: AsyncSession, action: str, user_id: int | None = None, actor_id: int | None = None, metadata: dict | None = None):
     # Determine the 'user_name' for the AuditLog model
     user_name = "System"
     if actor_id:
-        actor = db.query(User).filter(User.id == actor_id).first()
+        actor = await db.get(User, actor_id)
         if actor:
             user_name = f"{actor.first_name} {actor.last_name or ''}".strip()
     elif user_id:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if user:
             user_name = f"{user.first_name} {user.last_name or ''}".strip()
 
@@ -59,19 +60,21 @@ def log_event(db: Session, action: str, user_id: int | None = None, actor_id: in
         timestamp=datetime.utcnow()
     )
     db.add(entry)
-    db.commit()
+    await db.commit()
 
 
 
-async def send_recovery_push(user: User, code: str):
-    # Broadcast through WebSockets for the Demo/Project UX
+async def send_recovery_push(user: User, recovery_request: RecoveryRequest, code: str):
+    # Push through WebSockets for the Demo/Project UX, only to the forgot-password page that made this request
+    if not recovery_request.push_nonce:
+        return  # made before nonces existed: nobody can be listening
     try:
-        await manager.broadcast(json.dumps({
+        await manager.publish(recovery_channel(recovery_request.push_nonce), {
             "type": "RECOVERY_READY",
             "email": user.email,
             "code": code,
             "role": user.role
-        }))
+        })
     except Exception as e:
         print(f"WS Broadcast error: {e}")
 
@@ -79,16 +82,19 @@ async def send_recovery_push(user: User, code: str):
     print(f"Push notification/email to {user.email}: recovery code {code}")
 
 
-async def create_recovery_request(db: Session, email: str, ip: str | None, user_agent: str | None):
-    user = db.query(User).filter(User.email == email).first()
+async def create_recovery_request(db: AsyncSession, email: str, ip: str | None, user_agent: str | None):
+    user = await db.scalar(select(User).where(User.email == email))
+    # The page listens on recovery:{nonce}; unknown emails get one too so
+    # the response doesn't reveal whether the account exists
+    nonce = secrets.token_urlsafe(32)
 
     if not user:
-        log_event(
+        await log_event(
             db,
             action="RECOVERY_REQUEST_UNKNOWN_EMAIL",
             metadata={"email": email, "ip": ip, "user_agent": user_agent},
         )
-        return {"message": "If your account exists, a recovery code has been sent.", "auto_approved": True}
+        return {"message": "If your account exists, a recovery code has been sent.", "auto_approved": True, "nonce": nonce}
 
     is_staff = user.role in ["doctor", "nurse", "admin"]
     status = "pending" if is_staff else "approved"
@@ -100,30 +106,31 @@ async def create_recovery_request(db: Session, email: str, ip: str | None, user_
         status=status,
         requested_from_ip=ip,
         requested_user_agent=user_agent,
+        push_nonce=nonce,
     )
     db.add(request)
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
 
     if is_staff:
-        # Broadcast to Admins that a new request is pending for real-time update
+        # Tell Admins that a new request is pending for real-time update
         try:
-            await manager.broadcast(json.dumps({
+            await manager.publish(role_channel("admin"), {
                 "type": "NEW_RECOVERY_REQUEST",
                 "email": user.email,
                 "role": user.role,
                 "request_id": request.id
-            }))
+            })
         except Exception as e:
             print(f"WS Broadcast error: {e}")
 
-        log_event(
+        await log_event(
             db,
             action="RECOVERY_REQUEST_PENDING_ADMIN",
             user_id=user.id,
             metadata={"request_id": request.id, "ip": ip}
         )
-        return {"message": "Your request is pending admin approval.", "auto_approved": False}
+        return {"message": "Your request is pending admin approval.", "auto_approved": False, "nonce": nonce}
     else:
         # Auto-approve for patients
         raw_code = generate_recovery_code()
@@ -144,11 +151,11 @@ async def create_recovery_request(db: Session, email: str, ip: str | None, user_
         db.add(challenge)
         
         request.approved_at = datetime.now(timezone.utc)
-        db.commit()
+        await db.commit()
 
-        await send_recovery_push(user, raw_code)
+        await send_recovery_push(user, request, raw_code)
 
-        log_event(
+        await log_event(
             db,
             action="RECOVERY_AUTO_APPROVED",
             user_id=user.id,
@@ -157,20 +164,28 @@ async def create_recovery_request(db: Session, email: str, ip: str | None, user_
         return {
             "message": "If your account exists, a recovery code has been sent.",
             "auto_approved": True,
-            "code": raw_code
+            "code": raw_code,
+            "nonce": nonce,
         }
 
 
+async def get_recovery_status(db: AsyncSession, nonce: str) -> str:
+    # Unknown nonces (including requests for unknown emails) read as pending,
+    # so this doesn't reveal whether an account exists
+    status = await db.scalar(select(RecoveryRequest.status).where(RecoveryRequest.push_nonce == nonce))
+    return status or "pending"
+
+
 def get_pending_recovery_requests(db: Session):
     return db.query(RecoveryRequest).filter(RecoveryRequest.status == "pending").order_by(desc(RecoveryRequest.created_at)).all()
 
 
-async def approve_recovery_request(db: Session, request_id: int, admin_user: User, admin_ip: str | None):
-    recovery_request = db.query(RecoveryRequest).filter(RecoveryRequest.id == request_id).first()
+async def approve_recovery_request(db: AsyncSession, request_id: int, admin_user: User, admin_ip: str | None):
+    recovery_request = await db.get(RecoveryRequest, request_id)
     if not recovery_request or recovery_request.status != "pending":
         return None, None
 
-    user = db.query(User).filter(User.id == recovery_request.user_id).first()
+    user = await db.get(User, recovery_request.user_id)
     if not user:
         return None, None
 
@@ -197,12 +212,12 @@ async def approve_recovery_request(db: Session, request_id: int, admin_user: Use
     recovery_request.approved_by_admin_id = admin_user.id
     recovery_request.approved_at = datetime.now(timezone.utc)
 
-    db.commit()
-    db.refresh(challenge)
+    await db.commit()
+    await db.refresh(challenge)
 
-    await send_recovery_push(user, raw_code)
+    await send_recovery_push(user, recovery_request, raw_code)
 
-    log_event(
+    await log_event(
         db,
         action="RECOVERY_APPROVED",
         user_id=user.id,
@@ -217,23 +232,23 @@ async def approve_recovery_request(db: Session, request_id: int, admin_user: Use
     return challenge, expires_at
 
 
-async def verify_recovery_code(db: Session, email: str, code: str, new_password: str, device_id: str | None, ip: str | None):
-    user = db.query(User).filter(User.email == email).first()
+async def verify_recovery_code(db: AsyncSession, email: str, code: str, new_password: str, device_id: str | None, ip: str | None):
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         return False, "Invalid or expired recovery attempt"
 
     # Find the latest approved challenge for this email that isn't used or revoked
-    challenge = (
-        db.query(RecoveryChallenge)
+    challenge = await db.scalar(
+        select(RecoveryChallenge)
         .join(RecoveryRequest, RecoveryChallenge.recovery_request_id == RecoveryRequest.id)
-        .filter(
+        .where(
             RecoveryRequest.user_email == email,
             RecoveryRequest.status == "approved",
             RecoveryChallenge.used_at.is_(None),
             RecoveryChallenge.revoked_at.is_(None)
         )
         .order_by(desc(RecoveryChallenge.created_at))
-        .first()
+        .limit(1)
     )
 
     if not challenge:
@@ -247,7 +262,7 @@ async def verify_recovery_code(db: Session, email: str, code: str, new_password:
          now = datetime.utcnow()
 
     if challenge_exp < now:
-        log_event(
+        await log_event(
             db,
             action="RECOVERY_FAILED_EXPIRED",
             user_id=user.id,
@@ -257,8 +272,8 @@ async def verify_recovery_code(db: Session, email: str, code: str, new_password:
 
     if challenge.attempt_count >= challenge.max_attempts:
         challenge.revoked_at = now
-        db.commit()
-        log_event(
+        await db.commit()
+        await log_event(
             db,
             action="RECOVERY_FAILED_LOCKED",
             user_id=user.id,
@@ -268,8 +283,8 @@ async def verify_recovery_code(db: Session, email: str, code: str, new_password:
 
     if challenge.device_id and device_id and challenge.device_id != device_id:
         challenge.attempt_count += 1
-        db.commit()
-        log_event(
+        await db.commit()
+        await log_event(
             db,
             action="RECOVERY_FAILED_DEVICE_MISMATCH",
             user_id=user.id,
@@ -279,8 +294,8 @@ async def verify_recovery_code(db: Session, email: str, code: str, new_password:
 
     if hash_recovery_code(code) != challenge.token_hash:
         challenge.attempt_count += 1
-        db.commit()
-        log_event(
+        await db.commit()
+        await log_event(
             db,
             action="RECOVERY_FAILED_BAD_CODE",
             user_id=user.id,
@@ -289,34 +304,34 @@ async def verify_recovery_code(db: Session, email: str, code: str, new_password:
         return False, "Invalid or expired recovery attempt"
 
     # Success: Change password
-    user.hashed_password = hash_password(new_password)
+    user.hashed_password = await asyncio.to_thread(hash_password, new_password)  # slow hash off the event loop
     user.password_changed_at = datetime.utcnow()
     user.first_login = False
     
     challenge.used_at = now
     challenge.used_from_ip = ip
 
-    recovery_request = db.query(RecoveryRequest).filter(RecoveryRequest.id == challenge.recovery_request_id).first()
+    recovery_request = await db.get(RecoveryRequest, challenge.recovery_request_id)
     if recovery_request:
         recovery_request.status = "completed"
         recovery_request.completed_at = now
 
-    db.commit()
+    await db.commit()
 
-    log_event(
+    await log_event(
         db,
         action="RECOVERY_SUCCESS",
         user_id=user.id,
         metadata={"challenge_id": challenge.id, "ip": ip}
     )
 
-    # Broadcast that the recovery is complete for real-time update
+    # Tell Admins that the recovery is complete for real-time update
     try:
-        await manager.broadcast(json.dumps({
+        await manager.publish(role_channel("admin"), {
             "type": "RECOVERY_COMPLETED",
             "email": user.email,
             "request_id": recovery_request.id if recovery_request else None
-        }))
+        }, coalesce=True)
     except Exception as e:
         print(f"WS Broadcast error: {e}")
         
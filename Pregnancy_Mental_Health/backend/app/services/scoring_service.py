@@ -0,0 +1,132 @@
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from ..ml_model import get_model, get_feature_encoder, form_to_row, _require
+from ..schemas import ScoringResult
+from .prediction_cache import prediction_cache
+
+logger = logging.getLogger(__name__)
+
+# Largest roster accepted by /assessments/predict/batch in one request
+MAX_BATCH_SIZE = 500
+
+# CatBoost class order: [High, Low, Medium] → indices 0,1,2.
+# Reordered to High, Moderate, Low so argmax breaks ties the same way the
+# original if/elif chain did.
+_CLASS_ORDER = [0, 2, 1]
+_MODEL_RISKS = ["High Risk", "Moderate Risk", "Low Risk"]
+_BASE_SCORES = np.array([85.0, 55.0, 25.0])
+
+
+def _epds_totals(payloads) -> np.ndarray:
+    items = [
+        [int(_require(getattr(p, f"epds_{i}"), f"epds_{i}")) for i in range(1, 11)]
+        for p in payloads
+    ]
+    return np.asarray(items, dtype=float).sum(axis=1)
+
+
+def _score(X: np.ndarray, epds_total: np.ndarray) -> List[ScoringResult]:
+    """Class, probabilities and the 70/30 blend from a single predict_proba pass."""
+    proba = get_model().predict_proba(X)[:, _CLASS_ORDER]
+
+    # Model risk = most probable class; score = base ± confidence
+    choice = proba.argmax(axis=1)
+    confidence = proba[np.arange(len(choice)), choice]
+    model_score = np.clip(_BASE_SCORES[choice] + (confidence - 0.5) * 20.0, 0.0, 100.0)
+
+    # 70/30 blend with scaled EPDS (0–100)
+    epds_scaled = epds_total / 30.0 * 100.0
+    final_score = 0.7 * model_score + 0.3 * epds_scaled
+    final_risk = np.where(
+        final_score >= 70, "High Risk",
+        np.where(final_score >= 40, "Moderate Risk", "Low Risk"),
+    )
+
+    return [
+        ScoringResult(
+            risk_level=str(final_risk[i]),
+            score=float(final_score[i]),
+            model_risk=_MODEL_RISKS[choice[i]],
+            model_score=float(model_score[i]),
+            confidence=float(confidence[i]),
+            epds_total=int(epds_total[i]),
+            probabilities={risk: float(p) for risk, p in zip(_MODEL_RISKS, proba[i])},
+        )
+        for i in range(len(choice))
+    ]
+
+
+def _prepare(payload):
+    """Encode one form and derive its cache key. Raises ValueError if incomplete."""
+    X = get_feature_encoder().encode(form_to_row(payload))
+    epds_total = _epds_totals([payload])
+    key = prediction_cache.key("score", X, int(epds_total[0]))
+    return X, epds_total, key
+
+
+def cached_score(payload) -> Optional[ScoringResult]:
+    """Cache lookup only — cheap enough to do before queuing on the inference pool."""
+    return prediction_cache.get(_prepare(payload)[2])
+
+
+def score_assessment(payload, use_cache: bool = True) -> ScoringResult:
+    """
+    Score one questionnaire, reusing a cached result for identical model inputs.
+
+    Pass use_cache=False when cached_score() has already missed.
+    Raises ValueError if a required field is missing.
+    """
+    X, epds_total, key = _prepare(payload)
+    if use_cache:
+        result = prediction_cache.get(key)
+        if result is not None:
+            return result
+
+    result = _score(X, epds_total)[0]
+    prediction_cache.put(key, result)
+
+    logger.info(
+        f"FINAL OUTPUT -> model_risk={result.model_risk}, model_score={result.model_score:.1f}, "
+        f"confidence={result.confidence:.3f}, epds_total={result.epds_total}, "
+        f"final_score={result.score:.1f}, final_risk={result.risk_level}"
+    )
+    return result
+
+
+def predict_batch(payloads: List) -> List[ScoringResult]:
+    """
+    Score many questionnaires with one encoding pass and one predict_proba call.
+    Rows already in the prediction cache are not rescored.
+
+    Raises ValueError (with the item index) if any form is incomplete.
+    """
+    rows = []
+    for idx, payload in enumerate(payloads):
+        try:
+            rows.append(form_to_row(payload))
+        except ValueError as e:
+            raise ValueError(f"Assessment {idx}: {e}")
+
+    try:
+        epds_total = _epds_totals(payloads)
+    except ValueError as e:
+        raise ValueError(f"Batch EPDS items invalid: {e}")
+
+    X = get_feature_encoder().encode_rows(rows)
+    keys = [prediction_cache.key("score", X[i:i + 1], int(epds_total[i])) for i in range(len(rows))]
+    results = [prediction_cache.get(k) for k in keys]
+
+    misses = [i for i, r in enumerate(results) if r is None]
+    if misses:
+        for i, result in zip(misses, _score(X[misses], epds_total[misses])):
+            prediction_cache.put(keys[i], result)
+            results[i] = result
+
+    logger.info(
+        f"Batch scored {len(payloads)} assessments in one model call "
+        f"({len(payloads) - len(misses)} from cache)"
+    )
+    return results
@@ -1,8 +1,8 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models
 from datetime import datetime
 
-async def add_audit_log(db: Session, user_id: int, user_name: str, action: str, details: str, ip_address: str = None):
+async def add_audit_log(db: AsyncSession, user_id: int, user_name: str, action: str, details: str, ip_address: str = None):
     """
     Add an audit log entry to the database
     """
@@ -16,8 +16,8 @@ async def add_audit_log(db: Session, user_id: int, user_name: str, action: str,
             timestamp=datetime.utcnow()
         )
         db.add(log_entry)
-        db.commit()
+        await db.commit()
         return log_entry
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise e
\ No newline at end of file
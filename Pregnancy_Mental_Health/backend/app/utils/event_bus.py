@@ -0,0 +1,149 @@
+"""
+Event bus behind the WebSocket manager, so an event published in one
+worker reaches sockets connected to any worker.
+
+The manager always delivers an event to its own sockets first, then hands
+it to the bus to forward to the other workers. Backends:
+- InProcessBus (default): nothing to forward. Right for a single worker.
+- RedisBus (WS_BUS_URL set): Redis-protocol pub/sub (Redis, Valkey,
+  KeyDB...). Every worker subscribes to one topic and receives every
+  event; a worker without subscribers for the event's channel ignores it.
+  Forwarding runs in a background task, so publish() never waits on the
+  network. If the store is down, events still reach the publishing
+  worker's own sockets; the others miss them until it is back.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# deliver(channel, message, coalesce_key) on the receiving worker
+Deliver = Callable[[str, str, Optional[str]], None]
+
+
+class InProcessBus:
+    """Single worker: every subscriber is local, nothing to forward."""
+
+    name = "in-process"
+
+    async def start(self, deliver: Deliver):
+        pass
+
+    def publish(self, channel: str, message: str, coalesce_key: Optional[str] = None):
+        pass
+
+    async def close(self):
+        pass
+
+    def metrics(self) -> dict:
+        return {"backend": self.name}
+
+
+class RedisBus:
+    """Fan events out to every worker over Redis-protocol pub/sub."""
+
+    name = "redis"
+
+    def __init__(self, url: str, topic: str = "ppd:ws", max_pending: int = 10000):
+        import redis.asyncio as redis
+
+        # RESP2: also spoken by servers that predate HELLO (Redis < 6 and most compatibles)
+        self.client = redis.from_url(url, protocol=2, socket_connect_timeout=2)
+        self.topic = topic
+        self.origin = uuid.uuid4().hex  # our own events come back on the topic: skip them
+        self._pending: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._tasks = []
+        self._deliver: Optional[Deliver] = None
+        self._last_error_log = 0.0
+
+        self.forwarded = 0
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._tasks = [
+            asyncio.create_task(self._forward()),
+            asyncio.create_task(self._listen()),
+        ]
+
+    def publish(self, channel: str, message: str, coalesce_key: Optional[str] = None):
+        envelope = json.dumps({"o": self.origin, "c": channel, "m": message, "k": coalesce_key})
+        try:
+            self._pending.put_nowait(envelope)
+        except asyncio.QueueFull:
+            self.dropped += 1  # store unreachable for a while: keep memory bounded
+
+    async def _forward(self):
+        """Send queued events, in batches of whatever piled up since the last round trip."""
+        while True:
+            batch = [await self._pending.get()]
+            while not self._pending.empty() and len(batch) < 500:
+                batch.append(self._pending.get_nowait())
+            try:
+                async with self.client.pipeline(transaction=False) as pipe:
+                    for envelope in batch:
+                        pipe.publish(self.topic, envelope)
+                    await pipe.execute()
+                self.forwarded += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                self._error("publish", e)
+                await asyncio.sleep(1)
+
+    async def _listen(self):
+        """Deliver other workers' events to our sockets; resubscribe after errors."""
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.topic)
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    envelope = json.loads(item["data"])
+                    if envelope["o"] == self.origin:
+                        continue
+                    self.received += 1
+                    self._deliver(envelope["c"], envelope["m"], envelope["k"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._error("subscribe", e)
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def _error(self, action: str, error: Exception):
+        self.errors += 1
+        now = time.monotonic()
+        if now - self._last_error_log > 60:  # don't log every event during an outage
+            self._last_error_log = now
+            logger.warning(f"WebSocket event bus {action} failed, other workers miss events: {error}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.client.aclose()
+
+    def metrics(self) -> dict:
+        return {
+            "backend": self.name,
+            "pending": self._pending.qsize(),
+            "forwarded": self.forwarded,
+            "received": self.received,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+def create_bus(url: Optional[str]):
+    return RedisBus(url) if url else InProcessBus()
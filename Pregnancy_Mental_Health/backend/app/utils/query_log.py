@@ -0,0 +1,47 @@
+"""
+Records the distinct SQL statements the app runs, for index_advisor.py.
+
+When QUERY_LOG_PATH is set, every statement the engine sends is appended to
+that file as one JSON line {"statement", "parameters"} the first time it is
+seen (later executions of the same SQL with other parameters are skipped).
+Parameters are real values, so only enable this against staging or seeded
+data, never against production.
+"""
+import json
+import logging
+import threading
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or statement in self._seen:
+            return
+        with self._lock:
+            if statement in self._seen:
+                return
+            self._seen.add(statement)
+            line = json.dumps({"statement": statement, "parameters": parameters}, default=str)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        logger.info(f"Recording distinct SQL statements to {self.path}")
+
+    def remove(self, engine):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+
+def read_queries(path: str) -> list:
+    """The recorded {"statement", "parameters"} entries, in recording order."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,37 @@
+"""
+Canonical risk bands for Assessment.risk_band.
+
+risk_level keeps whatever display string was written ("High", "High Risk",
+"Moderate Risk", "Medium", ...); risk_band is the small integer that
+queries filter and group on.
+"""
+from typing import Optional
+
+from sqlalchemy import case, func
+
+LOW = 0
+MODERATE = 1
+HIGH = 2
+
+LABELS = {LOW: "Low Risk", MODERATE: "Moderate Risk", HIGH: "High Risk"}
+
+_LEVELS = {
+    "low": LOW, "low risk": LOW,
+    "moderate": MODERATE, "moderate risk": MODERATE,
+    "medium": MODERATE, "medium risk": MODERATE,
+    "high": HIGH, "high risk": HIGH,
+}
+
+
+def risk_band(risk_level) -> Optional[int]:
+    """Band for a stored risk_level string, or None if it isn't a risk level."""
+    return _LEVELS.get((risk_level or "").strip().lower())
+
+
+def risk_band_expression(column):
+    """SQL equivalent of risk_band(), for backfilling existing rows."""
+    normalised = func.lower(func.trim(column))
+    return case(
+        *[(normalised.in_([k for k, v in _LEVELS.items() if v == band]), band) for band in (LOW, MODERATE, HIGH)],
+        else_=None,
+    )
@@ -1,19 +1,357 @@
-from typing import List
-from fastapi import WebSocket
+"""
+WebSocket connections grouped into channels.
+
+A socket is subscribed to channels when it connects, and publish(channel,
+payload) only sends to that channel's subscribers, so the cost of an event
+depends on who it is for rather than on how many sockets are open.
+
+Channels:
+    user:{id}           every socket of one signed-in user (tabs, devices)
+    role:{role}         everyone signed in with that role (admin, doctor, ...)
+    clinician:{email}   doctors and nurses, keyed like Notification.clinician_email
+    recovery:{nonce}    an anonymous forgot-password page waiting for its code
+
+Delivery: publish() only puts the message on each subscriber's bounded
+outbound queue and returns; a writer task per socket sends it. A slow or
+dead socket therefore delays nobody else. When a socket falls behind:
+- publish(..., coalesce=True) replaces a still-queued message of the same
+  type instead of queueing another (use it for "something changed, refetch"
+  events where only the latest matters);
+- otherwise, once its queue is full (WS_SEND_QUEUE_SIZE) or a send takes
+  longer than WS_SEND_TIMEOUT, the socket is closed and its queued messages
+  are dropped. The frontend's openWebSocket() reconnects with backoff and
+  its onreopen callback refetches what the page missed.
+
+With several workers, publish() also hands the event to the event bus
+(utils/event_bus.py, WS_BUS_URL) so the other workers deliver it to their
+sockets too.
+
+Liveness: every WS_PING_INTERVAL seconds each socket is sent {"type":
+"ping"}, which clients answer with {"type": "pong"}. A socket nothing was
+received on for WS_IDLE_TIMEOUT seconds (a closed laptop, a dropped mobile
+connection that never sent a FIN) is closed and unregistered, so it stops
+costing a queue slot and a writer task. New connections beyond
+WS_MAX_CONNECTIONS per worker or WS_MAX_CONNECTIONS_PER_USER per user on
+a worker are refused.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket, status
+
+from .. import config
+from .event_bus import InProcessBus, create_bus
+
+logger = logging.getLogger(__name__)
+
+CLINICIAN_ROLES = ("doctor", "nurse")
+PING = json.dumps({"type": "ping"})
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def role_channel(role: str) -> str:
+    return f"role:{role}"
+
+
+def clinician_channel(email: str) -> str:
+    return f"clinician:{email.lower()}"
+
+
+def recovery_channel(nonce: str) -> str:
+    return f"recovery:{nonce}"
+
+
+def channels_for(principal) -> List[str]:
+    """Channels an authenticated socket is subscribed to."""
+    channels = [user_channel(principal.id)]
+    if principal.role:
+        channels.append(role_channel(principal.role))
+        if principal.role in CLINICIAN_ROLES:
+            channels.append(clinician_channel(principal.email))
+    return channels
+
+
+class _Connection:
+    """One socket: its channels, its outbound queue and the task draining it."""
+
+    def __init__(self, websocket: WebSocket, channels: List[str], max_queue: int, user_id: Optional[int]):
+        self.websocket = websocket
+        self.channels = channels
+        self.user_id = user_id
+        self.last_seen = time.monotonic()  # last message from the client
+        self.max_queue = max_queue
+        self.queue = deque()          # [coalesce key or None, message]
+        self.coalescible = {}         # coalesce key -> its entry in queue
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.writer: Optional[asyncio.Task] = None
+
+    def enqueue(self, message: str, coalesce_key: Optional[str]) -> str:
+        """Returns "queued", "coalesced" or "full"."""
+        if coalesce_key is not None:
+            entry = self.coalescible.get(coalesce_key)
+            if entry is not None:
+                entry[1] = message
+                return "coalesced"
+        if len(self.queue) >= self.max_queue:
+            return "full"
+        entry = [coalesce_key, message]
+        self.queue.append(entry)
+        if coalesce_key is not None:
+            self.coalescible[coalesce_key] = entry
+        self.ready.set()
+        return "queued"
+
+    async def run(self, manager: "WebSocketManager"):
+        """Writer task: send queued messages in order until the socket fails or is closed."""
+        try:
+            while True:
+                await self.ready.wait()
+                while self.queue:
+                    key, message = self.queue.popleft()
+                    if key is not None:
+                        del self.coalescible[key]
+                    await asyncio.wait_for(self.websocket.send_text(message), manager.send_timeout)
+                    manager.sent += 1
+                self.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            await manager.drop(self, "send timed out")
+        except Exception:
+            # Dead or half-closed socket: nothing more will get through
+            await manager.drop(self, None)
+
 
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(
+        self,
+        max_queue: int = config.WS_SEND_QUEUE_SIZE,
+        send_timeout: float = config.WS_SEND_TIMEOUT,
+        ping_interval: float = config.WS_PING_INTERVAL,
+        idle_timeout: float = config.WS_IDLE_TIMEOUT,
+        max_connections: int = config.WS_MAX_CONNECTIONS,
+        max_per_user: int = config.WS_MAX_CONNECTIONS_PER_USER,
+        bus=None,
+    ):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.bus = bus or InProcessBus()
+        self.channels: Dict[str, Set[_Connection]] = defaultdict(set)
+        self._connections: Dict[WebSocket, _Connection] = {}
+        self._per_user: Dict[int, int] = {}  # user id -> open sockets
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.published = 0
+        self.queued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped_messages = 0
+        self.dropped_connections = 0
+        self.rejected_connections = 0
+        self.idle_evictions = 0
 
-    async def connect(self, websocket: WebSocket):
+    async def start(self):
+        """Start pinging sockets and receiving other workers' events (lifespan startup)."""
+        self._loop = asyncio.get_running_loop()
+        self._heartbeat = asyncio.create_task(self.run_heartbeat())
+        await self.bus.start(self._deliver)
+
+    async def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        await self.bus.close()
+
+    def has_room(self, user_id: Optional[int] = None) -> bool:
+        """Whether a new connection (for user_id, if signed in) is within the caps."""
+        if len(self._connections) >= self.max_connections:
+            return False
+        if user_id is not None and self._per_user.get(user_id, 0) >= self.max_per_user:
+            return False
+        return True
+
+    async def connect(self, websocket: WebSocket, channels: Iterable[str] = (), user_id: Optional[int] = None) -> bool:
+        """Accept and register a socket. Returns False (socket closed) if over a connection cap."""
+        if not self.has_room(user_id):
+            self.rejected_connections += 1
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return False
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.subscribe(websocket, channels, user_id)
+        return True
+
+    def subscribe(self, websocket: WebSocket, channels: Iterable[str], user_id: Optional[int] = None):
+        """Register an accepted socket under channels and start its writer."""
+        connection = _Connection(websocket, list(channels), self.max_queue, user_id)
+        self._connections[websocket] = connection
+        if user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        for channel in connection.channels:
+            self.channels[channel].add(connection)
+        connection.writer = asyncio.create_task(connection.run(self))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        connection = self._connections.pop(websocket, None)
+        if connection is None:
+            return  # already dropped as a slow or idle consumer
+        connection.closed = True
+        if connection.user_id is not None:
+            remaining = self._per_user.pop(connection.user_id) - 1
+            if remaining:
+                self._per_user[connection.user_id] = remaining
+        for channel in connection.channels:
+            subscribers = self.channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.channels[channel]
+        self.dropped_messages += len(connection.queue)
+        connection.queue.clear()
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    def touch(self, websocket: WebSocket):
+        """Record that the client sent something (a pong or any other message)."""
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    async def drop(self, connection: _Connection, reason: Optional[str], code: int = status.WS_1013_TRY_AGAIN_LATER):
+        """Unregister a socket that can't keep up (or went quiet) and close it."""
+        if connection.closed:
+            return
+        self.disconnect(connection.websocket)
+        self.dropped_connections += 1
+        if reason:
+            logger.info(f"Closing WebSocket client ({reason})")
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    def heartbeat(self) -> int:
+        """Ping every socket; close the ones idle for longer than idle_timeout. Returns how many were closed."""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [c for c in self._connections.values() if c.last_seen < cutoff]
+        for connection in idle:
+            asyncio.create_task(self.drop(connection, None, status.WS_1001_GOING_AWAY))
+        self.idle_evictions += len(idle)
+        # A ping still waiting in a queue is as good as a new one
+        self._enqueue([c for c in self._connections.values() if not c.closed], PING, "ping")
+        return len(idle)
+
+    async def run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            self.heartbeat()
+
+    def _enqueue(self, connections: Iterable[_Connection], message: str, coalesce_key: Optional[str]) -> int:
+        reached = 0
+        full = []
+        for connection in connections:
+            result = connection.enqueue(message, coalesce_key)
+            if result == "full":
+                full.append(connection)
+                self.dropped_messages += 1
+                continue
+            reached += 1
+            if result == "coalesced":
+                self.coalesced += 1
+            else:
+                self.queued += 1
+        for connection in full:
+            asyncio.create_task(self.drop(connection, "send queue full"))
+        return reached
+
+    def _deliver(self, channel: str, message: str, coalesce_key: Optional[str] = None) -> int:
+        """Queue message for this worker's subscribers of channel ("*": every socket)."""
+        if channel == "*":
+            subscribers = self._connections.values()
+        else:
+            subscribers = self.channels.get(channel)
+        if not subscribers:
+            return 0
+        return self._enqueue(list(subscribers), message, coalesce_key)
+
+    async def publish(self, channel: str, payload: dict, coalesce: bool = False) -> int:
+        """
+        Queue payload for the sockets subscribed to channel, on this worker
+        and (through the bus) every other one, and return without waiting for
+        the sends. Returns how many of this worker's sockets it was queued for.
+        coalesce=True: replace a still-queued message of the same type.
+        """
+        return self.publish_nowait(channel, payload, coalesce)
+
+    def publish_threadsafe(self, channel: str, payload: dict, coalesce: bool = False):
+        """
+        publish() from synchronous code: sync route handlers run in a
+        threadpool, so the event is handed to the event loop instead of
+        touching the queues from another thread.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and (self._loop is None or running is self._loop):
+            self.publish_nowait(channel, payload, coalesce)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.publish_nowait, channel, payload, coalesce)
+        # else: no event loop (scripts, migrations), so no sockets to reach
+
+    def publish_nowait(self, channel: str, payload: dict, coalesce: bool = False) -> int:
+        """publish() for code already running on the event loop that can't await."""
+        self.published += 1
+        message = json.dumps(payload)
+        coalesce_key = payload.get("type") if coalesce else None
+        reached = self._deliver(channel, message, coalesce_key)
+        self.bus.publish(channel, message, coalesce_key)
+        return reached
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        """Queue for every connected socket. Prefer publish() for anything user-specific."""
+        self._deliver("*", message)
+        self.bus.publish("*", message)
+
+    def metrics(self) -> dict:
+        depths = [len(c.queue) for c in self._connections.values()]
+        by_role = {
+            channel[len("role:"):]: len(subscribers)
+            for channel, subscribers in self.channels.items()
+            if channel.startswith("role:")
+        }
+        return {
+            "connections": len(self._connections),
+            "max_connections": self.max_connections,
+            "connections_by_role": by_role,
+            "anonymous_connections": sum(1 for c in self._connections.values() if c.user_id is None),
+            "users_connected": len(self._per_user),
+            "channels": len(self.channels),
+            "published": self.published,
+            "queued": self.queued,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "max_queue": self.max_queue,
+            "dropped_messages": self.dropped_messages,
+            "dropped_connections": self.dropped_connections,
+            "rejected_connections": self.rejected_connections,
+            "idle_evictions": self.idle_evictions,
+            "bus": self.bus.metrics(),
+        }
+
 
-manager = WebSocketManager()
+# Global WebSocket manager instance
+manager = WebSocketManager(bus=create_bus(config.WS_BUS_URL))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the ML scoring path (no database needed).
+
+Usage (from the backend directory):
+    python benchmark_ml.py shap [--runs 200]
+    python benchmark_ml.py batch [--size 200] [--runs 20]
+    python benchmark_ml.py encoder [--runs 2000]
+    python benchmark_ml.py pool [--requests 200]
+    python benchmark_ml.py cache [--runs 500]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# A complete questionnaire using the same option values as the nurse form
+SAMPLE_FORM = {
+    "patient_name": "Benchmark Patient",
+    "age": 27,
+    "residence": "City",
+    "education_level": "University",
+    "marital_status": "Married",
+    "partner_education": "College",
+    "partner_income": "10000-20000",
+    "household_members": "2 to 5",
+    "relationship_inlaws": "Neutral",
+    "relationship_husband": "Good",
+    "support_during_pregnancy": "Medium",
+    "need_more_support": "High",
+    "trust_share_feelings": "Yes",
+    "family_type": "Nuclear",
+    "total_children_now": "One",
+    "pregnancy_number": "2",
+    "pregnancy_planned": "No",
+    "regular_checkups": "Yes",
+    "medical_conditions_pregnancy": "None",
+    "occupation_before_surgery": "Housewife",
+    "depression_before_pregnancy": "Negative",
+    "depression_during_pregnancy": "Positive",
+    "fear_pregnancy_childbirth": "Yes",
+    "major_life_changes_pregnancy": "No",
+    "abuse_during_pregnancy": "No",
+    **{f"epds_{i}": 1 for i in range(1, 11)},
+}
+
+
+def _summarise(label: str, samples_ms: list):
+    samples_ms = sorted(samples_ms)
+    p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+    print(
+        f"  {label:<28} mean={statistics.mean(samples_ms):8.2f} ms   "
+        f"p50={statistics.median(samples_ms):8.2f} ms   p95={p95:8.2f} ms"
+    )
+
+
+def _legacy_shap_worker(runs: int, queue):
+    """Per-request shap.Explainer, exactly as get_top_features used to do it."""
+    import numpy as np
+    import shap
+    from app.ml_model import get_model, build_model_input_from_form
+
+    X = build_model_input_from_form(SimpleNamespace(**SAMPLE_FORM))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        explainer = shap.Explainer(get_model(), X.sample(min(50, len(X))))
+        values = explainer(X).values[0]
+        np.argsort(np.abs(values))[-5:]
+        samples.append((time.perf_counter() - start) * 1000)
+    queue.put(samples)
+
+
+def bench_shap(runs: int):
+    from app.ml_model import build_model_input_from_form, get_explainer, get_top_features
+
+    print(f"\n=== SHAP explanation latency ({runs} runs) ===\n")
+
+    # Before: run in a child process so a crash inside shap is reported, not fatal
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_legacy_shap_worker, args=(runs, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode == 0:
+        _summarise("before (per-request)", queue.get())
+    else:
+        print(f"  before (per-request)         crashed (exit code {proc.exitcode})")
+
+    # After: one explainer for the process
+    start = time.perf_counter()
+    get_explainer()
+    print(f"  explainer build (once)       {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+    X = build_model_input_from_form(SimpleNamespace(**SAMPLE_FORM))
+    feature_names = list(X.columns)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        get_top_features(X, feature_names)
+        samples.append((time.perf_counter() - start) * 1000)
+    _summarise("after (cached explainer)", samples)
+    print()
+
+
+def _roster(size: int) -> list:
+    """Vary age, pregnancy number and EPDS answers so rows are not identical."""
+    forms = []
+    for i in range(size):
+        form = dict(SAMPLE_FORM)
+        form["age"] = 18 + i % 25
+        form["pregnancy_number"] = str(1 + i % 4)
+        for j in range(1, 11):
+            form[f"epds_{j}"] = (i + j) % 4
+        forms.append(SimpleNamespace(**form))
+    return forms
+
+
+def bench_batch(size: int, runs: int):
+    from app.schemas import AssessmentCreate
+    from app.services.prediction_cache import prediction_cache
+    from app.services.scoring_service import score_assessment, predict_batch
+
+    print(f"\n=== Scoring {size} assessments ({runs} runs) ===\n")
+    payloads = [AssessmentCreate(**vars(f)) for f in _roster(size)]
+
+    # Cache cleared between phases so every run hits the model
+    singles = [score_assessment(p, use_cache=False) for p in payloads]
+    prediction_cache.clear()
+    batched = predict_batch(payloads)
+    mismatches = sum(1 for s, b in zip(singles, batched) if s != b)
+    print(f"  batch vs single mismatches   {mismatches} / {size}")
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for p in payloads:
+            score_assessment(p, use_cache=False)
+        samples.append((time.perf_counter() - start) * 1000)
+    _summarise(f"{size} x single predict", samples)
+
+    samples = []
+    for _ in range(runs):
+        prediction_cache.clear()
+        start = time.perf_counter()
+        predict_batch(payloads)
+        samples.append((time.perf_counter() - start) * 1000)
+    _summarise("one batch call", samples)
+    print()
+
+
+def bench_encoder(runs: int):
+    from app.ml_model import build_model_input_from_form, encode_form
+
+    print(f"\n=== Form encoding latency ({runs} runs) ===\n")
+    form = SimpleNamespace(**SAMPLE_FORM)
+
+    for label, encode in [
+        ("pandas get_dummies", build_model_input_from_form),
+        ("precompiled encoder", encode_form),
+    ]:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            encode(form)
+            samples.append((time.perf_counter() - start) * 1000)
+        _summarise(label, samples)
+    print()
+
+
+def bench_pool(requests: int):
+    import asyncio
+    from fastapi import HTTPException
+    from app.ml_model import encode_form, get_feature_columns, get_top_features
+    from app.services.inference_pool import inference_pool
+
+    print(f"\n=== Event-loop lag during {requests} SHAP calls ===\n")
+    X = encode_form(SimpleNamespace(**SAMPLE_FORM))
+    names = list(get_feature_columns())
+
+    async def heartbeat(lags: list, stop: asyncio.Event):
+        # How late a 5 ms tick fires = how long the loop was blocked
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append((time.perf_counter() - start) * 1000 - 5)
+
+    async def burst(use_pool: bool):
+        lags, stop = [], asyncio.Event()
+        beat = asyncio.create_task(heartbeat(lags, stop))
+        await asyncio.sleep(0.02)
+        rejected = 0
+
+        async def one():
+            nonlocal rejected
+            if not use_pool:
+                return get_top_features(X, names)
+            try:
+                return await inference_pool.run_async(get_top_features, X, names)
+            except HTTPException:
+                rejected += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = (time.perf_counter() - start) * 1000
+        stop.set()
+        await beat
+        return lags, elapsed, rejected
+
+    for label, use_pool in [("inline on event loop", False), ("inference pool", True)]:
+        lags, elapsed, rejected = asyncio.run(burst(use_pool))
+        print(f"  {label:<28} total={elapsed:8.1f} ms   max loop lag={max(lags):8.2f} ms   rejected(503)={rejected}")
+    print(f"\n  pool metrics: {inference_pool.metrics()}\n")
+
+
+def bench_cache(runs: int):
+    from app.schemas import AssessmentCreate
+    from app.services.prediction_cache import prediction_cache
+    from app.services.scoring_service import score_assessment, cached_score
+
+    print(f"\n=== Re-scoring the same questionnaire ({runs} runs) ===\n")
+    payload = AssessmentCreate(**SAMPLE_FORM)
+
+    samples = []
+    for _ in range(runs):
+        prediction_cache.clear()
+        start = time.perf_counter()
+        score_assessment(payload)
+        samples.append((time.perf_counter() - start) * 1000)
+    _summarise("cold (model call)", samples)
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        cached_score(payload)
+        samples.append((time.perf_counter() - start) * 1000)
+    _summarise("warm (cache hit)", samples)
+    print(f"\n  cache metrics: {prediction_cache.metrics()}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    shap_cmd = sub.add_parser("shap", help="per-request explainer vs cached explainer")
+    shap_cmd.add_argument("--runs", type=int, default=200)
+
+    batch_cmd = sub.add_parser("batch", help="N single predictions vs one batch call")
+    batch_cmd.add_argument("--size", type=int, default=200)
+    batch_cmd.add_argument("--runs", type=int, default=20)
+
+    enc_cmd = sub.add_parser("encoder", help="pandas get_dummies vs precompiled encoder")
+    enc_cmd.add_argument("--runs", type=int, default=2000)
+
+    pool_cmd = sub.add_parser("pool", help="event-loop lag: inline SHAP vs inference pool")
+    pool_cmd.add_argument("--requests", type=int, default=200)
+
+    cache_cmd = sub.add_parser("cache", help="cold scoring vs prediction-cache hit")
+    cache_cmd.add_argument("--runs", type=int, default=500)
+
+    args = parser.parse_args()
+    if args.command == "shap":
+        bench_shap(args.runs)
+    elif args.command == "batch":
+        bench_batch(args.size, args.runs)
+    elif args.command == "encoder":
+        bench_encoder(args.runs)
+    elif args.command == "pool":
+        bench_pool(args.requests)
+    elif args.command == "cache":
+        bench_cache(args.runs)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Query benchmarks for the doctor endpoints against a seeded throwaway database.
+
+Seeds its own SQLite file (or BENCH_DATABASE_URL, e.g. a scratch Postgres
+database — never point this at real data) and calls the route functions
+directly, counting the SQL statements each one issues.
+
+Usage (from the backend directory):
+    python benchmark_queries.py assessments [--assessments 5000] [--runs 20]
+    python benchmark_queries.py dashboard [--assessments 100000] [--runs 50] [--p95-budget 50]
+    python benchmark_queries.py pool [--requests 200]
+    python benchmark_queries.py notifications [--notifications 200000] [--runs 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dtime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "ppd_bench_app.db"))
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import User, Patient, Assessment, Appointment, Notification
+from app.utils.risk_bands import risk_band
+
+RISK_LEVELS = ["High", "High Risk", "Medium", "Moderate Risk", "Low", "Low Risk"]
+STATUSES = ["submitted", "reviewed", "complete", "draft"]
+
+
+def _summarise(label: str, samples_ms: list):
+    samples_ms = sorted(samples_ms)
+    p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+    print(
+        f"  {label:<28} mean={statistics.mean(samples_ms):8.2f} ms   "
+        f"p50={statistics.median(samples_ms):8.2f} ms   p95={p95:8.2f} ms"
+    )
+
+
+class _StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def _seed(assessments: int, patients_per_doctor: int = None):
+    """Create a fresh database: 2 doctors, 5 nurses, patients, appointments and assessments."""
+    url = os.getenv("BENCH_DATABASE_URL") or "sqlite:///" + os.path.join(tempfile.gettempdir(), "ppd_bench.db")
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        if os.path.exists(path):
+            os.unlink(path)
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    rng = random.Random(42)
+    patients = patients_per_doctor or max(1, assessments // 3)
+    now = datetime.now(timezone.utc)
+
+    with engine.begin() as conn:
+        users = [
+            {"id": 1, "first_name": "Dana", "last_name": "Doctor", "email": "doctor@bench.local", "role": "doctor"},
+            {"id": 2, "first_name": "Omar", "last_name": "Other", "email": "other@bench.local", "role": "doctor"},
+        ] + [
+            {"id": 10 + i, "first_name": f"Nurse{i}", "last_name": None if i % 2 else "Smith",
+             "email": f"nurse{i}@bench.local", "role": "nurse"}
+            for i in range(5)
+        ]
+        for u in users:
+            u["hashed_password"] = "x"
+        conn.execute(insert(User), users)
+
+        conn.execute(insert(Patient), [
+            {
+                "id": p, "name": f"Patient {p}", "user_id": 1,
+                "assigned_doctor_id": 1 if p <= patients else 2,
+                "created_by_nurse_id": rng.choice([10, 11, 12, 13, 14]),
+                "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 120)),
+            }
+            for p in range(1, patients * 2 + 1)
+        ])
+
+        appointments = []
+        for p in range(1, patients * 2 + 1):
+            for _ in range(rng.randint(0, 4)):
+                appointments.append({
+                    "patient_id": p,
+                    "doctor_id": 1 if p <= patients else 2,
+                    "date": date.today() + timedelta(days=rng.randint(-60, 60)),
+                    "time": dtime(rng.randint(8, 17), rng.choice([0, 30])),
+                    "status": rng.choice(["pending", "confirmed", "completed", "cancelled"]),
+                })
+        if appointments:
+            conn.execute(insert(Appointment), appointments)
+
+        rows = []
+        for i in range(assessments * 2):
+            doctor = 1 if i % 2 == 0 else 2
+            patient = rng.randint(1, patients) + (0 if doctor == 1 else patients)
+            status = rng.choice(STATUSES)
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+            reviewed_at = created_at + timedelta(hours=rng.randint(1, 72)) if status == "reviewed" else None
+            risk_level = rng.choice(RISK_LEVELS)
+            rows.append({
+                "patient_name": f"Patient {patient}",
+                "patient_id": patient,
+                "raw_data": {},
+                "risk_score": rng.uniform(0, 100),
+                "risk_level": risk_level,
+                "risk_band": risk_band(risk_level),  # Core inserts skip the model's validator
+                "epds_score": rng.randint(0, 30),
+                "status": status,
+                "nurse_id": rng.choice([10, 11, 12, 13, 14, None]),
+                "assigned_doctor_id": doctor,
+                "clinician_email": "doctor@bench.local",
+                "created_at": created_at,
+                "reviewed_at": reviewed_at,
+            })
+        conn.execute(insert(Assessment), rows)
+
+    # Core inserts bypass the ORM hooks that maintain the dashboard rollup
+    from app.services.clinician_stats import rebuild
+    db = sessionmaker(bind=engine)()
+    try:
+        rebuild(db)
+    finally:
+        db.close()
+
+    return engine
+
+
+def _legacy_doctor_assessments(db, doctor_id: int) -> list:
+    """The pre-join implementation: every appointment in the DB + one nurse query per row."""
+    assessments = (
+        db.query(Assessment)
+        .join(Patient, Assessment.patient_id == Patient.id)
+        .filter(Assessment.assigned_doctor_id == doctor_id)
+        .order_by(Assessment.created_at.desc(), Assessment.id.desc())
+        .all()
+    )
+    appointment_map = {}
+    for app in db.query(Appointment).order_by(Appointment.id).all():
+        app_datetime = datetime.combine(app.date, app.time)
+        if app.patient_id not in appointment_map or app_datetime > appointment_map[app.patient_id]["datetime"]:
+            appointment_map[app.patient_id] = {"status": app.status, "datetime": app_datetime}
+    result = []
+    for a in assessments:
+        nurse = db.query(User).filter(User.id == a.nurse_id).first()
+        appointment = appointment_map.get(a.patient_id)
+        result.append({
+            "id": a.id,
+            "nurse_name": f"{nurse.first_name} {nurse.last_name or ''}".strip() if nurse else "Unknown",
+            "appointment_status": appointment["status"] if appointment else "Not Scheduled",
+        })
+    return result
+
+
+def bench_assessments(assessments: int, runs: int):
+    from app.routers.doctor import get_doctor_assessments
+
+    print(f"\n=== GET /doctor/assessments: {assessments} assessments for this doctor ===\n")
+    engine = _seed(assessments)
+    counter = _StatementCounter(engine)
+    Session = sessionmaker(bind=engine)
+
+    def call(fn):
+        db = Session()
+        try:
+            doctor = db.get(User, 1)
+            counter.count = 0
+            start = time.perf_counter()
+            result = fn(db, doctor)
+            return result, (time.perf_counter() - start) * 1000, counter.count
+        finally:
+            db.close()
+
+    legacy, _, legacy_queries = call(lambda db, d: _legacy_doctor_assessments(db, d.id))
+    joined, _, joined_queries = call(lambda db, d: get_doctor_assessments(None, None, d, db))
+    mismatches = sum(
+        1 for old, new in zip(legacy, joined)
+        if (old["id"], old["nurse_name"], old["appointment_status"])
+        != (new["id"], new["nurse_name"], new["appointment_status"])
+    ) + abs(len(legacy) - len(joined))
+    print(f"  rows={len(joined)}   mismatches vs legacy: {mismatches}")
+    print(f"  SQL statements: legacy={legacy_queries}   joined={joined_queries}\n")
+
+    _summarise("legacy (N+1)", [call(lambda db, d: _legacy_doctor_assessments(db, d.id))[1] for _ in range(runs)])
+    _summarise("joined, full list", [call(lambda db, d: get_doctor_assessments(None, None, d, db))[1] for _ in range(runs)])
+    _summarise("joined, page of 50", [call(lambda db, d: get_doctor_assessments(50, None, d, db))[1] for _ in range(runs)])
+
+    # Walk every page and make sure the cursor neither skips nor repeats rows
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, _, _ = call(lambda db, d: get_doctor_assessments(50, cursor, d, db))
+        seen.extend(row["id"] for row in page["assessments"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    ok = seen == [row["id"] for row in joined]
+    print(f"\n  cursor walk: {pages} pages, {len(seen)} rows, matches full list: {ok}\n")
+
+
+def bench_dashboard(assessments: int, runs: int, p95_budget: float):
+    import asyncio
+    from app.routers.doctor import get_doctor_dashboard
+
+    print(f"\n=== GET /doctor/dashboard: {assessments} assessments for this doctor ===\n")
+    start = time.perf_counter()
+    engine = _seed(assessments)
+    print(f"  seeded in {time.perf_counter() - start:.1f}s")
+    counter = _StatementCounter(engine)
+    Session = sessionmaker(bind=engine)
+
+    samples = []
+    for _ in range(runs):
+        db = Session()
+        try:
+            doctor = db.get(User, 1)
+            counter.count = 0
+            start = time.perf_counter()
+            asyncio.run(get_doctor_dashboard(db, doctor))
+            samples.append((time.perf_counter() - start) * 1000)
+        finally:
+            db.close()
+
+    print(f"  SQL statements per request: {counter.count}\n")
+    _summarise("dashboard", samples)
+    samples.sort()
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    if p95 > p95_budget:
+        print(f"\n  FAIL: p95 {p95:.1f} ms exceeds budget of {p95_budget:.0f} ms\n")
+        sys.exit(1)
+    print(f"\n  OK: p95 {p95:.1f} ms within budget of {p95_budget:.0f} ms\n")
+
+
+def bench_pool(requests: int):
+    """Per-request cost of opening a connection (NullPool) vs reusing a pooled one."""
+    from sqlalchemy import text
+    from sqlalchemy.pool import NullPool
+    from app.services.db_pool import TimedQueuePool
+
+    url = os.getenv("BENCH_DATABASE_URL") or "sqlite:///" + os.path.join(tempfile.gettempdir(), "ppd_bench.db")
+    print(f"\n=== {requests} sequential requests (one short session each) against {url.split('@')[-1]} ===\n")
+    configs = [
+        ("NullPool (connect each time)", {"poolclass": NullPool}),
+        ("pool, no pre-ping", {"poolclass": TimedQueuePool, "pool_size": 5}),
+        ("pool + pre-ping", {"poolclass": TimedQueuePool, "pool_size": 5, "pool_pre_ping": True}),
+    ]
+    for label, kwargs in configs:
+        engine = create_engine(url, **kwargs)
+        Session = sessionmaker(bind=engine)
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            db = Session()
+            try:
+                db.execute(text("SELECT 1")).scalar()
+            finally:
+                db.close()
+            samples.append((time.perf_counter() - start) * 1000)
+        engine.dispose()
+        _summarise(label, samples)
+    print()
+
+
+def bench_notifications(notifications: int, runs: int):
+    """Unread badge: COUNT over the recipient's notifications vs the maintained counter."""
+    from sqlalchemy import func, select
+    from app.services import notification_counters
+
+    url = os.getenv("BENCH_DATABASE_URL") or "sqlite:///" + os.path.join(tempfile.gettempdir(), "ppd_bench.db")
+    print(f"\n=== GET /notifications/unread-count: {notifications} notifications, 20 recipients ===\n")
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    emails = ["doctor@bench.local"] + [f"nurse{i}@bench.local" for i in range(19)]
+    with engine.begin() as conn:
+        for start in range(0, notifications, 50000):
+            conn.execute(insert(Notification), [
+                {
+                    "title": "Bench", "message": "x", "clinician_email": rng.choice(emails),
+                    "is_read": rng.random() < 0.7,
+                }
+                for _ in range(start, min(notifications, start + 50000))
+            ])
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    try:
+        notification_counters.rebuild(db)  # Core inserts bypass the ORM hooks
+
+        def legacy():
+            return db.scalar(
+                select(func.count()).select_from(Notification)
+                .where(Notification.clinician_email == emails[0], Notification.is_read == False)  # noqa: E712
+            )
+
+        def counter():
+            return notification_counters.unread_count(db, emails[0])
+
+        print(f"  unread: COUNT={legacy()}   counter={counter()}\n")
+        for label, fn in (("COUNT(*) per request", legacy), ("counter lookup", counter)):
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - start) * 1000)
+            _summarise(label, samples)
+
+        # One new notification and one "read all": what the pushes would carry
+        db.add(Notification(title="Bench", message="x", clinician_email=emails[0]))
+        db.commit()
+        db.query(Notification).filter(
+            Notification.clinician_email == emails[0], Notification.is_read == False  # noqa: E712
+        ).update({Notification.is_read: True})
+        db.commit()
+        print(f"\n  after insert + read-all: COUNT={legacy()}   counter={counter()}\n")
+    finally:
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    assessments_cmd = sub.add_parser("assessments", help="N+1 listing vs single joined query + cursor pages")
+    assessments_cmd.add_argument("--assessments", type=int, default=5000)
+    assessments_cmd.add_argument("--runs", type=int, default=20)
+
+    dashboard_cmd = sub.add_parser("dashboard", help="dashboard latency at scale; exits 1 if p95 is over budget")
+    dashboard_cmd.add_argument("--assessments", type=int, default=100000)
+    dashboard_cmd.add_argument("--runs", type=int, default=50)
+    dashboard_cmd.add_argument("--p95-budget", type=float, default=50.0, help="milliseconds")
+
+    pool_cmd = sub.add_parser("pool", help="connection setup cost: NullPool vs pooled engine")
+    pool_cmd.add_argument("--requests", type=int, default=200)
+
+    notifications_cmd = sub.add_parser("notifications", help="unread badge: COUNT vs maintained counter")
+    notifications_cmd.add_argument("--notifications", type=int, default=200000)
+    notifications_cmd.add_argument("--runs", type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == "assessments":
+        bench_assessments(args.assessments, args.runs)
+    elif args.command == "dashboard":
+        bench_dashboard(args.assessments, args.runs, args.p95_budget)
+    elif args.command == "pool":
+        bench_pool(args.requests)
+    elif args.command == "notifications":
+        bench_notifications(args.notifications, args.runs)
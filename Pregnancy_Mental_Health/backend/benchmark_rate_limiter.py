@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Rate limiter benchmark and checks (app/rate_limiter.py).
+
+Without --redis-url the Redis backend runs against FakeRedisServer below:
+a local server speaking enough of the Redis protocol (RESP) for the
+limiter (PING, GET, INCRBY, DECRBY, EXPIRE, MULTI/EXEC) and for the
+WebSocket event bus (SUBSCRIBE, PUBLISH). Its numbers measure
+the limiter's round trips, not a real Redis; pass --redis-url for that
+(use a scratch database, the benchmark writes keys).
+
+Usage (from the backend directory):
+    python benchmark_rate_limiter.py bench [--ips 10000] [--checks 200000] [--concurrency 64]
+    python benchmark_rate_limiter.py verify [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.rate_limiter import RateLimiter
+
+ENDPOINTS = ["/api/login", "/patients/", "/doctor/dashboard", "/api/signup"]
+
+
+# ── Fake Redis-protocol server ─────────────────────────────────────────────
+
+class FakeRedisServer:
+    """Single-database, in-memory RESP2 server on 127.0.0.1, run in its own thread."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.subscribers = defaultdict(set)  # channel -> writers
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._writers = set()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    def start(self) -> "FakeRedisServer":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        async def close():
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._serve, "127.0.0.1", 0)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _serve(self, reader, writer):
+        queued = None  # commands after MULTI
+        self._writers.add(writer)
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                name = command[0].upper()
+                if name in (b"SUBSCRIBE", b"UNSUBSCRIBE"):
+                    reply = self._subscribe(writer, name, command[1:])
+                elif name == b"MULTI":
+                    queued, reply = [], b"+OK\r\n"
+                elif name == b"EXEC" and queued is not None:
+                    replies = [self._execute(c) for c in queued]
+                    queued, reply = None, b"*%d\r\n" % len(replies) + b"".join(replies)
+                elif name == b"DISCARD" and queued is not None:
+                    queued, reply = None, b"+OK\r\n"
+                elif queued is not None:
+                    queued.append(command)
+                    reply = b"+QUEUED\r\n"
+                else:
+                    reply = self._execute(command)
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            for writers in self.subscribers.values():
+                writers.discard(writer)
+            writer.close()
+
+    def _subscribe(self, writer, name, channels) -> bytes:
+        reply = b""
+        for channel in channels:
+            if name == b"SUBSCRIBE":
+                self.subscribers[channel].add(writer)
+            else:
+                self.subscribers[channel].discard(writer)
+            count = sum(writer in writers for writers in self.subscribers.values())
+            kind = name.lower()
+            reply += b"*3\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n:%d\r\n" % (
+                len(kind), kind, len(channel), channel, count)
+        return reply
+
+    @staticmethod
+    async def _read_command(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        count = int(line[1:])  # *<count>
+        args = []
+        for _ in range(count):
+            length = int((await reader.readline())[1:])  # $<length>
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _execute(self, command) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"CLIENT", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            value = self._live(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name in (b"INCRBY", b"DECRBY"):
+            amount = int(args[1]) if name == b"INCRBY" else -int(args[1])
+            value = int(self._live(args[0]) or 0) + amount
+            self.data[args[0]] = str(value).encode()
+            return b":%d\r\n" % value
+        if name == b"EXPIRE":
+            if self._live(args[0]) is None:
+                return b":0\r\n"
+            self.expires[args[0]] = time.monotonic() + int(args[1])
+            return b":1\r\n"
+        if name == b"PUBLISH":
+            channel, message = args
+            push = b"*3\r\n$7\r\nmessage\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n" % (
+                len(channel), channel, len(message), message)
+            for writer in self.subscribers[channel]:
+                writer.write(push)
+            return b":%d\r\n" % len(self.subscribers[channel])
+        return b"-ERR unknown command '%s'\r\n" % name.lower()
+
+
+# ── The implementation this replaced, for comparison ───────────────────────
+
+class _LegacyRateLimiter:
+    """Per-IP list of (timestamp, endpoint), rebuilt on every check under one lock."""
+
+    def __init__(self, limits):
+        self.requests = defaultdict(list)
+        self.lock = asyncio.Lock()
+        self.limits = limits
+
+    async def hit(self, client_ip: str, endpoint: str):
+        max_requests, window_seconds = self.limits.get(endpoint, self.limits["default"])
+        async with self.lock:
+            now = datetime.now(timezone.utc)
+            cutoff = now - timedelta(seconds=window_seconds)
+            self.requests[client_ip] = [(ts, ep) for ts, ep in self.requests[client_ip] if ts > cutoff]
+            endpoint_requests = [ts for ts, ep in self.requests[client_ip] if ep == endpoint]
+            if len(endpoint_requests) >= max_requests:
+                return int((endpoint_requests[0] - cutoff).total_seconds())
+            self.requests[client_ip].append((now, endpoint))
+            return None
+
+
+# ── bench ──────────────────────────────────────────────────────────────────
+
+def _traffic(ips: int, checks: int):
+    rng = random.Random(42)
+    addresses = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ips)]
+    return [(rng.choice(addresses), rng.choice(ENDPOINTS)) for _ in range(checks)]
+
+
+async def _run(limiter, traffic, concurrency: int) -> float:
+    chunks = [traffic[i::concurrency] for i in range(concurrency)]
+
+    async def worker(chunk):
+        for ip, endpoint in chunk:
+            await limiter.hit(ip, endpoint)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(chunk) for chunk in chunks))
+    return time.perf_counter() - start
+
+
+def bench(ips: int, checks: int, concurrency: int, redis_url: str):
+    traffic = _traffic(ips, checks)
+    print(f"\n=== {checks} checks over {ips} IPs x {len(ENDPOINTS)} endpoints, {concurrency} concurrent ===")
+
+    async def measure(label, limiter, n=checks):
+        elapsed = await _run(limiter, traffic[:n], concurrency)
+        print(f"  {label:<38} {n / elapsed:>12,.0f} checks/s   ({elapsed * 1e6 / n:6.2f} µs/check)")
+
+    async def main():
+        base = RateLimiter()
+        await measure("legacy (list per IP, one lock)", _LegacyRateLimiter(base.limits))
+        await measure("memory (sliding counters, 64 shards)", RateLimiter())
+
+        server = None if redis_url else FakeRedisServer().start()
+        limiter = RateLimiter(redis_url or server.url)
+        # Round trips are far slower than in-process checks: a sample is enough
+        await measure("redis" + ("" if redis_url else " (local fake server)"), limiter, min(checks, 20000))
+        print(f"  redis fallbacks: {limiter.fallbacks}")
+        await limiter.close()
+        if server:
+            server.stop()
+
+    asyncio.run(main())
+    print()
+
+
+# ── verify ─────────────────────────────────────────────────────────────────
+
+def verify(redis_url: str):
+    failures = []
+
+    def check(label, ok):
+        print(f"  {'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    async def main():
+        login_limit = RateLimiter().limits["/api/login"][0]
+
+        memory = RateLimiter()
+        results = [await memory.hit("1.2.3.4", "/api/login") for _ in range(login_limit + 1)]
+        check(f"memory: {login_limit} logins allowed, the next rejected",
+              results[:-1] == [None] * login_limit and results[-1] is not None)
+        check(f"memory: Retry-After within the window ({results[-1]}s)", 1 <= (results[-1] or 0) <= 60)
+        check("memory: other IPs and endpoints unaffected",
+              await memory.hit("5.6.7.8", "/api/login") is None
+              and await memory.hit("1.2.3.4", "/patients/") is None)
+
+        server = None if redis_url else FakeRedisServer().start()
+        url = redis_url or server.url
+        ip = f"9.9.9.{random.randint(0, 255)}"
+        worker_a, worker_b = RateLimiter(url), RateLimiter(url)
+        allowed = 0
+        for i in range(login_limit * 2):
+            if await (worker_a if i % 2 else worker_b).hit(ip, "/api/login") is None:
+                allowed += 1
+        check(f"redis: two workers share one limit ({allowed}/{login_limit} allowed)", allowed == login_limit)
+        check("redis: no fallbacks while the store is up", worker_a.fallbacks == worker_b.fallbacks == 0)
+
+        if server:
+            server.stop()
+            result = await worker_a.hit("8.8.8.8", "/api/login")
+            check("redis down: request allowed via per-worker fallback", result is None and worker_a.fallbacks == 1)
+        await worker_a.close()
+        await worker_b.close()
+
+    asyncio.run(main())
+    if failures:
+        print(f"\nFAIL: {len(failures)} check(s)\n")
+        sys.exit(1)
+    print("\nOK\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bench_cmd = sub.add_parser("bench", help="checks per second: legacy vs memory vs redis backend")
+    bench_cmd.add_argument("--ips", type=int, default=10000)
+    bench_cmd.add_argument("--checks", type=int, default=200000)
+    bench_cmd.add_argument("--concurrency", type=int, default=64)
+    bench_cmd.add_argument("--redis-url", help="real Redis-protocol server instead of the local fake")
+
+    verify_cmd = sub.add_parser("verify", help="limits, shared counting across workers, fallback")
+    verify_cmd.add_argument("--redis-url", help="real Redis-protocol server instead of the local fake")
+
+    args = parser.parse_args()
+    if args.command == "bench":
+        bench(args.ips, args.checks, args.concurrency, args.redis_url)
+    elif args.command == "verify":
+        verify(args.redis_url)
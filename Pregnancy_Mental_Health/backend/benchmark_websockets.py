@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+WebSocket fan-out benchmark (app/utils/websocket_manager.py).
+
+fanout: the manager alone, with --sockets fake connections spread over
+    users and roles like a busy deployment. Times one event sent the old way
+    (a send loop over every socket) against publish() to one user's and to
+    one role's channel.
+
+slow: one channel where one socket is slow and one is dead. The old send
+    loop makes everyone wait for the slow one and stops at the dead one;
+    with per-socket queues the others get every event right away.
+
+prune: a share of the sockets never answer pings, like connections whose
+    client vanished without closing them. Shows the heartbeat evicting them
+    and what that saves on every publish, then the per-user connection cap.
+
+live: real uvicorn --workers on a seeded throwaway database
+    (benchmark_queries._seed) with --sockets real connections open, most
+    authenticated as other users; the kernel spreads them over the workers.
+    A nurse books --events appointments; each one notifies doctor #1
+    (NEW_APPOINTMENT), who has --doctor-sockets open. Measures POST-to-
+    delivery latency on the doctor's sockets, deliveries lost (not there
+    within 2 s) and what every other socket got. The workers share an event
+    bus (WS_BUS_URL) on FakeRedisServer from benchmark_rate_limiter.py, or
+    --redis-url, unless --no-bus. --app-dir runs the workers from another
+    checkout (e.g. a `git worktree` of an older commit) for before/after
+    numbers.
+
+Usage (from the backend directory):
+    python benchmark_websockets.py fanout [--sockets 5000] [--events 200]
+    python benchmark_websockets.py slow [--sockets 1000] [--events 20] [--slow-ms 200]
+    python benchmark_websockets.py prune [--sockets 5000] [--half-open 0.2] [--interval 0.2]
+    python benchmark_websockets.py live [--sockets 5000] [--events 50] [--app-dir /tmp/backend-before]
+    python benchmark_websockets.py live --workers 4 --doctor-sockets 8 [--no-bus | --redis-url redis://localhost:6379/15]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Tokens are signed here and verified by the worker: give both the same key
+os.environ.setdefault("JWT_SECRET_KEY", "load-test-secret")
+
+from app.utils.websocket_manager import PING, WebSocketManager, channels_for, role_channel, user_channel
+from load_test import BACKEND_DIR, _free_port, _start_worker, _summarise, _wait_ready
+
+# Share of connections per role in the fanout test
+ROLE_MIX = [("patient", 0.70), ("nurse", 0.20), ("doctor", 0.09), ("admin", 0.01)]
+
+
+# ── fanout ─────────────────────────────────────────────────────────────────
+
+class _FakeSocket:
+    def __init__(self, delay: float = 0.0, fail: bool = False, manager: WebSocketManager = None):
+        self.received = 0
+        self.delay = delay      # seconds per send: a slow client
+        self.fail = fail        # every send raises: a dead client
+        self.manager = manager  # set: answers pings like the frontend does
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.fail:
+            raise ConnectionResetError("client went away")
+        await asyncio.sleep(self.delay)  # a real send yields to the event loop at least
+        self.received += 1
+        if self.manager is not None and message == PING:
+            self.manager.touch(self)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class _FakePrincipal:
+    def __init__(self, id, role):
+        self.id, self.role, self.email = id, role, f"user{id}@example.com"
+
+
+async def _legacy_broadcast(sockets, message: str):
+    """The send loop this replaced: one socket after another, in the caller."""
+    for socket in sockets:
+        await socket.send_text(message)
+
+
+async def _delivered(manager: WebSocketManager, expected_sent: int, timeout: float = 60):
+    """Wait until the writer tasks have sent expected_sent messages in total."""
+    deadline = time.perf_counter() + timeout
+    while manager.sent < expected_sent and time.perf_counter() < deadline:
+        await asyncio.sleep(0)
+
+
+def fanout(sockets: int, events: int):
+    print(f"\n=== {sockets} sockets, {events} events per case (in-process, no network) ===")
+    print("  publish: time until publish() returns; delivered: until every subscriber got it")
+
+    async def main():
+        manager = WebSocketManager()
+        rng = random.Random(42)
+        roles = [role for role, share in ROLE_MIX for _ in range(round(share * sockets))]
+        principals = [_FakePrincipal(i, role) for i, role in enumerate(roles)]
+        fakes = []
+        for principal in principals:
+            fakes.append(_FakeSocket())
+            await manager.connect(fakes[-1], channels_for(principal))
+        payload = {"type": "NEW_APPOINTMENT", "appointment_id": 1, "message": "x" * 80}
+
+        samples = []
+        for _ in range(events):
+            start = time.perf_counter()
+            await _legacy_broadcast(fakes, json.dumps(payload))
+            samples.append((time.perf_counter() - start) * 1000)
+        _summarise("broadcast, old loop", samples)
+
+        async def measure(label, channel):
+            returned, delivered = [], []
+            for _ in range(events):
+                start = time.perf_counter()
+                reached = await manager.publish(channel(), payload)
+                returned.append((time.perf_counter() - start) * 1000)
+                await _delivered(manager, manager.sent + reached)
+                delivered.append((time.perf_counter() - start) * 1000)
+            _summarise(f"{label} publish", returned)
+            _summarise(f"{label} delivered", delivered)
+
+        doctors = [p for p in principals if p.role == "doctor"]
+        await measure("user:{id}", lambda: user_channel(rng.choice(doctors).id))
+        await measure(f"role:admin ({roles.count('admin')})", lambda: role_channel("admin"))
+        await measure(f"role:doctor ({len(doctors)})", lambda: role_channel("doctor"))
+        print(f"  channels: {manager.metrics()['channels']}")
+
+    asyncio.run(main())
+    print()
+
+
+def slow(sockets: int, events: int, slow_ms: float):
+    print(f"\n=== role:doctor with {sockets} sockets: one sends in {slow_ms:g} ms, one is dead; {events} events ===")
+
+    async def main():
+        manager = WebSocketManager()
+        fakes = [_FakeSocket() for _ in range(sockets)]
+        fakes[sockets // 3] = _FakeSocket(delay=slow_ms / 1000)
+        fakes[sockets // 2] = _FakeSocket(fail=True)
+        fast = [f for f in fakes if not f.delay and not f.fail]
+        payload = {"type": "NEW_APPOINTMENT", "message": "x" * 80}
+
+        # Old loop: the slow socket holds up everyone after it, the dead one aborts the rest
+        samples, failed = [], 0
+        for _ in range(events):
+            start = time.perf_counter()
+            try:
+                await _legacy_broadcast(fakes, json.dumps(payload))
+            except ConnectionError:
+                failed += 1
+            samples.append((time.perf_counter() - start) * 1000)
+        _summarise("old loop, per event", samples)
+        print(f"  {'':<28} {failed}/{events} events aborted; fast sockets got "
+              f"{sum(f.received for f in fast)}/{events * len(fast)} messages")
+
+        for f in fakes:
+            f.received = 0
+            await manager.connect(f, [role_channel("doctor")])
+        samples = []
+        for i in range(events):
+            start = time.perf_counter()
+            await manager.publish(role_channel("doctor"), payload)
+            while min(f.received for f in fast) <= i:
+                await asyncio.sleep(0)
+            samples.append((time.perf_counter() - start) * 1000)
+        _summarise("queues, to all fast sockets", samples)
+        await asyncio.sleep(slow_ms / 1000 * 2)
+        metrics = manager.metrics()
+        print(f"  {'':<28} fast sockets got {sum(f.received for f in fast)}/{events * len(fast)} messages; "
+              f"dropped connections {metrics['dropped_connections']}, queue depth max {metrics['queue_depth_max']}")
+
+    asyncio.run(main())
+    print()
+
+
+def prune(sockets: int, half_open: float, interval: float):
+    print(f"\n=== {sockets} sockets, {half_open:.0%} half-open (never answer pings); "
+          f"ping every {interval:g}s, idle timeout {interval * 2.5:g}s ===")
+
+    async def main():
+        manager = WebSocketManager(ping_interval=interval, idle_timeout=interval * 2.5, max_per_user=10)
+        rng = random.Random(42)
+        for i in range(sockets):
+            answers = rng.random() >= half_open
+            await manager.connect(_FakeSocket(manager=manager if answers else None),
+                                  [role_channel("nurse")], user_id=i)
+        live = sum(1 for c in manager._connections.values() if c.websocket.manager is not None)
+        payload = {"type": "NEW_APPOINTMENT", "message": "x" * 80}
+
+        async def publish_ms():
+            start = time.perf_counter()
+            reached = await manager.publish(role_channel("nurse"), payload)
+            await _delivered(manager, manager.sent + reached)
+            return (time.perf_counter() - start) * 1000
+
+        before = statistics.median([await publish_ms() for _ in range(20)])
+        print(f"  before: {len(manager._connections)} registered, publish to all delivered in {before:.2f} ms")
+        for websocket in list(manager._connections):
+            manager.touch(websocket)  # the idle clock starts now, not before the timing above
+        await manager.start()
+        await asyncio.sleep(interval * 4)
+        await manager.close()
+        after = statistics.median([await publish_ms() for _ in range(20)])
+        metrics = manager.metrics()
+        print(f"  after:  {metrics['connections']} registered ({live} answer pings), "
+              f"{metrics['idle_evictions']} evicted as idle, publish delivered in {after:.2f} ms")
+
+        accepted = [await manager.connect(_FakeSocket(), [], user_id=-1) for _ in range(12)]
+        print(f"  one user opening 12 sockets: {sum(accepted)} accepted, "
+              f"{metrics['rejected_connections'] + accepted.count(False)} refused")
+
+    asyncio.run(main())
+    print()
+
+
+# ── live ───────────────────────────────────────────────────────────────────
+
+async def _live(base_url: str, tokens: list, doctor_token: str, doctor_sockets: int,
+                nurse_token: str, events: int):
+    import httpx
+    import websockets
+
+    ws_url = base_url.replace("http", "ws", 1) + "/ws"
+    handshakes = asyncio.Semaphore(200)  # plenty for the workers to accept at once
+    total, opened, others_received = len(tokens) + doctor_sockets, 0, 0
+    all_open = asyncio.Event()
+    arrivals = [{} for _ in range(doctor_sockets)]  # per doctor socket: appointment id -> time
+
+    async def reader(token, doctor_socket=None):
+        nonlocal opened, others_received
+        url = f"{ws_url}?token={token}" if token else ws_url
+        async with handshakes:
+            ws = await websockets.connect(url, max_queue=None, open_timeout=120)
+        opened += 1
+        if opened == total:
+            all_open.set()
+        async with ws:
+            async for message in ws:
+                if message == PING:
+                    await ws.send(json.dumps({"type": "pong"}))
+                    continue
+                if doctor_socket is None:
+                    others_received += 1
+                    continue
+                data = json.loads(message)
+                if data.get("type") == "NEW_APPOINTMENT":
+                    arrivals[doctor_socket][data["appointment_id"]] = time.perf_counter()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await _wait_ready(client)
+
+        start = time.perf_counter()
+        readers = [asyncio.create_task(reader(doctor_token, i)) for i in range(doctor_sockets)]
+        readers += [asyncio.create_task(reader(token)) for token in tokens]
+        await asyncio.wait_for(all_open.wait(), 300)
+        print(f"  {total} sockets open in {time.perf_counter() - start:.1f}s")
+
+        headers = {"Authorization": f"Bearer {nurse_token}"}
+        latencies, missed, failures = [], 0, 0
+        for i in range(events):
+            body = {"patientid": 1, "doctorid": 1, "date": "2030-01-01", "time": f"{8 + i % 10:02d}:{i % 60:02d}"}
+            start = time.perf_counter()
+            response = await client.post("/nurse/appointments", json=body, headers=headers)
+            if response.status_code != 200:
+                failures += 1
+                continue
+            appointment_id = response.json()["appointment_id"]
+            deadline = time.perf_counter() + 2  # later than this counts as lost
+            while time.perf_counter() < deadline and not all(appointment_id in a for a in arrivals):
+                await asyncio.sleep(0.001)
+            for a in arrivals:
+                if appointment_id in a:
+                    latencies.append((a[appointment_id] - start) * 1000)
+                else:
+                    missed += 1
+        await asyncio.sleep(1)  # let slower sockets finish receiving
+
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+    return latencies, missed, others_received, failures
+
+
+def live(app_dir: str, sockets: int, events: int, workers: int, doctor_sockets: int,
+         redis_url: str, no_bus: bool):
+    from benchmark_queries import _seed
+    from benchmark_rate_limiter import FakeRedisServer
+    from index_advisor import _add_portal_data
+    from app.jwt_handler import create_access_token
+    from app.migrations import upgrade
+
+    seed_engine = _seed(300)
+    _add_portal_data(seed_engine)
+    upgrade(seed_engine)  # once, rather than racing in every worker
+    database_url = seed_engine.url.render_as_string(hide_password=False)
+    seed_engine.dispose()
+
+    # Everyone but doctor #1: the other doctor, nurses, admin, anonymous pages
+    emails = ["other@bench.local", "admin@bench.local", "patient@example.com", None] + \
+             [f"nurse{i}@bench.local" for i in range(5)]
+    tokens = [create_access_token({"sub": e}) if e else None for e in emails]
+    others = [tokens[i % len(tokens)] for i in range(sockets - doctor_sockets)]
+
+    server = None
+    # The simulated users each hold hundreds of sockets
+    env = {"WS_MAX_CONNECTIONS_PER_USER": str(sockets), "WS_MAX_CONNECTIONS": str(sockets)}
+    if not no_bus:
+        server = None if redis_url else FakeRedisServer().start()
+        env["WS_BUS_URL"] = redis_url or server.url
+    bus = "no bus" if no_bus else "redis bus" + ("" if redis_url else " (local fake server)")
+
+    port = _free_port()
+    worker = _start_worker(os.path.abspath(app_dir), database_url, port, workers, env)
+    print(f"\n=== {app_dir}: {workers} worker(s), {bus}, {sockets} sockets ({doctor_sockets} of them doctor #1), "
+          f"{events} appointments ===")
+    try:
+        latencies, missed, others_received, failures = asyncio.run(_live(
+            f"http://127.0.0.1:{port}", others,
+            create_access_token({"sub": "doctor@bench.local"}), doctor_sockets,
+            create_access_token({"sub": "nurse0@bench.local"}),
+            events,
+        ))
+    finally:
+        worker.terminate()
+        worker.wait()
+        if server:
+            server.stop()
+
+    if latencies:
+        _summarise("POST to doctor's sockets", latencies)
+    expected = (events - failures) * doctor_sockets
+    print(f"  delivered to doctor's sockets: {expected - missed}/{expected} ({failures} requests failed)")
+    print(f"  messages on the other {sockets - doctor_sockets} sockets: {others_received}")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fanout_cmd = sub.add_parser("fanout", help="manager only: broadcast vs publish per event")
+    fanout_cmd.add_argument("--sockets", type=int, default=5000)
+    fanout_cmd.add_argument("--events", type=int, default=200)
+
+    slow_cmd = sub.add_parser("slow", help="manager only: one slow and one dead socket among fast ones")
+    slow_cmd.add_argument("--sockets", type=int, default=1000)
+    slow_cmd.add_argument("--events", type=int, default=20)
+    slow_cmd.add_argument("--slow-ms", type=float, default=200)
+
+    prune_cmd = sub.add_parser("prune", help="manager only: heartbeats evict half-open sockets; per-user cap")
+    prune_cmd.add_argument("--sockets", type=int, default=5000)
+    prune_cmd.add_argument("--half-open", type=float, default=0.2, help="share of sockets that never answer")
+    prune_cmd.add_argument("--interval", type=float, default=0.2, help="ping interval (seconds) for the test")
+
+    live_cmd = sub.add_parser("live", help="real worker and sockets: event delivery latency")
+    live_cmd.add_argument("--app-dir", default=BACKEND_DIR, help="backend checkout to run the worker from")
+    live_cmd.add_argument("--sockets", type=int, default=5000)
+    live_cmd.add_argument("--events", type=int, default=50)
+    live_cmd.add_argument("--workers", type=int, default=1)
+    live_cmd.add_argument("--doctor-sockets", type=int, default=1, help="tabs/devices of the notified doctor")
+    live_cmd.add_argument("--redis-url", help="real Redis-protocol server for the event bus instead of the local fake")
+    live_cmd.add_argument("--no-bus", action="store_true", help="run the workers without WS_BUS_URL")
+
+    args = parser.parse_args()
+    if args.command == "fanout":
+        fanout(args.sockets, args.events)
+    elif args.command == "slow":
+        slow(args.sockets, args.events, args.slow_ms)
+    elif args.command == "prune":
+        prune(args.sockets, args.half_open, args.interval)
+    elif args.command == "live":
+        live(args.app_dir, args.sockets, args.events, args.workers, args.doctor_sockets,
+             args.redis_url, args.no_bus)
@@ -62,6 +62,8 @@ def cleanup_orphaned_records():
         
         if orphaned_assessments + orphaned_followups + orphaned_appointments == 0:
             print("   - No orphaned records found - database is clean!")
+        elif orphaned_assessments:
+            print("   - Run rebuild_clinician_stats.py to refresh the dashboard counters")
             
     except Exception as e:
         print(f"❌ Error during cleanup: {e}")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Index advisor: EXPLAIN a recorded set of the app's queries and flag every
+sequential scan of a table with more than --min-rows rows.
+
+Queries come from the app itself. Either run a staging server with
+QUERY_LOG_PATH=/tmp/queries.jsonl and use the UI for a while, or let
+`record` seed a throwaway database (see benchmark_queries.py) and call
+every GET endpoint as a doctor, a nurse, an admin and a patient.
+
+`check` replays each recorded SELECT/UPDATE/DELETE through EXPLAIN on the
+target database (EXPLAIN (FORMAT JSON) on Postgres, EXPLAIN QUERY PLAN on
+SQLite — nothing is executed) and exits 1 if anything was flagged.
+
+Usage (from the backend directory):
+    python index_advisor.py record /tmp/queries.jsonl [--assessments 5000]
+    python index_advisor.py check /tmp/queries.jsonl [--database-url URL] [--min-rows 1000]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from string import Formatter
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+# Which user calls which router
+ROLE_PREFIXES = [
+    ("/doctor", "doctor"),
+    ("/nurse", "nurse"),
+    ("/admin", "admin"),
+    ("/recovery", "admin"),
+    ("/patient/", "patient"),
+]
+
+
+# ── record ─────────────────────────────────────────────────────────────────
+
+def _bench_url() -> str:
+    return os.getenv("BENCH_DATABASE_URL") or "sqlite:///" + os.path.join(tempfile.gettempdir(), "ppd_bench.db")
+
+
+def _add_portal_data(engine):
+    """Users and rows the benchmark seed doesn't create: an admin, a portal patient, follow-ups."""
+    from sqlalchemy import insert, select, update
+    from app.models import User, Patient, Assessment, FollowUp
+
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": 3, "first_name": "Ada", "last_name": "Admin", "email": "admin@bench.local",
+             "role": "admin", "hashed_password": "x"},
+            {"id": 20, "first_name": "Pia", "last_name": "Patient", "email": "patient@example.com",
+             "role": "patient", "hashed_password": "x"},
+        ])
+        conn.execute(update(User).values(first_login=False))
+        conn.execute(
+            update(Patient).where(Patient.id == 1)
+            .values(user_id=20, email="patient@example.com", clinician_email="doctor@bench.local")
+        )
+        conn.execute(
+            update(Assessment).where(Assessment.patient_id == 1)
+            .values(patient_email="patient@example.com")
+        )
+        patient_ids = conn.execute(select(Patient.id)).scalars().all()
+        conn.execute(insert(FollowUp), [
+            {
+                "patient_id": pid,
+                "patient_email": "patient@example.com" if pid == 1 else None,
+                "scheduled_date": now + timedelta(days=(pid * 7) % 60 - 30),
+                "status": ("pending", "completed", "missed")[pid % 3],
+                "clinician_email": "doctor@bench.local",
+            }
+            for pid in patient_ids
+        ])
+
+
+def record(path: str, assessments: int):
+    # The app must open the seeded database, so point it there before importing it
+    os.environ["DATABASE_URL"] = _bench_url()
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select
+
+    from benchmark_queries import _seed
+    from app.database import async_engine as app_async_engine, engine as app_engine
+    from app.jwt_handler import create_access_token
+    from app.main import app
+    from app.models import Assessment
+    from app.utils.query_log import QueryRecorder
+
+    print(f"\nSeeding {_bench_url()} with {assessments} assessments per doctor...")
+    _add_portal_data(_seed(assessments))
+
+    with app_engine.connect() as conn:
+        assessment_id = conn.execute(
+            select(Assessment.id).where(Assessment.assigned_doctor_id == 1).limit(1)
+        ).scalar()
+    path_values = {"assessment_id": assessment_id, "patient_id": 1, "patient_email": "patient@example.com"}
+    tokens = {
+        role: create_access_token({"sub": email})
+        for role, email in (("doctor", "doctor@bench.local"), ("nurse", "nurse0@bench.local"),
+                            ("admin", "admin@bench.local"), ("patient", "patient@example.com"))
+    }
+
+    if os.path.exists(path):
+        os.unlink(path)
+    recorder = QueryRecorder(path)
+    recorder.install(app_engine)
+    recorder.install(app_async_engine.sync_engine)
+
+    client = TestClient(app, raise_server_exceptions=False)  # no context manager: skip startup
+    statuses = defaultdict(int)
+    for route, operations in app.openapi()["paths"].items():
+        params = {field for _, field, _, _ in Formatter().parse(route) if field}
+        if "get" not in operations or params - path_values.keys():
+            continue
+        roles = [role for prefix, role in ROLE_PREFIXES if route.startswith(prefix)] or ["doctor", "nurse"]
+        url = route.format(**path_values)
+        for role in roles:
+            response = client.get(url, headers={"Authorization": f"Bearer {tokens[role]}"})
+            statuses[response.status_code] += 1
+            if response.status_code >= 500:
+                print(f"  {response.status_code} GET {url} as {role}")
+
+    recorder.remove(app_engine)
+    recorder.remove(app_async_engine.sync_engine)
+    recorded = sum(1 for _ in open(path))
+    print(f"Called {sum(statuses.values())} endpoints (status codes: {dict(statuses)})")
+    print(f"Recorded {recorded} distinct statements to {path}\n")
+
+
+# ── check ──────────────────────────────────────────────────────────────────
+
+def _table_sizes(conn) -> dict:
+    from sqlalchemy import inspect, text
+    return {
+        name: conn.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+        for name in inspect(conn).get_table_names()
+    }
+
+
+def _postgres_scans(conn, statement, parameters):
+    """(table, plan line) for each Seq Scan node in the plan."""
+    if isinstance(parameters, list):
+        # Recorded from the asyncpg engine: $1, $2… placeholders, in order
+        statement = re.sub(r"\$\d+", "%s", statement.replace("%", "%%"))
+        parameters = tuple(parameters)
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters or {}).scalar()
+    if isinstance(plan, str):
+        import json
+        plan = json.loads(plan)
+    scans = []
+    stack = [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        if node["Node Type"] == "Seq Scan":
+            line = f"Seq Scan on {node['Relation Name']}"
+            if node.get("Filter"):
+                line += f"  Filter: {node['Filter']}"
+            scans.append((node["Relation Name"], line))
+        stack.extend(node.get("Plans", []))
+    return scans
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+_SQLITE_AUTOINDEX = re.compile(r"^SEARCH (\w+) USING AUTOMATIC")
+
+
+def _sqlite_scans(conn, statement, parameters):
+    """
+    (table, plan line) for full table scans, and for automatic indexes —
+    SQLite building a throwaway index on every execution because no real
+    one matches the join.
+    """
+    aliases = {alias: table for table, alias in re.findall(r"\b(\w+) AS (\w+)\b", statement)}
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, tuple(parameters or ())).all()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        match = _SQLITE_SCAN.match(detail) or _SQLITE_AUTOINDEX.match(detail)
+        if match:
+            name = match.group(1)
+            scans.append((aliases.get(name, name), detail))
+    return scans
+
+
+_SELECT_LIST = re.compile(r"SELECT\s(?:(?!SELECT).)*?\bFROM\b", re.DOTALL)
+
+
+def _shorten(statement: str) -> str:
+    """Drop the column lists so the report shows what the query filters and sorts on."""
+    return " ".join(_SELECT_LIST.sub("SELECT … FROM", statement).split())
+
+
+def check(path: str, database_url: str, min_rows: int) -> int:
+    from sqlalchemy import create_engine
+    from app.utils.query_log import read_queries
+
+    engine = create_engine(database_url)
+    queries = [
+        q for q in read_queries(path)
+        if q["statement"].lstrip().split(None, 1)[0].upper() in EXPLAINABLE
+    ]
+    explain = _postgres_scans if engine.dialect.name == "postgresql" else _sqlite_scans
+
+    flagged = []
+    failed = 0
+    with engine.connect() as conn:
+        sizes = _table_sizes(conn)
+        for q in queries:
+            try:
+                scans = explain(conn, q["statement"], q["parameters"])
+            except Exception as e:
+                failed += 1
+                print(f"  could not EXPLAIN: {e.__class__.__name__}: {str(e).splitlines()[0]}")
+                conn.rollback()
+                continue
+            for table, line in scans:
+                if sizes.get(table, 0) > min_rows:
+                    flagged.append((table, line, q["statement"]))
+
+    print(f"\n=== {len(queries)} statements explained on {engine.dialect.name}"
+          f" ({failed} failed), tables over {min_rows} rows: "
+          f"{', '.join(f'{t}={n}' for t, n in sorted(sizes.items()) if n > min_rows) or 'none'} ===\n")
+    for table, line, statement in flagged:
+        print(f"  [{table}, {sizes[table]} rows] {line}")
+        print(f"      {_shorten(statement)[:400]}\n")
+    if flagged:
+        print(f"FAIL: {len(flagged)} sequential scan(s) on large tables\n")
+        return 1
+    print("OK: no sequential scans on large tables\n")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record_cmd = sub.add_parser("record", help="seed a throwaway database and record the queries every GET endpoint runs")
+    record_cmd.add_argument("path")
+    record_cmd.add_argument("--assessments", type=int, default=5000)
+
+    check_cmd = sub.add_parser("check", help="EXPLAIN recorded queries; exits 1 on sequential scans of large tables")
+    check_cmd.add_argument("path")
+    check_cmd.add_argument("--database-url", default=None, help="defaults to BENCH_DATABASE_URL, then the seeded SQLite file")
+    check_cmd.add_argument("--min-rows", type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.path, args.assessments)
+    elif args.command == "check":
+        sys.exit(check(args.path, args.database_url or _bench_url(), args.min_rows))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test against one uvicorn worker.
+
+Seeds a throwaway database (benchmark_queries._seed), starts a single
+`uvicorn app.main:app` worker on it and keeps --concurrency clients busy
+calling the async doctor endpoints (/doctor/dashboard, /doctor/stats)
+until --requests have completed. Meanwhile one client polls /health,
+which does no I/O: its latency shows how long requests wait for the event
+loop, i.e. how much the handlers block it.
+
+--app-dir runs the worker from another checkout of this backend (e.g. a
+`git worktree` of an older commit) so before/after numbers come from the
+same seeded database and client.
+
+Usage (from the backend directory):
+    python load_test.py [--assessments 5000] [--requests 2000] [--concurrency 32]
+    python load_test.py --app-dir /tmp/backend-before   # same test against another checkout
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Tokens are signed here and verified by the worker: give both the same key
+os.environ.setdefault("JWT_SECRET_KEY", "load-test-secret")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ["/doctor/dashboard", "/doctor/stats"]
+
+
+def _summarise(label: str, samples_ms: list):
+    samples_ms = sorted(samples_ms)
+    p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+    print(
+        f"  {label:<28} mean={statistics.mean(samples_ms):8.2f} ms   "
+        f"p50={statistics.median(samples_ms):8.2f} ms   p95={p95:8.2f} ms"
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_worker(app_dir: str, database_url: str, port: int, workers: int = 1, env: dict = None) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=database_url, MIGRATE_ON_STARTUP="true", **(env or {}))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", app_dir,
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def _wait_ready(client, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("worker did not start")
+
+
+async def _load(base_url: str, token: str, requests: int, concurrency: int):
+    import httpx
+
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies, health_latencies, errors = [], [], 0
+    remaining = requests
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency + 1)) as client:
+        await _wait_ready(client)
+        for endpoint in ENDPOINTS:  # warm up
+            await client.get(endpoint, headers=headers)
+
+        async def caller(i: int):
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(ENDPOINTS[(remaining + i) % len(ENDPOINTS)], headers=headers)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False  # e.g. the worker dropped the connection
+                latencies.append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    errors += 1
+
+        async def health_probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                try:
+                    await client.get("/health")
+                except httpx.HTTPError:
+                    pass
+                health_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.02)
+
+        probe = asyncio.create_task(health_probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(caller(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+
+    return elapsed, latencies, health_latencies, errors
+
+
+def run(app_dir: str, assessments: int, requests: int, concurrency: int):
+    from benchmark_queries import _seed
+    from index_advisor import _add_portal_data
+
+    print(f"\nSeeding with {assessments} assessments per doctor...")
+    seed_engine = _seed(assessments)
+    _add_portal_data(seed_engine)
+    database_url = seed_engine.url.render_as_string(hide_password=False)
+    seed_engine.dispose()
+
+    from app.jwt_handler import create_access_token
+    token = create_access_token({"sub": "doctor@bench.local"})
+
+    port = _free_port()
+    worker = _start_worker(os.path.abspath(app_dir), database_url, port)
+    try:
+        elapsed, latencies, health, errors = asyncio.run(
+            _load(f"http://127.0.0.1:{port}", token, requests, concurrency)
+        )
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    print(f"\n=== {app_dir}: {requests} requests, {concurrency} concurrent, 1 worker ===")
+    print(f"  throughput                   {requests / elapsed:8.1f} req/s   ({errors} failed or non-200)")
+    _summarise("doctor endpoints", latencies)
+    _summarise("/health while loaded", health)
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=BACKEND_DIR, help="backend checkout to run the worker from")
+    parser.add_argument("--assessments", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    run(args.app_dir, args.assessments, args.requests, args.concurrency)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Measure API cold start: importing app.main plus the lifespan startup that
+runs before a worker accepts requests.
+
+Each run is a fresh interpreter (what a new uvicorn worker pays). Point
+DATABASE_URL at the database to measure against and run `python migrate.py`
+on it first, as a deploy would.
+
+Usage (from the backend directory):
+    python measure_startup.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORKER_CODE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+from app.main import app
+t1 = time.perf_counter()
+
+async def start():
+    async with app.router.lifespan_context(app):
+        t2 = time.perf_counter()
+    return t2
+
+t2 = asyncio.run(start())
+print("RESULT " + json.dumps({"import": (t1 - t0) * 1000, "startup": (t2 - t1) * 1000}), flush=True)
+"""
+
+
+def _run_once(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", WORKER_CODE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    for line in out.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise SystemExit(f"startup failed (exit code {out.returncode}):\n{out.stderr[-2000:]}")
+
+
+def measure(runs: int):
+    env = dict(os.environ)
+    env.pop("INFERENCE_SOCKET", None)
+    if not env.get("DATABASE_URL"):
+        raise SystemExit("set DATABASE_URL to the database to start against")
+
+    _run_once(env)  # first run warms the OS file cache
+    samples = [_run_once(env) for _ in range(runs)]
+    print(f"\n=== Cold start over {runs} runs ===\n")
+    for key in ("import", "startup"):
+        values = [s[key] for s in samples]
+        print(f"  {key:<8} median={statistics.median(values):8.1f} ms   max={max(values):8.1f} ms")
+    totals = [s["import"] + s["startup"] for s in samples]
+    print(f"  {'total':<8} median={statistics.median(totals):8.1f} ms   max={max(totals):8.1f} ms\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    measure(args.runs)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Measure per-worker memory with the model loaded in every worker vs served
+by the inference sidecar.
+
+Starts N worker-like processes that import app.main, score one assessment
+and compute its SHAP factors (what a warmed-up uvicorn worker holds). Reads
+RSS and PSS from /proc/<pid>/smaps_rollup. PSS splits shared pages between
+the processes that map them, so the PSS total is what the instance pays.
+
+Usage (from the backend directory, Linux only):
+    python measure_worker_memory.py [--workers 4]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORKER_CODE = """
+import sys
+from types import SimpleNamespace
+import app.main
+from benchmark_ml import SAMPLE_FORM
+from app.ml_model import encode_form, get_feature_columns, get_top_features
+from app.services.scoring_service import score_assessment
+form = SimpleNamespace(**SAMPLE_FORM)
+score_assessment(form)
+get_top_features(encode_form(form), get_feature_columns())
+print("READY", flush=True)
+sys.stdin.read()
+"""
+
+
+def _memory_kb(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+
+def _start_workers(n: int, env: dict) -> list:
+    procs = []
+    for _ in range(n):
+        procs.append(subprocess.Popen(
+            [sys.executable, "-c", WORKER_CODE],
+            cwd=BACKEND_DIR, env=env, text=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        ))
+    for p in procs:
+        # The app prints config banners to stdout; wait for our marker
+        for line in p.stdout:
+            if line.strip() == "READY":
+                break
+        else:
+            raise SystemExit(f"worker {p.pid} failed to start (exit code {p.wait()})")
+    return procs
+
+
+def _stop(procs: list):
+    for p in procs:
+        if p.stdin:
+            p.stdin.close()
+        p.terminate()
+        p.wait()
+
+
+def _report(label: str, workers: list, sidecar=None):
+    rows = [_memory_kb(p.pid) for p in workers]
+    avg_rss = sum(r["rss"] for r in rows) / len(rows) / 1024
+    avg_pss = sum(r["pss"] for r in rows) / len(rows) / 1024
+    total_pss = sum(r["pss"] for r in rows) / 1024
+    line = f"  {label:<22} per-worker RSS={avg_rss:7.1f} MB   PSS={avg_pss:7.1f} MB"
+    if sidecar is not None:
+        side = _memory_kb(sidecar.pid)
+        total_pss += side["pss"] / 1024
+        line += f"   sidecar RSS={side['rss'] / 1024:7.1f} MB"
+    print(line)
+    print(f"  {'':<22} total PSS ({len(workers)} workers{' + sidecar' if sidecar else ''}) = {total_pss:7.1f} MB")
+    return total_pss
+
+
+def measure(workers: int):
+    env = dict(os.environ)
+    env.pop("INFERENCE_SOCKET", None)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "ppd_memory.db"))
+
+    print(f"\n=== Memory with {workers} warmed-up workers ===\n")
+
+    # Before: every worker loads CatBoost + explainer itself
+    procs = _start_workers(workers, env)
+    local_total = _report("model per worker", procs)
+    _stop(procs)
+
+    # After: one sidecar holds the model, workers talk to it over a Unix socket
+    socket_path = os.path.join(tempfile.gettempdir(), f"ppd-inference-{os.getpid()}.sock")
+    sidecar = subprocess.Popen(
+        [sys.executable, "-m", "app.services.inference_sidecar", "--socket", socket_path],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while not os.path.exists(socket_path):
+        if sidecar.poll() is not None or time.time() > deadline:
+            raise SystemExit("inference sidecar failed to start")
+        time.sleep(0.1)
+
+    env["INFERENCE_SOCKET"] = socket_path
+    procs = _start_workers(workers, env)
+    sidecar_total = _report("inference sidecar", procs, sidecar)
+    _stop(procs)
+    _stop([sidecar])
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    saved = local_total - sidecar_total
+    print(f"\n  saved {saved:.1f} MB total ({saved / local_total * 100:.0f}%)\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    measure(args.workers)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Apply pending schema migrations (app/migrations.py) to DATABASE_URL.
+
+Run once per deploy, before the new workers start. On Render it is the
+backend's preDeployCommand in render.yaml (Render ignores the Procfile);
+the Procfile's release entry is for Procfile-based hosts (Heroku, Dokku).
+Workers only check the recorded version at startup and refuse to serve an
+older schema.
+Safe to re-run; concurrent runs on Postgres wait for each other.
+
+Usage (from the backend directory):
+    python migrate.py                          # apply pending migrations
+    python migrate.py --status                 # show applied/pending, change nothing
+    python migrate.py --reset-admin-password   # also restore admin@ppd.com's default password
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine
+from app.migrations import LATEST_VERSION, MIGRATIONS, current_version, seed_admin, upgrade
+
+
+def status():
+    version = current_version(engine)
+    print(f"Schema version {version} (this release: {LATEST_VERSION})")
+    for m in MIGRATIONS:
+        print(f"  {'✅' if m.version <= version else '⏳'} {m.version:>3}  {m.description}")
+
+
+def migrate(reset_admin_password: bool):
+    start = time.perf_counter()
+    try:
+        applied = upgrade(engine)
+        if reset_admin_password:
+            with engine.begin() as conn:
+                seed_admin(conn, reset=True)
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+    if applied:
+        print(f"✅ Applied migrations {applied} in {time.perf_counter() - start:.2f}s; schema at version {LATEST_VERSION}")
+    else:
+        print(f"✅ Schema already at version {LATEST_VERSION}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true")
+    parser.add_argument("--reset-admin-password", action="store_true")
+    args = parser.parse_args()
+    if args.status:
+        status()
+    else:
+        migrate(args.reset_admin_password)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Import-time profile for the API process.
+
+Runs `python -X importtime` in fresh interpreters and reports how long each
+dependency takes to import (including whatever it pulls in itself):
+  1. `import app.main`         — what every uvicorn worker pays before /health
+  2. `ml_model.load_model()`   — the deferred model subsystem (catboost, pandas, ...)
+
+Usage (from the backend directory):
+    python profile_imports.py [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dependencies worth calling out even when they're not in the top N
+HEAVY = ["catboost", "pandas", "numpy", "joblib", "shap", "sqlalchemy",
+         "fastapi", "pydantic", "reportlab", "passlib", "jose", "redis"]
+
+
+def _run_importtime(code: str):
+    """Return ({top-level module: cumulative µs}, wall seconds) for one interpreter."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")][-5:]
+        print("\n".join(tail))
+        sys.exit(proc.returncode)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative = int(cumulative)
+        except ValueError:
+            continue  # header row
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((depth, name.strip().split(".")[0], cumulative))
+
+    # importtime prints children before their parent, so walk it backwards
+    # with a stack. A module is charged to its package only when it was
+    # imported from a different package, so e.g. pandas.core.* isn't counted
+    # again under pandas, but numpy pulled in by pandas shows up as numpy.
+    totals = {}
+    stack = []
+    for depth, package, cumulative in reversed(rows):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        parent = stack[-1][1] if stack else None
+        if package != parent and package != "app":
+            totals[package] = totals.get(package, 0) + cumulative
+        stack.append((depth, package))
+    return totals, wall
+
+
+def _report(title: str, totals: dict, wall: float, top: int):
+    print(f"\n=== {title} (wall {wall:.2f}s incl. interpreter start) ===\n")
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+    shown = set()
+    for package, us in ranked[:top]:
+        print(f"  {package:<24} {us / 1000:9.1f} ms")
+        shown.add(package)
+    extra = [(p, totals[p]) for p in HEAVY if p in totals and p not in shown]
+    for package, us in extra:
+        print(f"  {package:<24} {us / 1000:9.1f} ms")
+    absent = [p for p in HEAVY if p not in totals]
+    if absent:
+        print(f"\n  not imported: {', '.join(absent)}")
+
+
+def profile_imports(top: int):
+    env_note = "" if os.getenv("DATABASE_URL") else " (set DATABASE_URL if app.database needs it)"
+    print(f"Profiling with {sys.executable}{env_note}")
+
+    totals, wall = _run_importtime("import app.main")
+    _report("import app.main", totals, wall, top)
+
+    totals, wall = _run_importtime(
+        "import app.ml_model as m; m.load_model(); m.get_explainer()"
+    )
+    _report("ml_model.load_model() + explainer", totals, wall, top)
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    profile_imports(args.top)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Recompute the notification_counters unread rollup from notifications.
+
+The table is kept up to date on every ORM write; run this after changes
+made outside the API (raw SQL, cleanup_orphaned_records.py, restoring a
+backup) or whenever an unread badge looks off.
+
+Usage (from the backend directory):
+    python rebuild_notification_counters.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal, engine
+from app.models import NotificationCounter
+from app.services.notification_counters import rebuild
+
+
+def rebuild_notification_counters():
+    NotificationCounter.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        rows = rebuild(db)
+        print(f"✅ notification_counters rebuilt: {rows} recipients in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rebuild failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_notification_counters()
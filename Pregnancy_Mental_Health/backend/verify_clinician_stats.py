@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Verify that the incrementally maintained clinician_stats rollup
+(app/services/clinician_stats.py) always equals a full rebuild().
+
+Runs a random sequence of the writes the API makes against a throwaway
+SQLite database: patient and assessment inserts, reviews, reassignments
+and risk edits on expired instances, ORM, bulk and cascading deletes,
+bulk updates by WHERE and by primary key (including ones that don't
+touch counted columns) and the admin delete_user route. After every step
+the table is compared with a rebuild from scratch.
+
+Usage (from the backend directory):
+    python verify_clinician_stats.py [--steps 400] [--seed 1]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Always a scratch database: the check rebuilds tables and deletes users
+_DB_PATH = os.path.join(tempfile.gettempdir(), "ppd_verify_stats.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + _DB_PATH
+
+from sqlalchemy import event, select, update
+
+from app import models
+from app.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+from app.routers.admin import delete_user
+from app.services.clinician_stats import COUNTERS, rebuild
+
+RISK_LEVELS = ["High Risk", "Moderate Risk", "Low Risk", "High", "Medium", "Low"]
+STATUSES = ["draft", "submitted", "pending", "reviewed", "approved", "complete"]
+
+
+def _foreign_keys_on(dbapi_connection, _):
+    # SQLite ignores ON DELETE CASCADE without this; PostgreSQL always enforces it
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+class Scenario:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.now = datetime.now(timezone.utc)
+        self.next_user = 0
+
+    def _user(self, db, role: str) -> models.User:
+        self.next_user += 1
+        user = models.User(
+            first_name=f"{role.title()}{self.next_user}",
+            email=f"{role}{self.next_user}@verify.local",
+            hashed_password="x",
+            role=role,
+        )
+        db.add(user)
+        db.flush()
+        return user
+
+    def _ids(self, db, column, *criteria):
+        return db.scalars(select(column).where(*criteria)).all()
+
+    def _clinician(self, db, role: str, allow_none: bool = True):
+        ids = self._ids(db, models.User.id, models.User.role == role)
+        if allow_none and self.rng.random() < 0.15:
+            return None
+        return self.rng.choice(ids) if ids else None
+
+    def _when(self):
+        return self.now - timedelta(days=self.rng.randint(0, 20), minutes=self.rng.randint(0, 1440))
+
+    def seed(self, db):
+        self._user(db, "admin")
+        for _ in range(3):
+            self._user(db, "doctor")
+        for _ in range(4):
+            self._user(db, "nurse")
+        db.commit()
+
+    # ── Steps: each makes one kind of write and commits ───────────────────
+
+    def add_patient(self, db):
+        portal_user = self._user(db, "patient")
+        db.add(models.Patient(
+            id=portal_user.id,  # BigInteger keys don't autoincrement on SQLite
+            name=f"Patient {portal_user.id}",
+            user_id=portal_user.id,
+            created_by_nurse_id=self._clinician(db, "nurse"),
+            assigned_doctor_id=self._clinician(db, "doctor"),
+            created_at=self._when(),
+        ))
+        db.commit()
+
+    def add_assessment(self, db):
+        patient_ids = self._ids(db, models.Patient.id)
+        status = self.rng.choice(STATUSES)
+        created_at = self._when()
+        reviewed = status in ("reviewed", "approved") and self.rng.random() < 0.8
+        db.add(models.Assessment(
+            patient_name="Patient",
+            patient_id=self.rng.choice(patient_ids) if patient_ids else None,
+            raw_data={},
+            risk_score=round(self.rng.uniform(0, 100), 2),
+            risk_level=self.rng.choice(RISK_LEVELS),
+            status=status,
+            nurse_id=self._clinician(db, "nurse"),
+            assigned_doctor_id=self._clinician(db, "doctor"),
+            created_at=created_at,
+            reviewed_at=created_at + timedelta(hours=self.rng.randint(1, 72)) if reviewed else None,
+        ))
+        db.commit()
+
+    def _assessment(self, db):
+        ids = self._ids(db, models.Assessment.id)
+        if not ids:
+            return None
+        assessment = db.get(models.Assessment, self.rng.choice(ids))
+        db.expire(assessment)  # assignments must load the old value themselves
+        return assessment
+
+    def review(self, db):
+        assessment = self._assessment(db)
+        if assessment:
+            assessment.status = self.rng.choice(["reviewed", "approved"])
+            assessment.reviewed_at = self.now - timedelta(days=self.rng.randint(0, 3))
+            db.commit()
+
+    def reassign(self, db):
+        assessment = self._assessment(db)
+        if assessment:
+            assessment.assigned_doctor_id = self._clinician(db, "doctor")
+            assessment.nurse_id = self._clinician(db, "nurse")
+            db.commit()
+
+    def edit_risk(self, db):
+        assessment = self._assessment(db)
+        if assessment:
+            assessment.risk_level = self.rng.choice(RISK_LEVELS)
+            assessment.risk_score = round(self.rng.uniform(0, 100), 2)
+            db.commit()
+
+    def delete_assessment(self, db):
+        assessment = self._assessment(db)
+        if assessment:
+            db.delete(assessment)
+            db.commit()
+
+    def bulk_delete_assessments(self, db):
+        patient_ids = self._ids(db, models.Patient.id)
+        if patient_ids:
+            db.query(models.Assessment).filter(
+                models.Assessment.patient_id == self.rng.choice(patient_ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+
+    def delete_patient(self, db):
+        patient_ids = self._ids(db, models.Patient.id)
+        if patient_ids:
+            db.delete(db.get(models.Patient, self.rng.choice(patient_ids)))
+            db.commit()
+
+    def bulk_reassign(self, db):
+        old, new = self._clinician(db, "doctor", False), self._clinician(db, "doctor")
+        if old is None:
+            return
+        if self.rng.random() < 0.5:
+            db.query(models.Assessment).filter(
+                models.Assessment.assigned_doctor_id == old
+            ).update({models.Assessment.assigned_doctor_id: new}, synchronize_session=False)
+        else:
+            db.query(models.Patient).filter(
+                models.Patient.assigned_doctor_id == old
+            ).update({"assigned_doctor_id": new}, synchronize_session=False)
+        db.commit()
+
+    def bulk_reassign_by_id(self, db):
+        # ORM bulk UPDATE by primary key: no WHERE clause and no statement values
+        ids = self._ids(db, models.Assessment.id)
+        if ids:
+            rows = [
+                {"id": assessment_id, "assigned_doctor_id": self._clinician(db, "doctor"), "status": self.rng.choice(STATUSES)}
+                for assessment_id in self.rng.sample(ids, min(len(ids), 5))
+            ]
+            db.execute(update(models.Assessment), rows)
+            db.commit()
+
+    def bulk_update_uncounted(self, db):
+        db.query(models.Assessment).filter(
+            models.Assessment.top_risk_factors.is_(None)
+        ).update({models.Assessment.top_risk_factors: []}, synchronize_session=False)
+        db.commit()
+
+    def delete_clinician(self, db):
+        role = self.rng.choice(["doctor", "nurse", "patient"])
+        user_id = self._clinician(db, role, False)
+        if user_id is None:
+            return
+        admin = db.scalar(select(models.User).where(models.User.role == "admin"))
+        admin = SimpleNamespace(id=admin.id, first_name=admin.first_name, last_name=admin.last_name)
+        db.close()
+
+        async def run():
+            async with AsyncSessionLocal() as async_db:
+                await delete_user(user_id, async_db, admin)
+        asyncio.run(run())
+        if role != "patient":
+            self._user(db, role)  # keep someone to assign work to
+            db.commit()
+
+    STEPS = [
+        (add_patient, 4), (add_assessment, 10), (review, 3), (reassign, 3),
+        (edit_risk, 2), (delete_assessment, 2), (bulk_delete_assessments, 1),
+        (delete_patient, 1), (bulk_reassign, 2), (bulk_reassign_by_id, 1), (bulk_update_uncounted, 1),
+        (delete_clinician, 1),
+    ]
+
+
+def _snapshot(db) -> dict:
+    """{(clinician, day): counters}, ignoring rows whose counters are all zero."""
+    rows = {}
+    for row in db.scalars(select(models.ClinicianStat)):
+        counters = tuple(round(getattr(row, c), 6) for c in COUNTERS)
+        if any(counters):
+            rows[(row.clinician_id, row.day)] = counters
+    return rows
+
+
+def verify_clinician_stats(steps: int, seed: int):
+    if os.path.exists(_DB_PATH):
+        os.unlink(_DB_PATH)
+    event.listen(engine, "connect", _foreign_keys_on)
+    event.listen(async_engine.sync_engine, "connect", _foreign_keys_on)
+    Base.metadata.create_all(engine)
+
+    rng = random.Random(seed)
+    scenario = Scenario(rng)
+    db = SessionLocal()
+    scenario.seed(db)
+    functions, weights = zip(*Scenario.STEPS)
+    counts = {}
+
+    try:
+        for step in range(1, steps + 1):
+            fn = rng.choices(functions, weights)[0]
+            fn(scenario, db)
+            counts[fn.__name__] = counts.get(fn.__name__, 0) + 1
+
+            maintained = _snapshot(db)
+            rebuild(db)
+            rebuilt = _snapshot(db)
+            if maintained != rebuilt:
+                print(f"❌ step {step} ({fn.__name__}): rollup differs from a rebuild")
+                for key in sorted(maintained.keys() | rebuilt.keys()):
+                    if maintained.get(key) != rebuilt.get(key):
+                        print(f"   {key}: maintained={maintained.get(key)} rebuilt={rebuilt.get(key)}")
+                sys.exit(1)
+    finally:
+        db.close()
+
+    summary = ", ".join(f"{name} {n}" for name, n in sorted(counts.items()))
+    print(f"✅ clinician_stats matched a full rebuild after all {steps} steps ({summary})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    verify_clinician_stats(args.steps, args.seed)
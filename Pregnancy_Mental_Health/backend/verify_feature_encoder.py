@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Verify that the precompiled FeatureEncoder matches the pandas get_dummies path
+for every category the model knows about (plus cleaned-up spellings and
+unknown values).
+
+Usage (from the backend directory):
+    python verify_feature_encoder.py
+"""
+
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from app.ml_model import (
+    get_feature_columns, get_feature_encoder, form_to_row, encode_rows, encode_form,
+    build_model_input_from_form, _VALUE_FIXES,
+)
+from benchmark_ml import SAMPLE_FORM
+
+feature_columns = get_feature_columns()
+feature_encoder = get_feature_encoder()
+
+
+def _categories_by_column(raw_columns):
+    """Split each dummy name "<column>_<category>" on the longest raw column prefix."""
+    cats = {col: set() for col in raw_columns}
+    for name in feature_columns:
+        owners = [c for c in raw_columns if name.startswith(c + "_")]
+        if owners:
+            col = max(owners, key=len)
+            cats[col].add(name[len(col) + 1:])
+    return cats
+
+
+def _same(row_list):
+    expected = encode_rows(row_list).to_numpy(dtype=float)
+    actual = feature_encoder.encode_rows(row_list)
+    return expected.shape == actual.shape and np.array_equal(expected, actual)
+
+
+def verify_feature_encoder():
+    base_row = form_to_row(SimpleNamespace(**SAMPLE_FORM))
+    raw_columns = list(base_row)
+    categories = _categories_by_column(raw_columns)
+
+    checks = []
+    failures = []
+    cases = 0
+
+    # 1. Every known category, every cleaned spelling, and an unknown value
+    for col in raw_columns:
+        values = set(categories[col]) | set(_VALUE_FIXES.get(col, {}))
+        if isinstance(base_row[col], str):
+            values.add("__unknown__")
+        else:
+            values |= {0, 1, 45, 3.5}
+        for value in sorted(values, key=str):
+            row = dict(base_row, **{col: value})
+            cases += 1
+            if not _same([row]):
+                failures.append((col, value))
+    checks.append((f"Single-row encoding matches ({cases} cases)", not failures))
+
+    # 2. Multi-row batch, one row per category of every column
+    rows = []
+    for col in raw_columns:
+        for value in sorted(categories[col]):
+            rows.append(dict(base_row, **{col: value}))
+    checks.append((f"Batch encoding matches ({len(rows)} rows)", _same(rows)))
+
+    # 3. Full form path: encode_form vs build_model_input_from_form
+    form = SimpleNamespace(**SAMPLE_FORM)
+    checks.append((
+        "encode_form matches build_model_input_from_form",
+        np.array_equal(build_model_input_from_form(form).to_numpy(dtype=float), encode_form(form)),
+    ))
+
+    # 4. Every dummy column is reachable, except raw spellings the cleaning
+    #    step always rewrites (both paths leave those at 0)
+    shadowed = {f"{col}_{old}" for col, fixes in _VALUE_FIXES.items() for old in fixes}
+    reached = feature_encoder.encode_rows(rows).any(axis=0)
+    unreached = [
+        c for i, c in enumerate(feature_columns)
+        if not reached[i] and c not in raw_columns and c not in shadowed
+    ]
+    checks.append((f"Every feature column reachable ({len(shadowed)} shadowed by cleaning)", not unreached))
+
+    print("\nFeature encoder verification:\n")
+    all_passed = True
+    for label, passed in checks:
+        print(f"  {'✅' if passed else '❌'} {label}")
+        if not passed:
+            all_passed = False
+    for col, value in failures[:20]:
+        print(f"     mismatch: {col!r} = {value!r}")
+
+    print(f"\n{'✅ Encoder matches pandas path' if all_passed else '❌ Encoder differs from pandas path'}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_feature_encoder() else 1)
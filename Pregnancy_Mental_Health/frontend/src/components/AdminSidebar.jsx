@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from "react";
 import { NavLink, useNavigate, useLocation } from "react-router-dom";
-import { api } from "../utils/api";
+import { api, openWebSocket } from "../utils/api";
 import {
   LayoutDashboard, Users, UserPlus, FileText, LogOut,
   Shield, BarChart3, Menu, X, KeyRound,
@@ -32,17 +32,15 @@ export default function AdminSidebar({ onClose }) {
 
   useEffect(() => {
     fetchPendingCount();
-    const wsUrl = import.meta.env.VITE_API_URL
-      ? import.meta.env.VITE_API_URL.replace(/^http/, "ws").replace(/\/$/, "") + "/ws"
-      : `ws://${window.location.hostname}:8000/ws`;
-    const socket = new WebSocket(wsUrl);
+    const socket = openWebSocket();
+    socket.onreopen = fetchPendingCount;
     socket.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
         if (data.type === "NEW_RECOVERY_REQUEST" || data.type === "RECOVERY_COMPLETED") fetchPendingCount();
       } catch {}
     };
-    return () => { if (socket.readyState === WebSocket.OPEN) socket.close(); };
+    return () => { socket.close(); };
   }, []);
 
   const fetchPendingCount = async () => {
@@ -0,0 +1,53 @@
+import { useEffect } from 'react';
+import { api, openWebSocket } from '../utils/api';
+
+/**
+ * Keeps a dashboard's notification list and unread badge current from
+ * /ws pushes instead of polling the notification endpoints.
+ * - NOTIFICATION: a new notification for this clinician, with the new count
+ * - UNREAD_COUNT: notifications were read or removed (e.g. in another tab);
+ *   the list is refetched so it matches the count
+ * After a reconnect both are refetched: pushes sent meanwhile were missed.
+ */
+export const useNotificationSocket = (setNotifications, setUnreadCount) => {
+  useEffect(() => {
+    const socket = openWebSocket();
+
+    socket.onreopen = async () => {
+      try {
+        const [{ data: notifs }, { data: unread }] = await Promise.all([
+          api.get('/notifications'),
+          api.get('/notifications/unread-count'),
+        ]);
+        setNotifications(Array.isArray(notifs) ? notifs : []);
+        setUnreadCount(unread?.count ?? 0);
+      } catch (err) {
+        console.error('Notification refetch error:', err);
+      }
+    };
+
+    socket.addEventListener('message', async (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data.type === 'NOTIFICATION') {
+          setNotifications(prev => [data.notification, ...prev.filter(n => n.id !== data.notification.id)]);
+          setUnreadCount(data.unread_count);
+        } else if (data.type === 'UNREAD_COUNT') {
+          setUnreadCount(data.unread_count);
+          if (data.unread_count === 0) {
+            setNotifications([]);
+          } else {
+            const { data: notifs } = await api.get('/notifications');
+            setNotifications(Array.isArray(notifs) ? notifs : []);
+          }
+        }
+      } catch (err) {
+        console.error('Notification socket error:', err);
+      }
+    });
+
+    return () => { socket.close(); };
+  }, [setNotifications, setUnreadCount]);
+};
+
+export default useNotificationSocket;
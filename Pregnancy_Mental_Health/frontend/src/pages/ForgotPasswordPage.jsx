@@ -1,6 +1,6 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
-import { api, getErrorMessage } from "../utils/api";
+import { api, getErrorMessage, openWebSocket } from "../utils/api";
 import { setResetCode, clearResetCode, getRoleFromUrl } from "../auth/tokenStorage";
 import toast from "react-hot-toast";
 import { 
@@ -26,6 +26,9 @@ export default function ForgotPasswordPage() {
   const navigate = useNavigate();
   const [step, setStep] = useState(1); // 1: Enter email, 2: Reset password
   const [email, setEmail] = useState("");
+  // Returned by POST /recovery/request; the socket subscribes with it
+  const [recoveryNonce, setRecoveryNonce] = useState("");
+  const codeReceived = useRef(false);
   const [code, setCode] = useState("");
   const [newPassword, setNewPassword] = useState("");
   const [confirmPassword, setConfirmPassword] = useState("");
@@ -38,6 +41,7 @@ export default function ForgotPasswordPage() {
 
   const showNotification = (code) => {
     if (!code) return;
+    codeReceived.current = true;
     console.log("Showing Recovery Notification:", code);
     
     // Namespacing: Store reset code by role if role is detectable
@@ -111,24 +115,10 @@ export default function ForgotPasswordPage() {
   };
 
   useEffect(() => {
-    if (!email || success === "") return;
-
-    let wsUrl;
-    if (import.meta.env.VITE_API_URL) {
-      // Production or custom VITE_API_URL
-      wsUrl = import.meta.env.VITE_API_URL.replace(/^http/, "ws");
-      // If the URL doesn't already have /ws at the end, add it
-      if (!wsUrl.endsWith("/ws")) {
-        // Handle cases where VITE_API_URL might have a trailing slash
-        wsUrl = wsUrl.replace(/\/$/, "") + "/ws";
-      }
-    } else {
-      // Fallback for local development
-      wsUrl = `ws://${window.location.hostname}:8000/ws`;
-    }
+    if (!recoveryNonce || success === "") return;
 
-    console.log("Connecting to WebSocket:", wsUrl);
-    const socket = new WebSocket(wsUrl);
+    // Only the code for this page's own request is delivered to the socket
+    const socket = openWebSocket({ recovery_nonce: recoveryNonce });
     let isMounted = true;
 
     socket.onmessage = (event) => {
@@ -140,13 +130,25 @@ export default function ForgotPasswordPage() {
       } catch (err) { }
     };
 
+    // A code pushed while the socket was down is gone (the server keeps
+    // only its hash); say so instead of leaving the page waiting
+    socket.onreopen = async () => {
+      try {
+        const { data } = await api.get(`/recovery/status/${encodeURIComponent(recoveryNonce)}`);
+        if (!isMounted || codeReceived.current) return;
+        if (data.status === "approved") {
+          setError("Your request was approved while you were offline. Please submit it again to get a new code.");
+        } else if (data.status === "declined") {
+          setError("Your recovery request was declined. Please contact an administrator.");
+        }
+      } catch (err) { }
+    };
+
     return () => {
       isMounted = false;
-      if (socket.readyState === WebSocket.OPEN) {
-        socket.close();
-      }
+      socket.close();
     };
-  }, [email, success]);
+  }, [recoveryNonce, email, success]);
 
   const handleEmailSubmit = async (e) => {
     e.preventDefault();
@@ -161,7 +163,9 @@ export default function ForgotPasswordPage() {
     }
 
     try {
+      codeReceived.current = false;
       const { data } = await api.post('/recovery/request', { email });
+      setRecoveryNonce(data.nonce || "");
       setSuccess(data.message);
       
       // If the code is already in the response (auto-approved patient path), show it now!
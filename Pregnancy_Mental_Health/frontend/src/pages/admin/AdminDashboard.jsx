@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import AdminSidebar from "../../components/AdminSidebar";
-import { api, addAuditLog } from "../../utils/api";
+import { api, addAuditLog, openWebSocket } from "../../utils/api";
 import {
   Users, UserCheck, ClipboardList, Activity,
   ArrowUpRight, ArrowDownRight, Search, Filter,
@@ -59,11 +59,8 @@ export default function AdminDashboard() {
   useEffect(() => {
     fetchAdminData();
 
-    const wsUrl = import.meta.env.VITE_API_URL 
-      ? import.meta.env.VITE_API_URL.replace(/^http/, "ws").replace(/\/$/, "") + "/ws"
-      : `ws://${window.location.hostname}:8000/ws`;
-      
-    const ws = new WebSocket(wsUrl);
+    const ws = openWebSocket();
+    ws.onreopen = fetchAdminData; // users deleted while disconnected
 
     ws.onmessage = (event) => {
       try {
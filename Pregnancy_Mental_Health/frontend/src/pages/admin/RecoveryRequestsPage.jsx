@@ -4,7 +4,7 @@ import { useTheme } from "../../ThemeContext";
 import AdminLayout from "../../components/AdminLayout";
 import FilterToolbar from "../../components/FilterToolbar";
 import { Divider, Card, Pagination } from "../../components/UI";
-import { api, getErrorMessage } from "../../utils/api";
+import { api, getErrorMessage, openWebSocket } from "../../utils/api";
 import {
   Search,
   CheckCircle,
@@ -31,11 +31,8 @@ export default function RecoveryRequestsPage() {
     loadRequests();
 
     // Setup WebSocket for real-time updates
-    const wsUrl = import.meta.env.VITE_API_URL 
-      ? import.meta.env.VITE_API_URL.replace(/^http/, "ws").replace(/\/$/, "") + "/ws"
-      : `ws://${window.location.hostname}:8000/ws`;
-      
-    const socket = new WebSocket(wsUrl);
+    const socket = openWebSocket();
+    socket.onreopen = loadRequests; // requests made while disconnected
     
     socket.onmessage = (event) => {
       try {
@@ -61,9 +58,7 @@ export default function RecoveryRequestsPage() {
     };
 
     return () => {
-      if (socket.readyState === WebSocket.OPEN) {
-        socket.close();
-      }
+      socket.close();
     };
   }, []);
 
@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useCallback } from "react";
 import { useParams, useNavigate } from "react-router-dom";
-import { api } from "../../utils/api";
+import { api, openWebSocket } from "../../utils/api";
 import { Card, Badge, PageTitle, Loader2 } from "../../components/UI";
 import toast from "react-hot-toast";
 import DoctorSidebar from "../../components/DoctorSidebar";
@@ -93,6 +93,49 @@ export default function ClinicalValidation() {
     fetchAssessment();
   }, [fetchAssessment]);
 
+  // ── WebSocket: SHAP risk factors are computed after submission ──
+  useEffect(() => {
+    const ws = openWebSocket();
+
+    // RISK_FACTORS_READY may have been sent while the socket was down;
+    // pick up the factors without resetting the form being edited
+    ws.onreopen = async () => {
+      try {
+        const { data } = await api.get(`/doctor/assessments/${id}`);
+        setAssessment(prev => prev ? {
+          ...prev,
+          top_risk_factors: data.top_risk_factors,
+          top_risk_factors_status: data.top_risk_factors_status
+        } : prev);
+      } catch (err) {
+        console.error("Risk factor refetch error:", err);
+      }
+    };
+
+    ws.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data.type === "RISK_FACTORS_READY" && String(data.assessment_id) === String(id)) {
+          setAssessment(prev => prev ? {
+            ...prev,
+            top_risk_factors: data.top_risk_factors,
+            top_risk_factors_status: "ready"
+          } : prev);
+        }
+      } catch (err) {
+        console.error("WebSocket message error:", err);
+      }
+    };
+
+    ws.onerror = (error) => {
+      console.error("WebSocket error:", error);
+    };
+
+    return () => {
+      ws.close();
+    };
+  }, [id]);
+
   const runAI = async () => {
     setIsAnalyzing(true);
     try {
@@ -490,6 +533,13 @@ const handleSubmit = async (status) => {
                   Primary Risk Drivers
                 </div>
 
+                {assessment.top_risk_factors_status === "computing" && (
+                  <div style={{ display: "flex", alignItems: "center", gap: 8, fontSize: 12, color: theme.textMuted, marginBottom: 10 }}>
+                    <Loader2 size={14} className="animate-spin" color={theme.primary} />
+                    Computing SHAP risk factors…
+                  </div>
+                )}
+
                 <div style={{ height: 200 }}>
                   <ResponsiveContainer width="100%" height="100%">
                     <BarChart layout="vertical" data={getRiskFactors()} margin={{ left: -20, right: 20 }}>
@@ -3,6 +3,7 @@ import { useNavigate } from "react-router-dom";
 import { useAuth } from "../../contexts/AuthContext";
 import { useTheme } from "../../ThemeContext";
 import { api } from "../../utils/api";
+import { useNotificationSocket } from "../../hooks/useNotificationSocket";
 import DoctorSidebar from "../../components/DoctorSidebar";
 import {
   Card,
@@ -143,6 +144,9 @@ export default function DashboardPage() {
     fetchData();
   }, [fetchData]);
 
+  // New notifications and unread counts are pushed over /ws
+  useNotificationSocket(setNotifications, setUnreadCount);
+
   const getTimeAgo = (timestamp) => {
     if (!timestamp) return "N/A";
     const diff = new Date() - new Date(timestamp);
@@ -2,7 +2,7 @@ import React, { useState, useEffect, useCallback, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import { useTheme } from "../../ThemeContext";
 import DoctorSidebar from "../../components/DoctorSidebar";
-import { api } from "../../utils/api";
+import { api, openWebSocket } from "../../utils/api";
 import toast from "react-hot-toast";
 import { PageTitle, Loader2 } from "../../components/UI";
 import {
@@ -180,11 +180,10 @@ const SchedulePage = () => {
 
 // ── WebSocket listener for real-time appointment updates ──
 useEffect(() => {
-  const wsUrl = import.meta.env.VITE_API_URL 
-    ? import.meta.env.VITE_API_URL.replace(/^http/, "ws").replace(/\/$/, "") + "/ws"
-    : `ws://${window.location.hostname}:8000/ws`;
-    
-  const ws = new WebSocket(wsUrl);
+  const ws = openWebSocket();
+
+  // Appointments booked while the socket was down
+  ws.onreopen = loadData;
 
   ws.onmessage = (event) => {
     try {
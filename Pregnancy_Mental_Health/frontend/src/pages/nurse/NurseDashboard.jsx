@@ -2,6 +2,7 @@ import React, { useEffect, useState } from "react";
 import { useNavigate, Link } from "react-router-dom";
 import { useAuth } from "../../contexts/AuthContext";
 import { api } from "../../utils/api";
+import { useNotificationSocket } from "../../hooks/useNotificationSocket";
 // import { dummyApi, USE_DUMMY_DATA, getAvatarColor } from "../../utils/dummyData";
 import { getAvatarColor } from "../../utils/helpers";
 import { useTheme } from "../../ThemeContext";
@@ -79,6 +80,9 @@ export default function NurseDashboard() {
     fetchDashboardData();
   }, []);
 
+  // New notifications and unread counts are pushed over /ws
+  useNotificationSocket(setNotifications, setUnreadCount);
+
   const handleMarkOneRead = async (id) => {
     try {
       await api.post(`/notifications/${id}/read`, {});
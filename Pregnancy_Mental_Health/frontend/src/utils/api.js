@@ -194,6 +194,89 @@ export const getAuthHeaders = () => {
   return headers;
 };
 
+// URL for the /ws socket. Browsers can't set headers on a WebSocket, so the
+// access token goes in the query string; the server uses it to subscribe the
+// socket to this user's channels (user, role, clinician).
+export const getWebSocketUrl = (params = {}) => {
+  const base = import.meta.env.VITE_API_URL
+    ? import.meta.env.VITE_API_URL.replace(/^http/, "ws").replace(/\/$/, "").replace(/\/ws$/, "") + "/ws"
+    : `ws://${window.location.hostname}:8000/ws`;
+  const role  = getRoleFromUrl();
+  const token = role ? getToken(role) : null;
+  const query = new URLSearchParams(token ? { token, ...params } : params).toString();
+  return query ? `${base}?${query}` : base;
+};
+
+const WS_RECONNECT_BASE_MS = 1000;
+const WS_RECONNECT_MAX_MS = 30000;
+const WS_POLICY_VIOLATION = 1008; // token rejected: retrying can't help
+
+// Opens the /ws socket and answers the server's heartbeat pings; a socket
+// that stays silent is closed by the server as dead.
+//
+// A dropped connection (deploy, idle or overload close, network change) is
+// reopened with jittered exponential backoff, so a fleet of tabs doesn't
+// reconnect in lockstep. Events published while disconnected are lost:
+// set onreopen to refetch whatever the page keeps current from the socket.
+// The returned handle takes onmessage/onerror/onreopen, addEventListener
+// and close(); after close() or a 1008 close it stays closed.
+export const openWebSocket = (params = {}) => {
+  const listeners = new EventTarget();
+  let socket = null;
+  let timer = null;
+  let attempts = 0;
+  let connections = 0;
+  let closed = false;
+
+  const handle = {
+    onmessage: null,
+    onerror: null,
+    onreopen: null,
+    get readyState() { return socket ? socket.readyState : WebSocket.CLOSED; },
+    addEventListener: (type, listener) => listeners.addEventListener(type, listener),
+    removeEventListener: (type, listener) => listeners.removeEventListener(type, listener),
+    close: () => {
+      closed = true;
+      clearTimeout(timer);
+      if (socket) socket.close();
+    },
+  };
+
+  const connect = () => {
+    // URL rebuilt every time: picks up an access token refreshed meanwhile
+    const current = new WebSocket(getWebSocketUrl(params));
+    const reopen = connections++ > 0;
+    let openedAt = null;
+    socket = current;
+
+    current.onopen = () => {
+      openedAt = Date.now();
+      if (reopen && handle.onreopen) handle.onreopen();
+    };
+    current.onmessage = (event) => {
+      try {
+        if (JSON.parse(event.data).type === "ping") current.send(JSON.stringify({ type: "pong" }));
+      } catch {}
+      if (handle.onmessage) handle.onmessage(event);
+      listeners.dispatchEvent(new MessageEvent("message", { data: event.data }));
+    };
+    current.onerror = (event) => {
+      if (handle.onerror) handle.onerror(event);
+    };
+    current.onclose = (event) => {
+      if (closed || event.code === WS_POLICY_VIOLATION) return;
+      // Only a connection that lasted restarts the backoff; one the server
+      // accepts and drops at once (over its connection cap) keeps backing off
+      if (openedAt && Date.now() - openedAt > WS_RECONNECT_MAX_MS) attempts = 0;
+      const delay = Math.min(WS_RECONNECT_MAX_MS, WS_RECONNECT_BASE_MS * 2 ** attempts++);
+      timer = setTimeout(connect, delay / 2 + Math.random() * (delay / 2));
+    };
+  };
+
+  connect();
+  return handle;
+};
+
 export const apiRequest = async (endpoint, options = {}) => {
   const url = endpoint.startsWith('http') ? endpoint : `${API_BASE_URL}${endpoint}`;
 